@@ -0,0 +1,235 @@
+"""
+Offline end-to-end benchmark: MCPHost.process_query and the server tools against local stand-ins
+for Snap4City (recorded fixtures) and for the LAB LLM (scripted answers, configurable latency).
+
+For every scenario of scenarios.json it reports p50/p95/p99 latency, throughput and memory:
+- "tools": the server tool coroutines are called in-process, `--concurrency` at a time.
+- "host":  full turns through MCPHost.process_query (server started over stdio, like the chat does).
+
+Results are written as JSON (--output) and can be compared with a previous run (--compare):
+the exit code is 1 if any p95 got worse than --max-regression.
+
+Usage (from the repository root):
+    python bench/e2e_bench.py --iterations 50 --llm-latency 0.3 --tpl-latency 0.05 --output e2e.json
+    python bench/e2e_bench.py --compare e2e.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.absolute()
+HOME_DIR = BENCH_DIR.parent
+CHAT_DIR = HOME_DIR / "chat"
+SERVER_DIR = HOME_DIR / "server"
+sys.path.insert(0, str(BENCH_DIR))
+
+from stubs import StubServer, bench_mode, llm_routes, server_settings, stub_environment, tpl_routes
+
+TPL_PATH = "/superservicemap/api/v1"
+LLM_PATH = "/llama4-inference"
+MEMORY_ITERATIONS = 10
+
+
+# ========== STATISTICS ==========
+def percentile(values, p):
+    """ Nearest-rank percentile. """
+    ordered = sorted(values)
+    k = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[k]
+
+
+def summarize(latencies, wall_time, errors, peak_alloc):
+    ms = [x * 1000 for x in latencies]
+    return {
+        "count": len(ms),
+        "errors": errors,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "mean_ms": sum(ms) / len(ms),
+        "throughput_per_s": len(ms) / wall_time if wall_time > 0 else 0.0,
+        "peak_alloc_kb": peak_alloc / 1024,
+    }
+
+
+async def measure_memory(run_once, iterations):
+    """ Peak Python allocations while repeating run_once(), measured apart because tracemalloc slows everything down. """
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            await run_once()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# ========== SCENARIOS ==========
+async def run_tool_scenario(server_module, scenario, iterations, concurrency):
+    fn = getattr(server_module, scenario["tool"])
+    args = scenario.get("args", {})
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            result = await fn(**args)
+            latencies.append(time.perf_counter() - t0)
+            if result is None:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(iterations)))
+    wall = time.perf_counter() - t0
+
+    peak = await measure_memory(lambda: fn(**args), min(iterations, MEMORY_ITERATIONS))
+    return summarize(latencies, wall, errors, peak)
+
+
+async def run_host_scenario(host, scenario, iterations):
+    system = host.messages[:1]
+    latencies, errors = [], 0
+
+    async def one():
+        # Every iteration is a fresh turn: the history does not grow between iterations.
+        host.messages = list(system)
+        return await host.process_query(scenario["query"])
+
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        try:
+            await one()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t)
+    wall = time.perf_counter() - t0
+
+    peak = await measure_memory(one, min(iterations, MEMORY_ITERATIONS))
+    return summarize(latencies, wall, errors, peak)
+
+
+# ========== COMPARISON ==========
+def compare(current, baseline, max_regression):
+    """ Prints p95/throughput changes per scenario. Returns True if any p95 regressed more than max_regression. """
+    regressed = False
+    print(f"\n{'scenario':<36}{'p95 before':>12}{'p95 now':>10}{'change':>9}{'thr change':>12}")
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            print(f"{name:<36}{'-':>12}{now['p95_ms']:>10.1f}{'new':>9}")
+            continue
+        change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        thr = (now["throughput_per_s"] - before["throughput_per_s"]) / before["throughput_per_s"] if before["throughput_per_s"] else 0.0
+        flag = "  REGRESSION" if change > max_regression else ""
+        regressed = regressed or bool(flag)
+        print(f"{name:<36}{before['p95_ms']:>12.1f}{now['p95_ms']:>10.1f}{change:>+9.1%}{thr:>+12.1%}{flag}")
+    return regressed
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HOME_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# ========== MAIN ==========
+async def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark against local Snap4City and LLM stand-ins.")
+    parser.add_argument("--scenarios", default=str(BENCH_DIR / "scenarios.json"))
+    parser.add_argument("--only", default=None, help="run only the scenarios whose name contains this text")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent calls in the tool scenarios")
+    parser.add_argument("--tpl-latency", type=float, default=0.05, help="seconds added to every Snap4City answer")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds added to every LLM answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument("--skip-host", action="store_true", help="run only the tool scenarios")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase for --compare (0.2 = 20%%)")
+    parser.add_argument("--warm-caches", action="store_true",
+                        help="keep the response caches, prefetches and upstream rate limits of the server")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenarios = json.load(f)
+    selected = lambda sc: args.only is None or args.only in sc["name"]
+    script = [{"match": sc["query"], **{k: sc[k] for k in ("first_answer", "final_answer") if k in sc}} for sc in scenarios["host"]]
+
+    tpl = StubServer(tpl_routes(TPL_PATH), latency=args.tpl_latency, jitter=args.jitter).start()
+    llm = StubServer(llm_routes(path=LLM_PATH, script=script), latency=args.llm_latency, jitter=args.jitter).start()
+    workdir = tempfile.mkdtemp(prefix="mcp-snap-e2e-")
+    os.environ.update(stub_environment(tpl.url + TPL_PATH, llm.url + LLM_PATH, workdir))
+    os.environ.update(server_settings(args.warm_caches))
+    print(f"mode: {bench_mode(args.warm_caches)}")
+    os.environ.setdefault("SNAP_LOGS_DIR", workdir)
+    os.environ.setdefault("SNAP_TRACE_FILE", os.path.join(workdir, "traces.jsonl"))
+
+    # host.py expects to be run from chat/; server.py is imported in-process for the tool scenarios
+    os.chdir(CHAT_DIR)
+    sys.path.insert(0, str(CHAT_DIR))
+    sys.path.insert(1, str(SERVER_DIR))
+    import host as host_module
+    import server as server_module
+
+    results = {}
+    try:
+        for sc in filter(selected, scenarios["tools"]):
+            name = f"tool:{sc['name']}"
+            results[name] = await run_tool_scenario(server_module, sc, args.iterations, args.concurrency)
+            print(f"{name:<36} p95 {results[name]['p95_ms']:.1f} ms")
+
+        if not args.skip_host:
+            host = host_module.MCPHost(store=host_module.ConversationStore(os.path.join(workdir, "bench.db")))
+            try:
+                await host.connect_to_server(str(SERVER_DIR / "server.py"))
+                for sc in filter(selected, scenarios["host"]):
+                    name = f"host:{sc['name']}"
+                    results[name] = await run_host_scenario(host, sc, args.iterations)
+                    print(f"{name:<36} p95 {results[name]['p95_ms']:.1f} ms")
+            finally:
+                await host.cleanup()
+    finally:
+        tpl.stop()
+        llm.stop()
+
+    report = {
+        "benchmark": "e2e",
+        "timestamp": time.time(),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {k: getattr(args, k) for k in ("iterations", "concurrency", "tpl_latency", "llm_latency", "jitter", "warm_caches")},
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "scenarios": results,
+    }
+
+    print(f"\n{'scenario':<36}{'p50':>9}{'p95':>9}{'p99':>9}{'ops/s':>9}{'peak KB':>10}{'err':>5}")
+    for name, r in results.items():
+        print(f"{name:<36}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['throughput_per_s']:>9.1f}{r['peak_alloc_kb']:>10.0f}{r['errors']:>5}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
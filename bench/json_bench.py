@@ -0,0 +1,105 @@
+"""
+JSON codec benchmark: standard library vs orjson / msgspec (whichever is installed) on Snap4City-shaped payloads.
+
+Payloads are the fixtures of the stubs and, with --cassettes, every answer recorded in the cassettes
+(SNAP_CASSETTE_MODE=record), so the numbers can be taken on real traffic.
+For each payload: decode from bytes (as get_json does) and encode to compact JSON (as the logs and LabLLM do).
+
+Usage (from the repository root):
+    python bench/json_bench.py --repeat 50 --cassettes cassettes/ --output json.json
+"""
+import argparse
+import gzip
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.absolute()
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+
+
+def backends():
+    """ name -> (loads(bytes), dumps(obj) -> bytes) for every library available. """
+    found = {"stdlib": (json.loads, lambda o: json.dumps(o, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))}
+    try:
+        import orjson
+        found["orjson"] = (orjson.loads, orjson.dumps)
+    except ImportError:
+        pass
+    try:
+        import msgspec
+        found["msgspec"] = (msgspec.json.Decoder().decode, msgspec.json.Encoder().encode)
+    except ImportError:
+        pass
+    return found
+
+
+def payloads(cassettes_dir=None):
+    """ (name, raw bytes) of the fixtures and of the recorded answers. """
+    found = [(p.stem, p.read_bytes()) for p in sorted(FIXTURES_DIR.glob("*.json"))]
+    if cassettes_dir:
+        for path in sorted(Path(cassettes_dir).glob("*.json.gz")):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                cassette = json.load(f)
+            for i, episode in enumerate(cassette.get("episodes", [])):
+                response = episode.get("response")
+                if isinstance(response, str):
+                    raw = response.encode("utf-8")          # LLM answers are stored as text
+                elif response is not None:
+                    raw = json.dumps(response).encode("utf-8")
+                else:
+                    continue
+                found.append((f"{path.name[:24]}#{i}", raw))
+    return found
+
+
+def best_time(fn, arg, repeat):
+    """ Median of `repeat` runs, in microseconds. """
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t)
+    return statistics.median(times) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--cassettes", help="directory of recorded cassettes (.json.gz)")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    codecs = backends()
+    rows = []
+    for name, raw in payloads(args.cassettes):
+        obj = json.loads(raw)
+        row = {"payload": name, "bytes": len(raw)}
+        for codec, (loads, dumps) in codecs.items():
+            row[f"{codec}_loads_us"] = best_time(loads, raw, args.repeat)
+            row[f"{codec}_dumps_us"] = best_time(dumps, obj, args.repeat)
+        rows.append(row)
+
+    header = f"{'payload':<28}{'KB':>8}" + "".join(f"{c + ' loads':>16}{c + ' dumps':>16}" for c in codecs)
+    print(header)
+    for row in rows:
+        print(f"{row['payload']:<28}{row['bytes'] / 1024:>8.1f}" +
+              "".join(f"{row[c + '_loads_us']:>14.0f}us{row[c + '_dumps_us']:>14.0f}us" for c in codecs))
+    totals = {f"{c}_{op}_us": sum(r[f"{c}_{op}_us"] for r in rows) for c in codecs for op in ("loads", "dumps")}
+    print(f"{'total':<28}{sum(r['bytes'] for r in rows) / 1024:>8.1f}" +
+          "".join(f"{totals[c + '_loads_us']:>14.0f}us{totals[c + '_dumps_us']:>14.0f}us" for c in codecs))
+    for c in codecs:
+        if c != "stdlib":
+            print(f"{c}: loads {totals['stdlib_loads_us'] / totals[c + '_loads_us']:.1f}x, "
+                  f"dumps {totals['stdlib_dumps_us'] / totals[c + '_dumps_us']:.1f}x faster than stdlib")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "json", "timestamp": time.time(), "python": sys.version.split()[0],
+                       "codecs": list(codecs), "rows": rows, "totals": totals}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Load generator for the MCP server: K concurrent MCP client sessions replaying a weighted mix of tool calls
+(load_mix.json) against the local Snap4City stand-in, with K ramped up until the server saturates.
+
+Transports:
+- http  (default): ONE server process started with SNAP_MCP_TRANSPORT=streamable-http, K sessions connected to it.
+                   This answers "how many users can one server process handle".
+- stdio:           one server process per session, as K chat hosts would do.
+
+Every virtual user runs a closed loop: pick a call from the mix, wait for the answer, optionally think, repeat.
+For each concurrency level the report gives throughput, latency percentiles and errors; the knee point is the
+level with the highest power (throughput / mean latency): beyond it, more users mostly add queueing.
+
+Usage (from the repository root):
+    python bench/loadgen.py --levels 1,2,4,8,16,32,64 --duration 10 --tpl-latency 0.05 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+BENCH_DIR = Path(__file__).parent.absolute()
+HOME_DIR = BENCH_DIR.parent
+CHAT_DIR = HOME_DIR / "chat"
+SERVER_SCRIPT = HOME_DIR / "server" / "server.py"
+sys.path.insert(0, str(BENCH_DIR))
+
+from e2e_bench import percentile
+from stubs import StubServer, bench_mode, server_settings, tpl_routes
+
+TPL_PATH = "/superservicemap/api/v1"
+
+
+# ========== PROCESSES ==========
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve_tpl_stub(port, latency, jitter):
+    """ Runs in its own process: the stub threads must not compete for the GIL with the load generator. """
+    StubServer(tpl_routes(TPL_PATH), port=port, latency=latency, jitter=jitter).httpd.serve_forever()
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"nothing listening on port {port} after {timeout}s")
+
+
+def server_environment(tpl_url, workdir, warm_caches=False):
+    env = dict(os.environ)
+    env.update({"SNAP_TPL_BASE_URL": tpl_url, "SNAP_LOGS_DIR": workdir, "SNAP_TRACE_FILE": os.path.join(workdir, "traces.jsonl")})
+    env.update(server_settings(warm_caches))
+    return env
+
+
+# ========== SESSIONS ==========
+async def open_session(stack, transport, env, url=None):
+    if transport == "http":
+        read, write, _ = await stack.enter_async_context(streamablehttp_client(url))
+    else:
+        params = StdioServerParameters(command=sys.executable, args=[str(SERVER_SCRIPT)], env=env, cwd=str(CHAT_DIR))
+        read, write = await stack.enter_async_context(stdio_client(params))
+    session = await stack.enter_async_context(ClientSession(read, write))
+    await session.initialize()
+    return session
+
+
+# ========== WORKLOAD ==========
+class Mix:
+    def __init__(self, calls):
+        self.calls = calls
+        self.weights = [c.get("weight", 1) for c in calls]
+
+    def pick(self, rng):
+        call = rng.choices(self.calls, weights=self.weights)[0]
+        return call["tool"], rng.choice(call.get("args") or [{}])
+
+
+async def virtual_user(session, mix, rng, measure_from, stop_at, think, call_timeout, samples):
+    """ Closed loop until stop_at. Only calls started after measure_from (end of warm-up) are kept. """
+    while time.perf_counter() < stop_at:
+        tool, args = mix.pick(rng)
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(session.call_tool(tool, args), timeout=call_timeout)
+            failed = bool(result.isError)
+        except Exception:
+            failed = True
+        if started >= measure_from:
+            samples.append((tool, time.perf_counter() - started, failed))
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+
+async def run_level(sessions, mix, users, warmup, duration, think, call_timeout, seed):
+    samples = []
+    start = time.perf_counter()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+    await asyncio.gather(*(
+        virtual_user(sessions[i], mix, random.Random(seed * 1000 + i), measure_from, stop_at, think, call_timeout, samples)
+        for i in range(users)
+    ))
+    # Calls still running at stop_at are waited for: the window is measured until the last one ends.
+    window = max(time.perf_counter() - measure_from, 1e-9)
+    ok = [lat * 1000 for _, lat, failed in samples if not failed]
+    per_tool = {}
+    for tool, lat, failed in samples:
+        per_tool.setdefault(tool, []).append(lat * 1000)
+    return {
+        "users": users,
+        "calls": len(samples),
+        "errors": sum(1 for s in samples if s[2]),
+        "throughput_per_s": len(ok) / window,
+        "mean_ms": sum(ok) / len(ok) if ok else None,
+        "p50_ms": percentile(ok, 50) if ok else None,
+        "p95_ms": percentile(ok, 95) if ok else None,
+        "p99_ms": percentile(ok, 99) if ok else None,
+        "per_tool_p95_ms": {t: percentile(v, 95) for t, v in sorted(per_tool.items())},
+    }
+
+
+def knee_point(levels):
+    """ Level with the highest power = throughput / mean latency (Kleinrock). """
+    candidates = [lv for lv in levels if lv["mean_ms"]]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda lv: lv["throughput_per_s"] / lv["mean_ms"])["users"]
+
+
+# ========== MAIN ==========
+async def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent MCP sessions against one server and find the knee point.")
+    parser.add_argument("--transport", choices=["http", "stdio"], default="http")
+    parser.add_argument("--mix", default=str(BENCH_DIR / "load_mix.json"))
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64", help="comma-separated numbers of concurrent users")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds at the start of each level")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between calls of a user (s)")
+    parser.add_argument("--call-timeout", type=float, default=30.0)
+    parser.add_argument("--tpl-latency", type=float, default=0.05, help="seconds added to every Snap4City answer")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--warm-caches", action="store_true",
+                        help="keep the response caches, prefetches and upstream rate limits of the server")
+    args = parser.parse_args()
+    levels = sorted({int(x) for x in args.levels.split(",")})
+
+    with open(args.mix, encoding="utf-8") as f:
+        mix = Mix(json.load(f)["calls"])
+
+    workdir = tempfile.mkdtemp(prefix="mcp-snap-load-")
+    tpl_port = free_port()
+    stub = multiprocessing.Process(target=_serve_tpl_stub, args=(tpl_port, args.tpl_latency, args.jitter), daemon=True)
+    stub.start()
+    wait_for_port(tpl_port)
+    env = server_environment(f"http://127.0.0.1:{tpl_port}{TPL_PATH}", workdir, args.warm_caches)
+    print(f"mode: {bench_mode(args.warm_caches)}")
+
+    server, url = None, None
+    if args.transport == "http":
+        mcp_port = free_port()
+        env.update({"SNAP_MCP_TRANSPORT": "streamable-http", "SNAP_MCP_PORT": str(mcp_port)})
+        with open(os.path.join(workdir, "server.out"), "w") as out:
+            server = subprocess.Popen([sys.executable, str(SERVER_SCRIPT)], env=env, cwd=CHAT_DIR, stdout=out, stderr=subprocess.STDOUT)
+        wait_for_port(mcp_port)
+        url = f"http://127.0.0.1:{mcp_port}/mcp"
+
+    results = []
+    server_metrics = None
+    try:
+        async with AsyncExitStack() as stack:
+            sessions = []
+            print(f"{'users':>6}{'calls':>8}{'err':>6}{'calls/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+            for users in levels:
+                while len(sessions) < users:
+                    sessions.append(await open_session(stack, args.transport, env, url))
+                r = await run_level(sessions, mix, users, args.warmup, args.duration, args.think, args.call_timeout, args.seed)
+                results.append(r)
+                fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+                print(f"{users:>6}{r['calls']:>8}{r['errors']:>6}{r['throughput_per_s']:>10.1f}{fmt(r['p50_ms'])}{fmt(r['p95_ms'])}{fmt(r['p99_ms'])}")
+            if args.transport == "http":
+                res = await sessions[0].read_resource("metrics://snap")
+                server_metrics = "".join(getattr(c, "text", "") for c in res.contents)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        stub.terminate()
+
+    knee = knee_point(results)
+    print(f"\nknee point: {knee} concurrent users" if knee else "\nknee point: not found (no successful calls)")
+
+    if args.output:
+        report = {
+            "benchmark": "load",
+            "timestamp": time.time(),
+            "config": {k: getattr(args, k) for k in ("transport", "duration", "warmup", "think", "tpl_latency", "jitter", "seed", "warm_caches")},
+            "levels": results,
+            "knee_users": knee,
+            "server_metrics": server_metrics,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,335 @@
+"""
+Offline analytics of the chat logs: where do the LLM round trips and the time of a turn go?
+
+Reads the plain text logs (logs/*.log, "2025-11-28 16:01:16,286 USER QUERY: ...", messages may span several lines)
+and the JSON-lines logs (logs/*.jsonl*, see common/log_setup.py) as a stream: memory does not grow with the
+size of the logs, only the current turn and fixed-size aggregates are kept.
+
+Turns are reconstructed from the USER QUERY lines. The report contains:
+- parse outcomes: how often each PARSE ... pattern appears and in how many turns, turns whose function call was lost;
+- tool-call frequency (FUNCTION CALLED), LLM round trips per turn, retries, upstream HTTP errors;
+- inter-event latencies: time between consecutive events of a turn (e.g. USER QUERY -> PARSE is the first LLM call),
+  with total time, so that the most expensive transitions come first;
+- prompt-size growth: prompt characters by position of the turn in its conversation.
+
+Usage (from the repository root):
+    python bench/log_analyzer.py                       # every logs/*.log and logs/*.jsonl*
+    python bench/log_analyzer.py logs/testing.log --json report.json
+    python bench/log_analyzer.py logs/llm_output.jsonl --follow
+"""
+import argparse
+import glob
+import json
+import math
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+HOME_DIR = Path(__file__).parent.parent.absolute()
+DEFAULT_INPUTS = [str(HOME_DIR / "logs" / "*.log"), str(HOME_DIR / "logs" / "*.jsonl*")]
+
+TEXT_RECORD = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) (.*)$")
+HEAD_CHARS = 300
+MAX_TURN_POSITION = 30
+
+
+# ========== STREAMING AGGREGATES ==========
+class LogHistogram:
+    """ Fixed log-spaced buckets (5% wide): approximate quantiles in constant memory. """
+    GROWTH = 1.05
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.buckets[math.floor(math.log(value, self.GROWTH)) if value > 0 else None] += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for b in sorted(self.buckets, key=lambda b: -math.inf if b is None else b):
+            seen += self.buckets[b]
+            if seen >= rank:
+                return 0.0 if b is None else min(self.GROWTH ** (b + 1), self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "total": round(self.total, 3), "mean": round(self.total / self.count, 3) if self.count else None,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "max": self.max}
+
+
+# ========== RECORDS ==========
+def read_text_records(lines):
+    """ Yields (timestamp, level, message head, message length). Continuation lines only add to the length. """
+    ts, head, size = None, None, 0
+    for line in lines:
+        m = TEXT_RECORD.match(line)
+        if m:
+            if ts is not None:
+                yield ts, "INFO", head, size
+            ts = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S").timestamp() + int(m.group(2)) / 1000
+            head = m.group(3)[:HEAD_CHARS]
+            size = len(m.group(3))
+        elif ts is not None:
+            size += len(line)
+    if ts is not None:
+        yield ts, "INFO", head, size
+
+
+def read_jsonl_records(lines):
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        ts = datetime.strptime(entry["ts"][:19], "%Y-%m-%dT%H:%M:%S").timestamp() + int(entry["ts"][20:23] or 0) / 1000
+        msg = entry.get("msg", "")
+        payload = entry.get("payload")
+        if isinstance(payload, dict) and isinstance(payload.get("function_call"), dict):
+            msg += " function_call=" + str(payload["function_call"].get("name"))
+        yield ts, entry.get("level", "INFO"), msg[:HEAD_CHARS], len(msg) + entry.get("payload_truncated", len(json.dumps(payload)) if payload else 0)
+
+
+def classify(level, msg):
+    """ (kind, detail) of a log message. """
+    if msg.startswith("--------") and "CONVERSATION" in msg:
+        return "conversation", None
+    if msg.startswith("USER QUERY"):
+        return "query", None
+    if msg.startswith("PARSE"):
+        return "parse", msg.split(" {")[0].strip()
+    if msg.startswith("FUNCTION CALLED"):
+        return "function", msg.split(":", 1)[1].strip() if ":" in msg else "?"
+    if msg.startswith(("FIRST RESPONSE", "RAW MODEL RESPONSE", "RESPONSE FROM LAB")):
+        return "llm_response", "first"
+    if msg.startswith("FOLLOWUP RESPONSE"):
+        return "llm_response", "followup"
+    if msg.startswith("LLM PROMPT"):
+        m = re.search(r"(\d+) chars", msg)
+        return "prompt", int(m.group(1)) if m else None
+    if msg.startswith("MODEL REASONING"):
+        return "reasoning", None
+    if msg.startswith("Retrying request"):
+        return "retry", None
+    if msg.startswith("HTTP Request"):
+        m = re.search(r"HTTP Request: (\w+) .*\"HTTP/[\d.]+ (\d+)", msg)
+        return "http", (m.group(1), int(m.group(2))) if m else None
+    if level in ("ERROR", "CRITICAL") or "error" in msg.split(":")[0].lower():
+        return "error", msg.split(":")[0]
+    return "other", None
+
+
+# ========== TURNS ==========
+class Analyzer:
+    # Kinds that mark progress inside a turn: the time between two of them is an inter-event latency.
+    TIMELINE_KINDS = {"query", "parse", "llm_response", "function", "reasoning", "retry", "error"}
+    LABELS = {"query": "USER QUERY", "parse": "PARSE", "function": "FUNCTION CALLED", "reasoning": "MODEL REASONING",
+              "retry": "RETRY", "error": "ERROR"}
+
+    def __init__(self):
+        self.files = 0
+        self.records = 0
+        self.conversations = 0
+        self.turns = 0
+        self.pattern_counts = Counter()
+        self.pattern_turns = Counter()
+        self.outcomes = Counter()
+        self.tools = Counter()
+        self.round_trips = Counter()
+        self.retries = 0
+        self.http_status = Counter()
+        self.errors = Counter()
+        self.transitions = {}
+        self.turn_duration = LogHistogram()
+        self.prompt_by_position = {}
+        self._turn = None
+        self._position = 0
+
+    # ---- turn state ----
+    def _start_turn(self, ts):
+        self._finish_turn()
+        self._position += 1
+        self._turn = {"start": ts, "last": ts, "last_label": "USER QUERY", "patterns": set(), "function": None,
+                      "responses": 0, "llm_posts": 0, "prompt": None, "parse_fail": False}
+
+    def _finish_turn(self):
+        t = self._turn
+        if t is None:
+            return
+        self.turns += 1
+        for p in t["patterns"]:
+            self.pattern_turns[p] += 1
+        if t["function"]:
+            outcome = "function_called"
+        elif t["parse_fail"] and any("fences" in p or "DID NOT invoke" in p for p in t["patterns"]):
+            outcome = "function_call_lost"      # the model tried to call a tool, the call was not parsed
+        else:
+            outcome = "direct_answer"
+        self.outcomes[outcome] += 1
+        self.round_trips[max(t["responses"], t["llm_posts"])] += 1
+        self.turn_duration.add(t["last"] - t["start"])
+        if t["prompt"]:
+            pos = min(self._position, MAX_TURN_POSITION)
+            self.prompt_by_position.setdefault(pos, LogHistogram()).add(t["prompt"])
+        self._turn = None
+
+    def _step(self, ts, label):
+        t = self._turn
+        key = f"{t['last_label']} -> {label}"
+        self.transitions.setdefault(key, LogHistogram()).add(max(0.0, ts - t["last"]))
+        t["last"], t["last_label"] = ts, label
+
+    # ---- input ----
+    def feed(self, ts, level, msg, size):
+        self.records += 1
+        kind, detail = classify(level, msg)
+        if kind == "conversation":
+            self._finish_turn()
+            self.conversations += 1
+            self._position = 0
+            return
+        if kind == "query":
+            self._start_turn(ts)
+            return
+        if kind == "parse":
+            self.pattern_counts[detail] += 1
+        elif kind == "function":
+            self.tools[detail] += 1
+        elif kind == "retry":
+            self.retries += 1
+        elif kind == "http":
+            if detail:
+                self.http_status[f"{detail[0]} {detail[1]}"] += 1
+        elif kind == "error":
+            self.errors[detail] += 1
+
+        t = self._turn
+        if t is None:
+            return
+        if kind == "parse":
+            t["patterns"].add(detail)
+            t["parse_fail"] = t["parse_fail"] or "FAIL" in detail
+        elif kind == "function":
+            t["function"] = detail
+        elif kind == "llm_response":
+            t["responses"] += 1
+            if msg.startswith("RESPONSE FROM LAB"):
+                # Older logs: the raw LabLLM answer echoes the whole prompt, its size approximates the prompt size.
+                t["prompt"] = max(t["prompt"] or 0, size)
+        elif kind == "prompt" and detail:
+            t["prompt"] = max(t["prompt"] or 0, detail)
+        elif kind == "http" and detail and detail[0] == "POST":
+            t["llm_posts"] += 1
+        if kind in self.TIMELINE_KINDS:
+            label = f"{detail.upper()} RESPONSE" if kind == "llm_response" else self.LABELS[kind]
+            if label != t["last_label"]:
+                self._step(ts, label)
+            else:
+                t["last"] = ts
+
+    def feed_file(self, path, follow=False, poll=1.0):
+        """ Reads a whole file; with follow=True keeps reading what is appended, like tail -f. """
+        self.files += 1
+        reader = read_jsonl_records if ".jsonl" in Path(path).name else read_text_records
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for record in reader(_lines(f, follow, poll)):
+                self.feed(*record)
+        self._finish_turn()
+
+    # ---- output ----
+    def report(self):
+        turns = max(self.turns, 1)
+        return {
+            "files": self.files, "records": self.records, "conversations": self.conversations, "turns": self.turns,
+            "outcomes": dict(self.outcomes.most_common()),
+            "parse_patterns": {p: {"count": c, "turns": self.pattern_turns[p], "turn_rate": round(self.pattern_turns[p] / turns, 3)}
+                               for p, c in self.pattern_counts.most_common()},
+            "tools": dict(self.tools.most_common()),
+            "llm_round_trips_per_turn": dict(sorted(self.round_trips.items())),
+            "retries": self.retries,
+            "http_status": dict(self.http_status.most_common()),
+            "errors": dict(self.errors.most_common()),
+            "turn_duration_s": self.turn_duration.summary(),
+            "transitions_s": {k: h.summary() for k, h in sorted(self.transitions.items(), key=lambda kv: -kv[1].total)},
+            "prompt_chars_by_turn": {pos: h.summary() for pos, h in sorted(self.prompt_by_position.items())},
+        }
+
+
+def _lines(f, follow, poll):
+    while True:
+        line = f.readline()
+        if line:
+            yield line
+        elif follow:
+            time.sleep(poll)
+        else:
+            return
+
+
+def print_report(r, out=sys.stdout):
+    w = lambda s="": print(s, file=out)
+    fmt = lambda v: "-" if v is None else f"{v:.2f}"
+    w(f"{r['files']} files, {r['records']} records, {r['conversations']} conversations, {r['turns']} turns")
+    w("\nTURN OUTCOMES")
+    for k, v in r["outcomes"].items():
+        w(f"  {k:<28}{v:>7}{v / max(r['turns'], 1):>8.1%}")
+    w("\nPARSE PATTERNS                                                          count   turns  % turns")
+    for p, s in r["parse_patterns"].items():
+        w(f"  {p[:68]:<68}{s['count']:>7}{s['turns']:>8}{s['turn_rate']:>8.1%}")
+    w("\nTOOL CALLS")
+    for k, v in r["tools"].items():
+        w(f"  {k:<28}{v:>7}")
+    w("\nLLM ROUND TRIPS PER TURN  " + "  ".join(f"{k}: {v}" for k, v in r["llm_round_trips_per_turn"].items()))
+    w(f"RETRIES {r['retries']}   HTTP " + "  ".join(f"{k}: {v}" for k, v in r["http_status"].items()))
+    if r["errors"]:
+        w("ERRORS  " + "  ".join(f"{k}: {v}" for k, v in r["errors"].items()))
+    d = r["turn_duration_s"]
+    w(f"\nTURN DURATION (s)  p50 {fmt(d['p50'])}  p95 {fmt(d['p95'])}  max {fmt(d['max'])}")
+    w("\nINTER-EVENT LATENCY (s), by total time                         count    total      p50      p95")
+    for k, s in r["transitions_s"].items():
+        w(f"  {k[:60]:<60}{s['count']:>7}{s['total']:>9.1f}{fmt(s['p50']):>9}{fmt(s['p95']):>9}")
+    w("\nPROMPT SIZE BY TURN OF THE CONVERSATION (chars)   count      mean       p95")
+    for pos, s in r["prompt_chars_by_turn"].items():
+        label = f"{pos}+" if int(pos) == MAX_TURN_POSITION else str(pos)
+        w(f"  turn {label:<42}{s['count']:>7}{s['mean']:>10.0f}{s['p95']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming analysis of the chat logs: parse failures, tool calls, latencies, prompt growth.")
+    parser.add_argument("paths", nargs="*", help="log files or glob patterns (default: logs/*.log logs/*.jsonl*)")
+    parser.add_argument("--follow", action="store_true", help="keep reading the (single) file as it grows; Ctrl-C prints the report")
+    parser.add_argument("--json", default=None, help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    paths = sorted({p for pattern in (args.paths or DEFAULT_INPUTS) for p in glob.glob(pattern)})
+    if not paths:
+        sys.exit("No log files found.")
+    if args.follow and len(paths) > 1:
+        sys.exit("--follow works on a single file.")
+
+    analyzer = Analyzer()
+    try:
+        for path in paths:
+            analyzer.feed_file(path, follow=args.follow)
+    except KeyboardInterrupt:
+        analyzer._finish_turn()
+    report = analyzer.report()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
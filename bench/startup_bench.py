@@ -0,0 +1,115 @@
+"""
+Startup-time benchmark for the chat host + MCP server, against local stubs (no network, no LLM quota).
+
+Phases measured for every run:
+- server_import: importing server/server.py in a fresh interpreter
+- host_init:     MCPHost() construction (LabLLM login starts in background)
+- connect:       server process spawn + MCP initialize + primitives discovery
+- auth_ready:    time from MCPHost() until the LabLLM token is available
+- ready:         time until the chat can accept the first query (max of the two above)
+
+Usage (from the repository root):
+    python bench/startup_bench.py --runs 10 --output startup.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.absolute()
+HOME_DIR = BENCH_DIR.parent
+CHAT_DIR = HOME_DIR / "chat"
+SERVER_DIR = HOME_DIR / "server"
+sys.path.insert(0, str(BENCH_DIR))
+
+from stubs import StubServer, llm_routes, stub_environment, tpl_routes
+
+PHASES = ["server_import", "host_init", "connect", "auth_ready", "ready"]
+
+
+def measure_server_import():
+    code = (
+        "import sys, time; t = time.perf_counter(); "
+        f"sys.path.insert(0, {str(SERVER_DIR)!r}); import server; "
+        "print(time.perf_counter() - t)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=os.environ.copy(), cwd=CHAT_DIR)
+    if out.returncode != 0:
+        raise RuntimeError(f"server import failed:\n{out.stderr}")
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+async def measure_host(host_module, db_path):
+    t0 = time.perf_counter()
+    host = host_module.MCPHost(store=host_module.ConversationStore(db_path))
+    t_init = time.perf_counter()
+    try:
+        await host.connect_to_server(str(SERVER_DIR / "server.py"))
+        t_connect = time.perf_counter()
+        if host.lab_llm._auth_thread is not None:
+            await asyncio.to_thread(host.lab_llm._auth_thread.join)
+        host.lab_llm.ensure_authenticated()
+        t_auth = time.perf_counter()
+    finally:
+        await host.cleanup()
+    return {
+        "host_init": t_init - t0,
+        "connect": t_connect - t_init,
+        "auth_ready": t_auth - t0,
+        "ready": max(t_connect, t_auth) - t0,
+    }
+
+
+def summarize(runs):
+    summary = {}
+    for phase in PHASES:
+        values = [r[phase] for r in runs]
+        summary[phase] = {
+            "min_ms": min(values) * 1000,
+            "median_ms": statistics.median(values) * 1000,
+            "max_ms": max(values) * 1000,
+        }
+    return summary
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure chat/server startup time against local stubs.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    with StubServer(tpl_routes()) as tpl, StubServer(llm_routes()) as llm:
+        workdir = tempfile.mkdtemp(prefix="mcp-snap-startup-")
+        os.environ.update(stub_environment(f"{tpl.url}/superservicemap/api/v1", f"{llm.url}/llama4-inference", workdir))
+
+        # host.py expects to be run from chat/ (system message, relative paths)
+        os.chdir(CHAT_DIR)
+        sys.path.insert(0, str(CHAT_DIR))
+        import host as host_module
+
+        runs = []
+        for i in range(args.runs):
+            run = {"server_import": measure_server_import()}
+            run.update(await measure_host(host_module, os.path.join(workdir, f"run{i}.db")))
+            runs.append(run)
+
+    summary = summarize(runs)
+    print(f"\n{'phase':<15}{'min ms':>10}{'median ms':>12}{'max ms':>10}")
+    for phase, s in summary.items():
+        print(f"{phase:<15}{s['min_ms']:>10.1f}{s['median_ms']:>12.1f}{s['max_ms']:>10.1f}")
+
+    if output:
+        result = {"benchmark": "startup", "timestamp": time.time(), "python": sys.version.split()[0], "runs": runs, "summary": summary}
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
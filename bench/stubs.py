@@ -0,0 +1,204 @@
+"""
+Local stand-ins for the external services used by MCP Snap, so that benchmarks run offline and are reproducible.
+
+- StubServer: a tiny threaded HTTP server. Each route is a function (method, path, query, body) -> (status, json_obj).
+  Every answer can be delayed by a fixed latency plus a random jitter.
+- tpl_routes(): the Snap4City endpoints under TPL_BASE_URL, answered with the JSON files in bench/fixtures/.
+- llm_routes(): a ClearML-like LLM endpoint that answers {"prompt": ..., "answer": ...}, optionally following a script.
+- stub_environment(): the SNAP_*/LABLLM_* variables that point host, server and LabLLM to the stubs.
+- server_settings(): by default, the variables that turn off the response caches, the prefetcher and the
+  client-side upstream limits, so that a benchmark measures the server and not cache hits or its own token bucket.
+"""
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = Path(__file__).parent.absolute() / "fixtures"
+
+
+class StubServer:
+    def __init__(self, routes, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, seed=0):
+        """
+        routes: dict {path_prefix: handler}. The longest matching prefix wins.
+        latency, jitter: every answer is delayed by latency + uniform(0, jitter) seconds.
+        """
+        self.routes = dict(routes)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                stub._delay()
+                handler = stub._match(parsed.path)
+                if handler is None:
+                    status, payload = 404, {"error": f"no stub for {parsed.path}"}
+                else:
+                    status, payload = handler(method, parsed.path, query, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+
+    def _delay(self):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _match(self, path):
+        best = None
+        for prefix in self.routes:
+            if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return self.routes[best] if best is not None else None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ========== SNAP4CITY ==========
+# path (relative to TPL_BASE_URL) -> fixture file. The longest matching prefix wins, "" is the services search.
+TPL_FIXTURES = {
+    "": "services.json",
+    "/iot-search": "iot_search.json",
+    "/iot-search/time-range": "iot_time_range.json",
+    "/events": "events.json",
+    "/location": "location.json",
+    "/shortestpath": "shortestpath.json",
+    "/tpl": "tpl_geo_search.json",
+    "/tpl/agencies": "agencies.json",
+    "/tpl/bus-lines": "bus_lines.json",
+    "/tpl/bus-routes": "bus_routes.json",
+    "/tpl/bus-stops": "bus_stops.json",
+    "/tpl/bus-position": "bus_position.json",
+}
+
+
+def tpl_routes(base_path="/superservicemap/api/v1", fixtures_dir=FIXTURES_DIR):
+    """ Serves the recorded fixtures. Each file is read once: the same decoded object is served every time. """
+    def serve(payload):
+        return lambda method, path, query, body: (200, payload)
+
+    routes = {}
+    for rel_path, filename in TPL_FIXTURES.items():
+        with open(Path(fixtures_dir) / filename, encoding="utf-8") as f:
+            routes[base_path + rel_path] = serve(json.load(f))
+    return routes
+
+
+# ========== LAB LLM ==========
+def _last_turn(prompt):
+    """
+    The LabLLM prompt is str(messages). Returns (text of the last user message onwards, True if a function result follows it).
+    """
+    user_at = prompt.rfind("'role': 'user'")
+    tail = prompt[user_at:] if user_at >= 0 else prompt
+    return tail, "'role': 'function'" in tail
+
+
+def llm_routes(answer="Hello! How can I help you?", path="/llama4-inference", script=None):
+    """
+    script: optional list of {"match": str, "first_answer": str, "final_answer": str}. The first rule whose `match`
+    is in the last user message is used: `first_answer` for the first call of the turn (e.g. a function_call JSON),
+    `final_answer` once the function result is in the conversation. Without a matching rule, `answer` is used.
+    """
+    def completion(method, path, query, body):
+        prompt = json.loads(body or b"{}").get("params", {}).get("prompt", "")
+        tail, after_function = _last_turn(prompt)
+        reply = answer
+        for rule in script or []:
+            if rule["match"] in tail:
+                reply = rule.get("final_answer", answer) if after_function else rule.get("first_answer", answer)
+                break
+        return 200, {"prompt": prompt, "answer": reply}
+
+    return {path: completion}
+
+
+# Response caches, prefetches and the upstream scheduler limits, all off.
+COLD_SERVER_SETTINGS = {
+    "SNAP_LOCATION_CACHE_SIZE": "0",
+    "SNAP_SERVICES_CACHE_SIZE": "0",
+    "SNAP_SERVICES_LIVE_CACHE_SIZE": "0",
+    "SNAP_IOT_CACHE_SIZE": "0",
+    "SNAP_TPL_CACHE_SIZE": "0",
+    "SNAP_BUS_STOPS_CACHE_SIZE": "0",
+    "SNAP_PREFETCH_PER_MINUTE": "0",
+    "SNAP_UPSTREAM_RATE": "0",
+    "SNAP_UPSTREAM_CONCURRENCY": "1000",
+}
+
+
+def server_settings(warm_caches=False):
+    """ SNAP_* variables for the server under test: none with `warm_caches`, COLD_SERVER_SETTINGS otherwise. """
+    return {} if warm_caches else dict(COLD_SERVER_SETTINGS)
+
+
+def bench_mode(warm_caches):
+    return "warm caches, default upstream limits" if warm_caches else "caches, prefetch and upstream limits off"
+
+
+def stub_environment(tpl_url, llm_url, workdir=None):
+    """
+    Writes fake credentials and an already valid token (so TokenManager never goes to the network)
+    and returns the environment variables that redirect every upstream call to the stubs.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="mcp-snap-bench-")
+    credentials = os.path.join(workdir, "user_credentials.json")
+    token_store = os.path.join(workdir, "token_stored.json")
+    with open(credentials, "w") as f:
+        json.dump({"username": "bench", "password": "bench"}, f)
+    with open(token_store, "w") as f:
+        json.dump({"access_token": "stub-token", "refresh_token": None, "token_expiry": time.time() + 86400}, f)
+    return {
+        "SNAP_TPL_BASE_URL": tpl_url,
+        "LABLLM_API_BASE_URL": llm_url,
+        "LABLLM_CREDENTIALS": credentials,
+        "LABLLM_TOKEN_STORE": token_store,
+    }
@@ -0,0 +1,223 @@
+"""
+Checks and fixes the arguments of a function call before it reaches the server.
+
+Every tool inputSchema is compiled once (connect_to_server) into one coercer per argument:
+
+    checker = ArgumentChecker(tools)
+    args, errors, fixes = checker.check("tpl_geo_search", {"selection": "43.77322, 11.25668", "maxDists": "500 m"})
+    # args   = {'selection': '43.77322;11.25668', 'maxDists': '0.5'}
+    # fixes  = ["selection: '43.77322, 11.25668' -> '43.77322;11.25668'", "maxDists: '500 m' -> '0.5'"]
+
+What is fixed locally (no upstream error, no extra LLM call):
+- coordinates written as 'lat, lon', '(lat lon)', [lat, lon] or {"lat":..,"lon":..} -> 'lat;lon' (also 4-number boxes);
+- distances with a unit ('500 m', '2 km', '1,5 km') -> km, the unit of every maxDists of the server;
+- numbers, booleans and lists sent where the schema wants a string (lists are joined with ';', as in categories);
+- numeric strings where it wants an integer/number/boolean, enum values with the wrong case,
+  argument names with the wrong case or underscores (route_type -> routeType).
+
+What is rejected, with a hint for the model: missing required arguments, coordinates out of range,
+values that cannot be converted, unknown tools. Unknown arguments are dropped (the server would ignore them).
+"""
+import difflib
+import re
+
+from tool_index import ARG_TYPE_PREFIX, first_sentence, split_description
+
+COORD_KEYS = {"selection", "position", "source", "destination"}
+DISTANCE_KEYS = {"maxDists"}
+
+NUMBER = r"[-+]?\d+(?:\.\d+)?"
+COORDINATES = re.compile(rf"^[\s(\[]*({NUMBER})\s*[,;\s]\s*({NUMBER})(?:\s*[,;\s]\s*({NUMBER})\s*[,;\s]\s*({NUMBER}))?[\s)\]]*$")
+DISTANCE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*(km|kilometers?|kilometri|chilometri|m|meters?|metri)?\s*$", re.IGNORECASE)
+TRUE_WORDS = {"true", "1", "yes", "si", "sì"}
+FALSE_WORDS = {"false", "0", "no"}
+
+
+class InvalidArgument(ValueError):
+    pass
+
+
+def _number(value):
+    """ 2.0 -> '2', 0.5 -> '0.5' (same as intent_predictor, no '%g' rounding). """
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _key(name):
+    return name.replace("_", "").replace("-", "").lower()
+
+
+# ========== VALUE NORMALIZATION ==========
+def normalize_coordinates(value):
+    """ 'lat;lon' / 'lat1;lon1;lat2;lon2' from the usual ways of writing them; other selections unchanged. """
+    if isinstance(value, dict):
+        lat = value.get("lat", value.get("latitude"))
+        lon = value.get("lon", value.get("lng", value.get("longitude")))
+        if lat is None or lon is None:
+            raise InvalidArgument("expected 'lat;lng', e.g. 43.7756;11.2490")
+        value = [lat, lon]
+    if isinstance(value, (list, tuple)):
+        value = ";".join(str(v) for v in value)
+    text = str(value).strip()
+    match = COORDINATES.match(text)
+    if not match:
+        return text  # wkt:..., geo:..., a text search
+    numbers = [float(g) for g in match.groups() if g is not None]
+    for lat, lon in zip(numbers[::2], numbers[1::2]):
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            raise InvalidArgument(f"{text!r} is not a valid 'lat;lng' (latitude first, e.g. 43.7756;11.2490)")
+    return ";".join(match.group(i + 1) for i in range(len(numbers)))
+
+
+def normalize_distance(value):
+    """ Kilometres as a string: 0.5 -> '0.5', '500 m' -> '0.5', '2 km' -> '2'. 'inside' is kept. """
+    if isinstance(value, bool):
+        raise InvalidArgument("expected a distance in km, e.g. 0.5")
+    if isinstance(value, (int, float)):
+        return _number(value)
+    text = str(value).strip()
+    if text.lower() == "inside":
+        return "inside"
+    match = DISTANCE.match(text)
+    if not match:
+        raise InvalidArgument(f"{text!r} is not a distance: use km, e.g. 0.5 (or 'inside')")
+    km = float(match.group(1).replace(",", "."))
+    unit = (match.group(2) or "km").lower()
+    if not unit.startswith(("k", "c")):
+        km /= 1000
+    return _number(km)
+
+
+# ========== COERCERS BY SCHEMA TYPE ==========
+def _to_string(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return _number(value)
+    if isinstance(value, (list, tuple)) and all(not isinstance(v, (list, dict)) for v in value):
+        return ";".join(_to_string(v) for v in value)
+    if isinstance(value, dict):
+        raise InvalidArgument("expected a string, got an object")
+    return str(value)
+
+
+def _to_integer(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise InvalidArgument(f"{value!r} is not an integer")
+    if isinstance(value, bool) or not number.is_integer():
+        raise InvalidArgument(f"{value!r} is not an integer")
+    return int(number)
+
+
+def _to_number(value):
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        return float(str(value).replace(",", ".")) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        raise InvalidArgument(f"{value!r} is not a number")
+
+
+def _to_boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_WORDS:
+        return True
+    if text in FALSE_WORDS:
+        return False
+    raise InvalidArgument(f"{value!r} is not true/false")
+
+
+COERCERS = {"string": _to_string, "integer": _to_integer, "number": _to_number, "boolean": _to_boolean}
+
+
+def _enum(allowed):
+    by_key = {str(a).lower(): a for a in allowed}
+
+    def check(value):
+        if value in allowed:
+            return value
+        if str(value).lower() in by_key:
+            return by_key[str(value).lower()]
+        raise InvalidArgument(f"{value!r} is not one of {', '.join(map(str, allowed))}")
+    return check
+
+
+def _compile_property(name, prop):
+    """ The list of steps for one argument: coordinate/distance normalization first, then type coercion and enum. """
+    variants = prop.get("anyOf", [prop])
+    types = [v.get("type") for v in variants if v.get("type") not in (None, "null")]
+    steps = []
+    if len(types) == 1 and types[0] in COERCERS:
+        steps.append(COERCERS[types[0]])
+    allowed = next((v["enum"] for v in variants if "enum" in v), None)
+    if allowed:
+        steps.append(_enum(allowed))
+    if name in COORD_KEYS and "string" in types:
+        steps.insert(0, normalize_coordinates)
+    if name in DISTANCE_KEYS and "string" in types:
+        steps.insert(0, normalize_distance)
+    return steps
+
+
+# ========== COMPILED TOOL ==========
+class ToolValidator:
+    def __init__(self, tool):
+        schema = getattr(tool, "inputSchema", None) or {}
+        _, arg_docs = split_description(getattr(tool, "description", None))
+        self.name = tool.name
+        self.required = list(schema.get("required", []))
+        self.steps = {name: _compile_property(name, prop) for name, prop in schema.get("properties", {}).items()}
+        self.aliases = {_key(name): name for name in self.steps}
+        self.docs = {name: first_sentence(ARG_TYPE_PREFIX.sub("", doc), 120) for name, doc in arg_docs.items()}
+
+    def check(self, args):
+        """ (fixed arguments, errors, fixes). The call must not be made if there are errors. """
+        fixed, errors, fixes = {}, [], []
+        for name, value in (args or {}).items():
+            target = name if name in self.steps else self.aliases.get(_key(name))
+            if target is None:
+                fixes.append(f"{name}: unknown argument, dropped")
+                continue
+            if target != name:
+                fixes.append(f"{name} -> {target}")
+            if value is None:
+                continue
+            try:
+                new = value
+                for step in self.steps[target]:
+                    new = step(new)
+            except InvalidArgument as e:
+                errors.append(f"{target}: {e}")
+                continue
+            if new != value:
+                fixes.append(f"{target}: {value!r} -> {new!r}")
+            fixed[target] = new
+        for name in self.required:
+            if name not in fixed and not any(e.startswith(f"{name}:") for e in errors):
+                doc = self.docs.get(name)
+                errors.append(f"{name}: missing required argument" + (f" ({doc})" if doc else ""))
+        return fixed, errors, fixes
+
+
+class ArgumentChecker:
+    def __init__(self, tools):
+        self.validators = {t.name: ToolValidator(t) for t in tools}
+
+    def check(self, fn_name, args):
+        """ Same as ToolValidator.check; resources and prompts are not checked. """
+        if fn_name.startswith(("resource_", "use_prompt_")):
+            return args, [], []
+        validator = self.validators.get(fn_name)
+        if validator is None:
+            close = difflib.get_close_matches(fn_name, list(self.validators), n=3)
+            hint = f" Did you mean: {', '.join(close)}?" if close else ""
+            return args, [f"unknown tool '{fn_name}'.{hint}"], []
+        return validator.check(args)
+
+
+def error_hint(fn_name, errors):
+    """ Function result shown to the model when a call is rejected before dispatch. """
+    return f"The call to {fn_name} was not made, its arguments are invalid:\n" + "\n".join(f"- {e}" for e in errors)
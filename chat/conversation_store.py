@@ -0,0 +1,236 @@
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+from common import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+# ========== DEFAULTS ==========
+DEFAULT_DB_PATH = Path(__file__).parent / "conversations.db"
+BLOB_THRESHOLD = 4096    # function results longer than this (chars) are stored out-of-line
+PREVIEW_CHARS = 400      # how much of an out-of-line payload stays in the working window
+WRITE_BATCH = 64         # max queued writes committed in a single transaction
+WRITE_RETRIES = 3        # attempts for a batch that fails with OperationalError (e.g. database locked)
+RETRY_DELAY = 0.5        # seconds between two attempts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id          TEXT PRIMARY KEY,
+    created_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id     TEXT NOT NULL REFERENCES sessions(id),
+    seq            INTEGER NOT NULL,
+    role           TEXT NOT NULL,
+    name           TEXT,
+    content        TEXT,
+    function_call  TEXT,
+    blob_id        TEXT,
+    created_at     REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    id     TEXT PRIMARY KEY,
+    size   INTEGER NOT NULL,
+    data   BLOB NOT NULL
+);
+"""
+
+_STOP = object()
+
+
+def bounded_window(messages, max_messages):
+    """
+    Returns the last `max_messages` messages of a conversation, never starting in the middle of a turn.
+    The window always starts at a "user" message, so a function result is never separated from the call that produced it.
+    """
+    if len(messages) <= max_messages:
+        return list(messages)
+    start = len(messages) - max_messages
+    while start < len(messages) and messages[start].get("role") != "user":
+        start += 1
+    return list(messages[start:])
+
+
+class ConversationStore:
+    """
+    SQLite (WAL) store for the chat history.
+
+    - Writes are queued and committed by a background thread, so the chat loop never waits on disk.
+    - Function results bigger than `blob_threshold` are saved once in `blobs` (zlib, keyed by sha256)
+      and the message row only keeps the reference. The working window holds a short preview instead.
+    - Reads use their own connection: with WAL they never block the writer.
+    """
+    def __init__(self, db_path=DEFAULT_DB_PATH, blob_threshold=BLOB_THRESHOLD):
+        self.db_path = str(db_path)
+        self.blob_threshold = blob_threshold
+        self._seq = {}
+        self._queue = queue.Queue()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ========== SESSIONS ==========
+    def new_session(self):
+        session_id = uuid.uuid4().hex[:12]
+        self._seq[session_id] = 0
+        self._queue.put(("INSERT INTO sessions (id, created_at) VALUES (?, ?)", (session_id, time.time())))
+        return session_id
+
+    def open_session(self, session_id):
+        """
+        Prepares an existing session to receive new messages. Raises KeyError if it does not exist.
+        """
+        conn = self._connect()
+        try:
+            if conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is None:
+                raise KeyError(f"Conversation '{session_id}' not found in {self.db_path}")
+            row = conn.execute("SELECT MAX(seq) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        finally:
+            conn.close()
+        # Writes still queued for this session are already counted in self._seq
+        self._seq[session_id] = max(self._seq.get(session_id, 0), (row[0] or 0))
+        return session_id
+
+    # ========== WRITE ==========
+    def append(self, session_id, message):
+        """
+        Queues `message` for storage and returns the form it should take in the working window:
+        the message itself, or a compact copy that references the out-of-line payload.
+        """
+        self._seq[session_id] = seq = self._seq.get(session_id, 0) + 1
+        content = message.get("content")
+        function_call = message.get("function_call")
+        blob_id = None
+        compact = message
+
+        if message.get("role") == "function" and isinstance(content, str) and len(content) > self.blob_threshold:
+            raw = content.encode("utf-8")
+            blob_id = hashlib.sha256(raw).hexdigest()
+            self._queue.put((
+                "INSERT OR IGNORE INTO blobs (id, size, data) VALUES (?, ?, ?)",
+                (blob_id, len(raw), zlib.compress(raw)),
+            ))
+            compact = dict(message, content=self._preview(content, blob_id))
+            content = None
+
+        self._queue.put((
+            "INSERT INTO messages (session_id, seq, role, name, content, function_call, blob_id, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                session_id, seq, message.get("role"), message.get("name"), content,
+                jsoncodec.dumps(function_call) if function_call is not None else None,
+                blob_id, time.time(),
+            ),
+        ))
+        return compact
+
+    def _preview(self, content, blob_id):
+        return f"{content[:PREVIEW_CHARS]} ... [full result stored out-of-line as blob:{blob_id[:16]}, {len(content)} chars]"
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(b is _STOP for b in batch)
+            try:
+                self._commit(conn, [b for b in batch if b is not _STOP])
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                break
+        conn.close()
+
+    def _commit(self, conn, batch):
+        """
+        Writes a batch in one transaction, retrying on OperationalError (e.g. database locked). If it keeps failing,
+        the writes are committed one by one and only the failing ones are logged and dropped: the writer goes on.
+        """
+        for attempt in range(1, WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    for b in batch:
+                        conn.execute(*b)
+                return
+            except sqlite3.OperationalError:
+                if attempt < WRITE_RETRIES:
+                    time.sleep(RETRY_DELAY)
+            except sqlite3.Error:
+                break
+        for b in batch:
+            try:
+                with conn:
+                    conn.execute(*b)
+            except sqlite3.Error as e:
+                logger.error("Conversation write dropped (%s): %s", e, b[0].split("(")[0].strip())
+
+    def flush(self):
+        """ Blocks until every queued write has been committed. """
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    # ========== READ ==========
+    def load_messages(self, session_id, limit=None):
+        """
+        Returns the last `limit` messages of a session (all of them if None), oldest first.
+        Out-of-line payloads are not expanded: they come back as the same preview used in the working window.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT m.role, m.name, m.content, m.function_call, m.blob_id, b.data "
+                "FROM messages m LEFT JOIN blobs b ON b.id = m.blob_id "
+                "WHERE m.session_id = ? ORDER BY m.seq DESC LIMIT ?",
+                (session_id, -1 if limit is None else limit),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        messages = []
+        for role, name, content, function_call, blob_id, data in reversed(rows):
+            msg = {"role": role}
+            if name is not None:
+                msg["name"] = name
+            if blob_id is not None:
+                content = self._preview(zlib.decompress(data).decode("utf-8"), blob_id) if data else f"[missing blob:{blob_id[:16]}]"
+            msg["content"] = content
+            if function_call is not None:
+                msg["function_call"] = jsoncodec.loads(function_call)
+            messages.append(msg)
+        return messages
+
+    def load_blob(self, blob_id):
+        """ Returns the full payload of an out-of-line result (a 16+ char prefix of the id is enough). """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT data FROM blobs WHERE id LIKE ?", (blob_id + "%",)).fetchone()
+        finally:
+            conn.close()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
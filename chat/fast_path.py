@@ -0,0 +1,80 @@
+"""
+Deterministic fast path: queries whose tool call is obvious ("list all tpl agencies", "bus position for line 6")
+are routed without the first LLM call.
+
+- The intent comes from intent_predictor.py; only predictions at or above `threshold` are routed, and only if no
+  other rule applies to the query.
+- If the tool fails or returns nothing, the host falls back to the normal path, as if the router had said nothing.
+- For simple lists the answer is a template, so no LLM call at all; otherwise only the final
+  natural-language rendering goes to the LLM.
+"""
+from common import jsoncodec
+from intent_predictor import IntentPredictor
+
+FAST_PATH_MIN_CONFIDENCE = 0.9
+
+
+# ========== TEMPLATES ==========
+# Tool name -> function (decoded result, arguments) -> answer text, or None to let the LLM write the answer.
+def _agencies(data, _args):
+    agencies = data.get("Agencies") if isinstance(data, dict) else None
+    if not agencies:
+        return None
+    return "Public transport agencies:\n" + "\n".join(f"- {a.get('name')}" for a in agencies)
+
+
+def _bus_routes(data, args):
+    routes = data.get("BusRoutes") if isinstance(data, dict) else None
+    if not routes:
+        return None
+    lines = [f"- {r.get('routeName')}: {r.get('firstStop')} → {r.get('lastStop')}" for r in routes]
+    return f"Routes of line {args.get('line')}:\n" + "\n".join(lines)
+
+
+def _bus_position(data, args):
+    features = data.get("features") if isinstance(data, dict) else None
+    if not features:
+        return None
+    rows = []
+    for f in features:
+        p = f.get("properties") or {}
+        delay = p.get("delay")
+        late = "" if not isinstance(delay, (int, float)) else (f", {round(delay / 60)} min late" if delay > 60 else (f", {round(-delay / 60)} min early" if delay < -60 else ", on time"))
+        rows.append(f"- line {p.get('line')} vehicle {p.get('vehicleNum')} towards {p.get('direction')}, last stop {p.get('lastStopName')} at {str(p.get('lastStopTime', ''))[11:16]}{late}")
+    title = f"Buses of line {args['line']} right now:" if args.get("line") else "Buses right now:"
+    return title + "\n" + "\n".join(rows)
+
+
+TEMPLATES = {
+    "resource_get_agencies": _agencies,
+    "get_bus_routes": _bus_routes,
+    "get_bus_position": _bus_position,
+}
+
+
+def render(tool, result_text, args):
+    """ Template answer for a tool result (JSON text), or None if there is no template or the result does not fit it. """
+    template = TEMPLATES.get(tool)
+    if template is None:
+        return None
+    try:
+        data = jsoncodec.loads(result_text)
+    except (TypeError, ValueError):
+        return None
+    return template(data, args)
+
+
+class FastPathRouter:
+    def __init__(self, tool_names, threshold=FAST_PATH_MIN_CONFIDENCE, predictor=None):
+        self.threshold = threshold
+        self.predictor = predictor or IntentPredictor(tool_names)
+
+    def route(self, query):
+        """
+        Prediction to execute directly, or None for the normal path.
+        Only when exactly one rule applies: if another tool could also be meant, the LLM decides.
+        """
+        found = self.predictor.predict_all(query)
+        if len(found) != 1 or found[0].confidence < self.threshold:
+            return None
+        return found[0]
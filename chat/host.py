@@ -1,32 +1,40 @@
-import subprocess
 import os
+import re
+import shutil
 import asyncio
-import json
 import sys
 from typing import Optional
 from contextlib import AsyncExitStack
 import logging
 import traceback
+import argparse
 from pathlib import Path
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from snap4_prompts import Snap4Prompts
-from tool_schema_builder import build_system_tools
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client, get_default_environment
 
 # Path for llama4. TBR
 current_dir = Path(__file__).parent.absolute()
 home_dir = current_dir.parent
 sys.path.insert(0, str(home_dir))
 from llama4.lab_llm import LabLLM 
+from common.log_setup import configure_logging
+from common.tracing import tracer, SPAN_KIND_CLIENT
+from common import jsoncodec
+# Local modules after the path setup: some of them use common/ too.
+from snap4_prompts import Snap4Prompts
+from tool_schema_builder import build_system_tools
+from conversation_store import ConversationStore, bounded_window
+from tool_index import ToolIndex
+from intent_predictor import IntentPredictor, same_call
+from fast_path import FastPathRouter, render as render_template
+from result_encoder import encode_result, result_text
+from arg_validator import ArgumentChecker, error_hint
 # ========== LOGGING TO BE FOUND IN /logs/ ==========
-logging.basicConfig(
-    filename="logs/llm_output.log",
-    level=logging.INFO,
-    format="%(asctime)s %(message)s",
-    encoding="utf-8",
-)
+# JSON lines written by a background thread. Big objects go in extra={"payload": ...}, see common/log_setup.py
+configure_logging("llm_output.jsonl")
 logger = logging.getLogger(__name__)
+tracer.service_name = "host"
 
 # ========== COLORS FOR BASH ========== 
 RED = '\033[91m'
@@ -34,52 +42,70 @@ GREEN = '\033[92m'
 BLUE = '\033[94m'
 NC = '\033[0m'
 
+ANSI_ESCAPE = re.compile(r'\033\[[0-9;]*m')
+
 def print_centered(text_to_center_or_fstring):
     """
-    Esegue lo script Bash utility.sh per centrare il testo.
-    Accetta qualsiasi stringa, incluse quelle costruite con f-string.
+    Prints the text centered in the terminal.
+    Accepts any string, f-strings included. Color codes are not counted in the text width.
     """
-    
-    # 1. (Il passaggio cruciale) Valuta la stringa in Python.
-    # Se 'text_to_center_or_fstring' è una f-stringa come 
-    # f"Il mio server {server_name}", qui viene trasformata in 
-    # una stringa semplice, ad esempio: "Il mio server MCP-1".
-    final_text = str(text_to_center_or_fstring) 
-    
-    script_path = os.path.join(os.path.dirname(__file__), 'utility.sh')
-    
-    command = [
-        "bash",       
-        script_path,  
-        final_text  # Passiamo la stringa *già* risolta
-    ]
-    
-    try:
-        # Nota: usiamo 'text=True' per gestire meglio le stringhe di testo
-        subprocess.run(command, check=True, capture_output=False, text=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Errore nell'esecuzione dello script Bash: {e}")
-    except FileNotFoundError:
-         print(f"Errore: File '{script_path}' non trovato.")
+    final_text = str(text_to_center_or_fstring)
+    cols = shutil.get_terminal_size().columns
+    indent = max((cols - len(ANSI_ESCAPE.sub("", final_text))) // 2, 0)
+    print(" " * indent + final_text)
 
 # ========== Load the system message ========== 
 with open("system_message.txt", "r", encoding="utf-8") as f:
     SYSTEM_MESSAGE = f.read()
 
+# ========== TOOL SELECTION ==========
+# Per turn, only the TOOL_TOP_K tools most relevant to the query are described (condensed) in the system message.
+# If no tool scores at least TOOL_MIN_SCORE, the full list is used.
+TOOL_TOP_K = 4
+TOOL_MIN_SCORE = 1.0
+
+# ========== CONVERSATION HISTORY ==========
+# Messages kept in memory (besides the system message). Everything is persisted in the ConversationStore anyway.
+HISTORY_WINDOW = 40
+
+# ========== SPECULATIVE TOOL CALLS ==========
+# While the first LLM call runs, the tool predicted locally (intent_predictor.py) is already called on the server.
+# If the model asks for the same call, its result is reused. Below this confidence nothing is started.
+SPECULATION_MIN_CONFIDENCE = 0.5
+
+# ========== SERVER METRICS ==========
+METRICS_URI = "metrics://snap"
+OPERATIONAL_RESOURCES = ("metrics://",)
+
 class MCPHost:
-    def __init__(self):
+    def __init__(self, store: Optional[ConversationStore] = None, session_id: Optional[str] = None, history_window: int = HISTORY_WINDOW):
         """
         - session and exit_stack are needed for the server.
         - openai and lab_llm are the connection to a LLM. Uncomment the one you need to use. 
             [TODO: make the code s.t. with this small change, it works with both. For now, it won't work.]
         - messages: the array of messages that will contain SYSTEM_MESSAGE, SERVER DESCRIPTION and the chat between ASSISTANT and USER.
+            It is only a bounded working window: the full conversation lives in `store` (SQLite).
+        - session_id: the conversation to resume. If None, a new conversation is started.
         """ 
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
         self.choose_prompt = Snap4Prompts()
         #self.openai = AsyncGroq(base_url="https://api.groq.com/")
-        self.lab_llm = LabLLM()
+        # Login runs in background while the server starts: it is awaited only by the first LLM call.
+        self.lab_llm = LabLLM(background_auth=True)
         self.messages = []
+        self.last_tool = None
+        self.last_trace_id = None
+        self.history_window = history_window
+        self.store = store or ConversationStore()
+        if session_id:
+            self.session_id = self.store.open_session(session_id)
+            # One row more than the window: if the session is longer, bounded_window() sees it and trims the
+            # partial turn at the start (a function result without its call, an answer without its question).
+            self.resumed = self.store.load_messages(session_id, limit=history_window + 1)
+        else:
+            self.session_id = self.store.new_session()
+            self.resumed = []
 
     async def connect_to_server(self, server_script_path: str):
         """
@@ -95,10 +121,13 @@ class MCPHost:
             raise ValueError('Server script path must end with .py')
 
         command = "python" 
+        # Besides the default safe environment, the server inherits the SNAP_*/LABLLM_* settings (e.g. local stubs).
+        server_env = get_default_environment()
+        server_env.update({k: v for k, v in os.environ.items() if k.startswith(("SNAP_", "LABLLM_"))})
         server_params = StdioServerParameters(
             command=command,
             args=[server_script_path],
-            env=None
+            env=server_env
         )
 
         stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
@@ -108,34 +137,41 @@ class MCPHost:
         await self.session.initialize()
 
         # ========== Fetch and store available tools, resources, and prompts ========== 
-        try:
-            tools_resp = await self.session.list_tools()
-            self.tools = tools_resp.tools
-        except Exception:
-            self.tools = []
-
-        try:
-            res_resp = await self.session.list_resources()
-            self.resources = res_resp.resources
-        except Exception:
-            self.resources = []
-
-        try:
-            prompt_resp = await self.session.list_prompts()
-            self.prompts = prompt_resp.prompts
-        except Exception:
-            self.prompts = []
+        # The three requests are independent: they are sent concurrently.
+        tools_resp, res_resp, prompt_resp = await asyncio.gather(
+            self.session.list_tools(),
+            self.session.list_resources(),
+            self.session.list_prompts(),
+            return_exceptions=True,
+        )
+        self.tools = [] if isinstance(tools_resp, BaseException) else tools_resp.tools
+        self.resources = [] if isinstance(res_resp, BaseException) else res_resp.resources
+        # Operational resources (e.g. metrics://snap) are for the user, not for the model.
+        self.resources = [r for r in self.resources if not str(r.uri).startswith(OPERATIONAL_RESOURCES)]
+        self.prompts = [] if isinstance(prompt_resp, BaseException) else prompt_resp.prompts
 
         # ========== SYSTEM MESSAGE + TOOL DEFINITION ==========
-        self.messages.append({"role": "system", "content": SYSTEM_MESSAGE + build_system_tools(self.tools, "TOOL") + build_system_tools(self.resources, "RESOURCE") })
+        # The full system message is the fallback: process_query() replaces it with a query-specific one at every turn.
+        self.tool_index = ToolIndex(self.tools)
+        self.intent_predictor = IntentPredictor([t.name for t in self.tools] + [r.name for r in self.resources])
+        self.fast_path = FastPathRouter(None, predictor=self.intent_predictor)
+        self.arg_checker = ArgumentChecker(self.tools)
+        self.lab_llm.known_functions = {t.name for t in self.tools} | {r.name for r in self.resources}
+        self.full_system_message = SYSTEM_MESSAGE + build_system_tools(self.tools, "TOOL") + build_system_tools(self.resources, "RESOURCE")
+        self.messages.append({"role": "system", "content": self.full_system_message})
         # print(self.messages)
 
+        # ========== RESUMED CONVERSATION ==========
+        # The system message is always rebuilt from the server: only the chat itself is restored.
+        self.messages.extend(bounded_window(self.resumed, self.history_window))
+
         # ========== BASH LOGS ==========   
         print(f"\n{BLUE}Connected to server with: {NC}")
         print(f"\n{BLUE}TOOLS: {NC}\n", [t.name for t in self.tools])
         print(f"\n{BLUE}RESOURCES: {NC}\n", [r.name for r in self.resources])
         print(f"\n{BLUE}PROMPTS: {NC}\n", [p.name for p in self.prompts])
 
+    @tracer.traced("turn")
     async def process_query(self, query: str) -> str:
         """
         Process a query using LLM and available tools/resources/prompts. 
@@ -169,9 +205,16 @@ class MCPHost:
         """
 
         # ========== APPEND USER QUERY IN MESSAGES AND LOG IT ==========
-        self.messages.append({"role": "user", "content": query})
+        # Every turn is a trace: type 'trace' in the chat to see where the time went.
+        turn_span = tracer.current_span()
+        if turn_span is not None:
+            self.last_trace_id = turn_span.trace_id
+        self._remember({"role": "user", "content": query})
         logger.info("USER QUERY: %s", query)
 
+        # ========== SYSTEM MESSAGE WITH THE TOOLS RELEVANT TO THIS QUERY ==========
+        self.messages[0] = {"role": "system", "content": self._system_message_for(query)}
+
         # ========== Merge tools, resources, and prompts into a single callable schema ==========
         # this is not the right place to do it in our structure. Even though it's standard to pass the functions at every llm call. 
         # functions = []
@@ -200,8 +243,20 @@ class MCPHost:
         #         "parameters": {"type": "object", "properties": {}}
         #     })
 
+        # ========== FAST PATH: OBVIOUS TOOL CALL, NO FIRST LLM CALL ==========
+        routed = self.fast_path.route(query)
+        if routed is not None:
+            answer = await self._fast_path_turn(routed)
+            if answer is not None:
+                return answer
+
+        # ========== SPECULATIVE TOOL CALL ==========
+        speculation = self._speculate(query)
+
         # ========== INITIAL LLM CALL ========== 
-        raw_resp = self.lab_llm.chat_completion(
+        # In a worker thread, so that the event loop keeps serving the speculative call meanwhile.
+        raw_resp = await asyncio.to_thread(
+            self.lab_llm.chat_completion,
             messages=self.messages,
             function_call="auto", # "auto" or "none". With "none", no function is called. 
         )
@@ -209,8 +264,8 @@ class MCPHost:
         # This section adds the llm answer to the messages array and logs it.
         # ["choices"][0]["message"] imitates openai library that would do .choices[0].message
         first_msg = raw_resp["choices"][0]["message"]
-        self.messages.append(first_msg)
-        logger.info("FIRST RESPONSE: %s", json.dumps(first_msg, indent=4))
+        self._remember(first_msg)
+        logger.info("FIRST RESPONSE", extra={"payload": first_msg})
 
         # ========== FUNCTION CALLING ==========  
         fn_call = first_msg.get("function_call")
@@ -221,10 +276,11 @@ class MCPHost:
             fn_name = fn_call.get("name")
             fn_args = fn_call.get("arguments", {})
             logger.info("FUNCTION CALLED: %s", fn_name)
+            self.last_tool = fn_name
 
             if isinstance(fn_args, str):
                 try:
-                    args = json.loads(fn_args) if fn_args else {}
+                    args = jsoncodec.loads(fn_args) if fn_args else {}
                 except Exception:
                     args = {}
             elif isinstance(fn_args, dict):
@@ -233,55 +289,190 @@ class MCPHost:
                 args = {}
 
             # ========== ACTUAL FUNCTION CALL ==========    
-            # Handle 3 possible categories: tool / resource / prompt 
-            result_content = None
-
-            if fn_name.startswith("resource_"):
-                # res_name = fn_name.replace("resource_", "")
-                resource = next((r for r in self.resources if r.name == fn_name), None)
-                if not resource:
-                    result_content = f"Resource '{res_name}' not found."
-                else:
-                    result = await self.session.read_resource(uri=resource.uri)
-                    if result.contents and len(result.contents) > 0:
-                        result_content = result.contents[0].text
-                    else:
-                        result_content = f"Resource '{res_name}' is empty or unreadable."
-
-            elif fn_name.startswith("use_prompt_"):
-                prompt_name = fn_name.replace("use_prompt_", "")
-                result = await self.session.get_prompt(prompt_name)
-                result_content = result.prompt.text if hasattr(result.prompt, "text") else str(result)
+            result_content, _ = await self._run_function(fn_name, args, speculation)
 
-            else:
-                result = await self.session.call_tool(fn_name, args)
-                result_content = result.content or ""
-
-            # ========== ADD RESULT TO MESSAGES ==========
-            self.messages.append({
-                "role": "function",
-                "name": fn_name,
-                "content": str(result_content) + f"Show these results in natural language. State that nothing has been retrieved if that is the case."
-            })
-
-            # ========== FOLLOWUP LLM CALL FOR RESULT PROCESSING AND FINAL ANSWER ========== 
-            followup = self.lab_llm.chat_completion(
-                messages=self.messages,
-                function_call="none", # "auto" or "none", With "none", no function is called. 
-            )
-            
-            # Append the followup in messages and log it. 
-            # ["choices"][0]["messages"] in openai library is called as followup.choices[0].message
-            followup_msg = followup["choices"][0]["message"]
-            self.messages.append(followup_msg)
-            logger.info("FOLLOWUP RESPONSE: %s", json.dumps(followup_msg, indent=4))
-
-            # ========== RETURN ONLY THE FINAL MESSAGE TO THE CHAT INTERFACE ==========
-            return followup_msg.get("content")
+            # ========== RESULT TO MESSAGES, FOLLOWUP LLM CALL, FINAL ANSWER ==========
+            return await self._followup_answer(fn_name, result_content)
         else:
             # ========== IF NO FUNCTION_CALL RETURN THE FIRST ANSWER ==========
+            self._trim_history()
             return first_msg.get("content", "I didn't use any tools.")
 
+    async def _followup_answer(self, fn_name: str, result_content) -> str:
+        """
+        Appends the function result to the messages and asks the LLM to answer in natural language.
+        """
+        # ========== ADD RESULT TO MESSAGES ==========
+        # The result goes in as a table (result_encoder.py): every row, without the JSON keys repeated for each one.
+        # The full result is needed only for the followup call: afterwards the window keeps its compact form.
+        compact_result = self._remember({
+            "role": "function",
+            "name": fn_name,
+            "content": encode_result(fn_name, result_content) + "\nShow these results in natural language. State that nothing has been retrieved if that is the case."
+        })
+
+        # ========== FOLLOWUP LLM CALL FOR RESULT PROCESSING AND FINAL ANSWER ========== 
+        # In a worker thread too, like the first call: the event loop stays free for the MCP session.
+        followup = await asyncio.to_thread(
+            self.lab_llm.chat_completion,
+            messages=self.messages,
+            function_call="none", # "auto" or "none", With "none", no function is called. 
+        )
+        
+        # Append the followup in messages and log it. 
+        # ["choices"][0]["messages"] in openai library is called as followup.choices[0].message
+        followup_msg = followup["choices"][0]["message"]
+        self._remember(followup_msg)
+        logger.info("FOLLOWUP RESPONSE", extra={"payload": followup_msg})
+
+        self._compact_last_result(compact_result)
+        self._trim_history()
+
+        # ========== RETURN ONLY THE FINAL MESSAGE TO THE CHAT INTERFACE ==========
+        return followup_msg.get("content")
+
+    async def _run_function(self, fn_name: str, args: dict, speculation=None):
+        """
+        Executes what the model asked for and returns (result content for the followup prompt, success).
+        Handle 3 possible categories: tool / resource / prompt
+        """
+        if fn_name.startswith("resource_"):
+            resource = next((r for r in self.resources if r.name == fn_name), None)
+            if not resource:
+                return f"Resource '{fn_name}' not found.", False
+            result = await self.session.read_resource(uri=resource.uri)
+            if result.contents and len(result.contents) > 0:
+                return result.contents[0].text, True
+            return f"Resource '{fn_name}' is empty or unreadable.", False
+
+        if fn_name.startswith("use_prompt_"):
+            prompt_name = fn_name.replace("use_prompt_", "")
+            result = await self.session.get_prompt(prompt_name)
+            return (result.prompt.text if hasattr(result.prompt, "text") else str(result)), True
+
+        # Arguments fixed (or the call rejected) before the speculation is compared and the server is called.
+        args, errors, fixes = self.arg_checker.check(fn_name, args)
+        if fixes:
+            logger.info("ARGUMENTS FIXED: %s %s", fn_name, fixes)
+        if errors:
+            logger.info("ARGUMENTS REJECTED: %s %s", fn_name, errors)
+            return error_hint(fn_name, errors), False
+
+        result = await self._speculation_result(speculation, fn_name, args)
+        if result is None:
+            result = await self._call_tool(fn_name, args)
+        return result.content or "", not result.isError and bool(result.content)
+
+    async def _fast_path_turn(self, prediction) -> Optional[str]:
+        """
+        Runs the routed call without asking the model which tool to use. The history looks like a normal turn
+        (assistant function_call, function result, answer). Returns None, having changed nothing, if the call failed:
+        the query then takes the normal path.
+        """
+        logger.info("FAST PATH: %s %s (confidence %.2f)", prediction.tool, prediction.args, prediction.confidence)
+        try:
+            result_content, ok = await self._run_function(prediction.tool, prediction.args)
+        except Exception as e:
+            ok, result_content = False, str(e)
+        if not ok:
+            logger.info("FAST PATH FALLBACK: %s", result_content)
+            return None
+
+        self._remember({"role": "assistant", "content": None, "function_call": {"name": prediction.tool, "arguments": prediction.args}})
+        self.last_tool = prediction.tool
+        answer = render_template(prediction.tool, result_text(result_content), prediction.args)
+        if answer is None:
+            return await self._followup_answer(prediction.tool, result_content)
+
+        compact_result = self._remember({"role": "function", "name": prediction.tool, "content": encode_result(prediction.tool, result_content)})
+        self._remember({"role": "assistant", "content": answer})
+        logger.info("FAST PATH TEMPLATE ANSWER: %s", prediction.tool)
+        self._compact_last_result(compact_result)
+        self._trim_history()
+        return answer
+
+    async def _call_tool(self, fn_name: str, args: dict, speculative: bool = False) -> types.CallToolResult:
+        """
+        Same as session.call_tool(), but the current trace context travels to the server in the request `_meta`,
+        so the server spans (tool + upstream HTTP) end up in the same trace.
+        """
+        with tracer.span("mcp.call_tool", kind=SPAN_KIND_CLIENT, tool=fn_name, speculative=speculative):
+            traceparent = tracer.traceparent()
+            meta = types.RequestParams.Meta(traceparent=traceparent) if traceparent else None
+            request = types.ClientRequest(types.CallToolRequest(
+                method="tools/call",
+                params=types.CallToolRequestParams(name=fn_name, arguments=args, _meta=meta),
+            ))
+            return await self.session.send_request(request, types.CallToolResult)
+
+    # ========== SPECULATION HELPERS ==========
+    def _speculate(self, query: str):
+        """
+        Starts the tool call predicted for `query`, if the prediction is confident enough.
+        Returns (prediction, task) or None. The task is never cancelled: an unused result still warms the server caches.
+        """
+        prediction = self.intent_predictor.predict(query)
+        if prediction is None or prediction.confidence < SPECULATION_MIN_CONFIDENCE or prediction.tool.startswith("resource_"):
+            return None
+        logger.info("SPECULATIVE CALL: %s %s (confidence %.2f)", prediction.tool, prediction.args, prediction.confidence)
+        task = asyncio.create_task(self._call_tool(prediction.tool, prediction.args, speculative=True))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())   # a failed guess must not log "never retrieved"
+        return prediction, task
+
+    async def _speculation_result(self, speculation, fn_name: str, args: dict) -> Optional[types.CallToolResult]:
+        """ Result of the speculative call if the model asked for the same call and it succeeded, else None. """
+        if speculation is None:
+            return None
+        prediction, task = speculation
+        if not same_call(prediction, fn_name, args):
+            logger.info("SPECULATION MISS: predicted %s %s", prediction.tool, prediction.args)
+            return None
+        try:
+            result = await task
+        except Exception as e:
+            logger.info("SPECULATION FAILED: %s", e)
+            return None
+        logger.info("SPECULATION HIT: %s", fn_name)
+        return result
+
+    def _system_message_for(self, query: str) -> str:
+        """
+        System message describing only the top-k tools for `query` (condensed), plus the tool used in the previous turn
+        so that follow-up questions keep working. Falls back to the full description of every tool.
+        """
+        selected = self.tool_index.select(query, k=TOOL_TOP_K, min_score=TOOL_MIN_SCORE, always={self.last_tool})
+        if selected is None:
+            logger.info("TOOL SELECTION: fallback to all tools")
+            return self.full_system_message
+        logger.info("TOOL SELECTION: %s", [t.name for t in selected])
+        return SYSTEM_MESSAGE + build_system_tools(selected, "TOOL", condensed=True) + build_system_tools(self.resources, "RESOURCE")
+
+    # ========== CONVERSATION HISTORY HELPERS ==========
+    def _remember(self, message: dict) -> dict:
+        """
+        Appends a message to the working window and queues it for storage (the write happens in background).
+        Returns the compact form of the message (see ConversationStore.append).
+        """
+        self.messages.append(message)
+        return self.store.append(self.session_id, message)
+
+    def _compact_last_result(self, compact_result: dict):
+        """
+        Replaces the raw function result of the turn just completed with its compact form.
+        """
+        for i in range(len(self.messages) - 1, 0, -1):
+            if self.messages[i].get("role") == "function":
+                self.messages[i] = compact_result
+                break
+
+    def _trim_history(self):
+        """
+        Keeps the system message plus the last `history_window` messages.
+        """
+        system, chat = self.messages[:1], self.messages[1:]
+        if len(chat) > self.history_window:
+            self.messages = system + bounded_window(chat, self.history_window)
+
     async def chat_loop(self):
         """
         Run an interactive chat loop. Type 'quit' to exit. The user will have a chat-like cli interface. You can type the query when ">>> Query:" is shown. 
@@ -290,6 +481,8 @@ class MCPHost:
         print_centered(f"{RED}MCP Started!{NC}")
         print_centered("Type your queries or 'quit' to exit.")
         print_centered("Type 'prompt' to select a pre-written prompt.") 
+        print_centered("Type 'trace' to see where the last answer spent its time.")
+        print_centered("Type 'metrics' to see the server metrics.")
         valid_options_prompts = ['prompts', 'prompt', 'prt', 'prp', 'pro', 'proptms', 'promt', 'promp']
         valid_options_quitting = ['quit', 'exit', 'qui', 'exi', 'uit', 'xit']
 
@@ -300,6 +493,19 @@ class MCPHost:
                 # =========== QUITTING THE CHAT INTERFACE ==========
                 if query.lower() in valid_options_quitting: 
                     break
+                # =========== LATENCY BREAKDOWN OF THE LAST TURN ==========
+                if query.lower() == 'trace':
+                    if self.last_trace_id is None:
+                        print("No query has been traced yet.")
+                    else:
+                        tracer.flush()
+                        print("\n" + tracer.breakdown(self.last_trace_id))
+                    continue
+                # =========== SERVER METRICS ==========
+                if query.lower() == 'metrics':
+                    res = await self.session.read_resource(uri=METRICS_URI)
+                    print("\n" + "".join(c.text for c in res.contents if hasattr(c, "text")))
+                    continue
                 # =========== PRE-WRITTEN PROMPTS HANDLING ==========
                 if query.lower() in valid_options_prompts:
                     chosen_prompt, user_args  = self.choose_prompt.start(self.prompts)
@@ -320,17 +526,28 @@ class MCPHost:
 
     async def cleanup(self):
         await self.exit_stack.aclose()
+        self.store.close()
 
 async def main():
     # This file needs the path to the server.py file to run.
-    if len(sys.argv) < 2:
-        print("Usage: python host.py <path_to_server_script>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Chat interface connected to the MCP server.")
+    parser.add_argument("server_script", help="path to the server.py file")
+    parser.add_argument("--resume", metavar="ID", default=None, help="id of a previous conversation to resume")
+    parser.add_argument("--history-window", type=int, default=HISTORY_WINDOW, help="messages kept in memory (default: %(default)s)")
+    cli_args = parser.parse_args()
 
-    host = MCPHost()
     try:
-        await host.connect_to_server(sys.argv[1])
-        logger.info("-------- NEW CONVERSATION --------")
+        host = MCPHost(session_id=cli_args.resume, history_window=cli_args.history_window)
+    except KeyError as e:
+        print(f"{RED}{e.args[0]}{NC}")
+        sys.exit(1)
+    try:
+        await host.connect_to_server(cli_args.server_script)
+        if cli_args.resume:
+            logger.info("-------- RESUMED CONVERSATION %s --------", host.session_id)
+        else:
+            logger.info("-------- NEW CONVERSATION %s --------", host.session_id)
+        print(f"\n{BLUE}Conversation id: {NC}{host.session_id} (resume it with --resume {host.session_id})")
         await host.chat_loop()
     finally:
         await host.cleanup()
@@ -0,0 +1,261 @@
+"""
+Local guess of the tool call a query will produce: keyword rules plus argument extraction (coordinates, distances,
+line numbers, time ranges). It runs in microseconds, while the first LLM call takes seconds.
+
+    predictor = IntentPredictor(tool_names)
+    prediction = predictor.predict("bus stops near 43.7731, 11.2560 within 500 m")
+    # Prediction(tpl_geo_search, {'selection': '43.7731;11.2560', 'maxDists': '0.5'}, confidence=0.8)
+
+Only read-only tools are predicted, so a wrong guess costs one discarded call and nothing else.
+"""
+import re
+
+COORDINATES = re.compile(r"(-?\d{1,2}\.\d{2,})\s*[,;]\s*(-?\d{1,3}\.\d{2,})")
+DISTANCE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(km|kilometers?|chilometri|m|meters?|metri)\b", re.IGNORECASE)
+LINE = re.compile(r"\b(?:line|linea|bus)\s+(?:n\.?\s*|number\s+)?([A-Za-z]?\d{1,3}[A-Za-z]?)\b", re.IGNORECASE)
+PLACE = re.compile(r"\b(?:in|at|a|ad|di|da|from|near|by)\s+([a-zà-ù][\w'-]*)", re.IGNORECASE)
+# Words after a preposition that are not a place: "in real time", "di linea", "a bus"...
+NOT_PLACES = {"real", "tempo", "this", "the", "questo", "questa", "now", "ora", "line", "linea", "bus", "autobus",
+              "service", "servizio", "movimento", "autolinee"}
+
+RANGES = (("month", ("month", "mese")), ("week", ("week", "settimana")), ("day", ("today", "oggi", "tonight", "stasera")))
+CATEGORIES = (
+    ("Museum", ("museum", "musei", "museo")),
+    ("Restaurant", ("restaurant", "ristorant")),
+    ("Pharmacy", ("pharmac", "farmaci")),
+    ("Hotel", ("hotel", "albergh")),
+)
+
+
+class Prediction:
+    __slots__ = ("tool", "args", "confidence", "rule")
+
+    def __init__(self, tool, args, confidence, rule):
+        self.tool = tool
+        self.args = args
+        self.confidence = confidence
+        self.rule = rule
+
+    def __repr__(self):
+        return f"Prediction({self.tool}, {self.args}, confidence={self.confidence:.2f})"
+
+
+# ========== ARGUMENT EXTRACTION ==========
+def find_points(text):
+    """ Every 'lat, lon' / 'lat;lon' pair in the text, as 'lat;lon' strings. """
+    return [f"{lat};{lon}" for lat, lon in COORDINATES.findall(text)]
+
+
+def _number(value):
+    """ 2.0 -> '2', 0.5 -> '0.5' (no rounding, unlike '%g'). """
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def find_distance_km(text):
+    """ '500 m' -> '0.5', '2 km' -> '2'. Numbers inside coordinates are not distances. """
+    match = DISTANCE.search(COORDINATES.sub(" ", text))
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", "."))
+    if not match.group(2).lower().startswith(("k", "c")):
+        value /= 1000
+    return _number(value)
+
+
+def find_line(text):
+    match = LINE.search(COORDINATES.sub(" ", text))
+    return match.group(1).upper() if match else None
+
+
+def find_lines(text):
+    """ Every distinct line number of the text, in order. """
+    return list(dict.fromkeys(m.upper() for m in LINE.findall(COORDINATES.sub(" ", text))))
+
+
+def find_places(text):
+    """ Words after 'in', 'at', 'a', 'di'... that are not part of a known phrase ('in real time', 'di linea'...). """
+    return [w for w in (m.lower() for m in PLACE.findall(text)) if w not in NOT_PLACES]
+
+
+def _first(text, table):
+    for value, words in table:
+        if any(w in text for w in words):
+            return value
+    return None
+
+
+def _has(text, *words):
+    return any(w in text for w in words)
+
+
+# ========== RULES ==========
+# Each rule: (lowercase query, original query) -> (args, confidence) or None.
+# Confidence is high only when the wording leaves one reading and every required argument was found.
+# Words that make an agencies / bus position query about something else (a stop, an office, who runs a line...).
+AGENCY_OTHER_ENTITIES = ("operat", "gestisc", "office", "ufficio", "near", "vicino", "station", "stazion", "stop", "fermat", "line", "linea", "route", "percors")
+POSITION_OTHER_ENTITIES = ("stop", "fermat", "operat", "gestisc", "route", "percors", "closest", "nearest", "vicin")
+# Agencies a bus position query may name: only Autolinee Toscane becomes an `agency` argument.
+UNMAPPED_AGENCIES = ("ataf", "busitalia", "ctt", "tiemme", "agenc", "agenzi", "compan", "aziend")
+
+
+def _agencies(q, original):
+    if not _has(q, "agenc", "agenzi") or find_points(q):
+        return None
+    unambiguous = _has(q, "list", " all ", "elenco", "tutte") and not _has(q, *AGENCY_OTHER_ENTITIES) and not find_line(original)
+    return {}, 0.95 if unambiguous else 0.7
+
+
+def _bus_position(q, original):
+    if not _has(q, "position", "posizion", "where is", "where are", "dove si trova", "dov'è", "real time", "live"):
+        return None
+    if not _has(q, "bus", "line", "linea", "autobus"):
+        return None
+    args = {}
+    line = find_line(original)
+    if line:
+        args["line"] = line
+    if _has(q, "autolinee toscane"):
+        args["agency"] = "Autolinee Toscane"
+    # Another line, a town or an agency the arguments do not carry would be answered with the wrong buses.
+    unambiguous = (line and len(find_lines(original)) == 1 and not find_places(original)
+                   and not _has(q, *POSITION_OTHER_ENTITIES, *UNMAPPED_AGENCIES))
+    return args, 0.9 if unambiguous else 0.6
+
+
+def _bus_routes(q, original):
+    line = find_line(original)
+    if line and _has(q, "route", "percors", "direction", "direzion") and not _has(q, "position", "where is"):
+        return {"line": line}, 0.85
+
+
+def _shortest_path(q, _):
+    points = find_points(q)
+    if len(points) < 2 or not _has(q, "route", "path", "directions", "how do i get", "go from", "from", "percorso", "andare"):
+        return None
+    if _has(q, "bus", "public transport", "tram", "mezzi"):
+        route_type = "public_transport"
+    elif _has(q, "car", "drive", "driving", "auto", "macchina"):
+        route_type = "car"
+    else:
+        route_type = "foot_shortest"
+    return {"source": points[0], "destination": points[1], "routeType": route_type}, 0.85
+
+
+def _location(q, _):
+    points = find_points(q)
+    if len(points) == 1 and _has(q, "address", "indirizzo", "where am i", "dove sono", "what is at", "which street", "che via"):
+        return {"position": points[0]}, 0.9
+
+
+def _tpl_near(q, _):
+    points = find_points(q)
+    if len(points) == 1 and _has(q, "stop", "fermat", "public transport", "bus line", "lines", "linee"):
+        args = {"selection": points[0]}
+        distance = find_distance_km(q)
+        if distance:
+            args["maxDists"] = distance
+        return args, 0.8
+
+
+def _iot(q, _):
+    points = find_points(q)
+    if len(points) != 1 or not _has(q, "sensor", "sensori", "weather", "meteo", "temperature", "temperatura", "air quality"):
+        return None
+    args = {"selection": points[0]}
+    distance = find_distance_km(q)
+    if distance:
+        args["maxDists"] = distance
+    if _has(q, "weather", "meteo", "temperature", "temperatura"):
+        args["categories"] = "Weather_sensor"
+    return args, 0.75
+
+
+def _events(q, _):
+    if not _has(q, "event", "eventi", "concert", "exhibition", "mostra", "spettacol"):
+        return None
+    args = {"range": _first(q, RANGES) or "day"}
+    points = find_points(q)
+    if points:
+        args["selection"] = points[0]
+        distance = find_distance_km(q)
+        if distance:
+            args["maxDists"] = distance
+    return args, 0.85 if _first(q, RANGES) else 0.7
+
+
+def _services(q, _):
+    points = find_points(q)
+    if len(points) != 1 or not _has(q, "service", "servizi", "near", "nearby", "around", "vicino", "intorno", *[w for _, ws in CATEGORIES for w in ws]):
+        return None
+    args = {"selection": points[0]}
+    distance = find_distance_km(q)
+    if distance:
+        args["maxDists"] = distance
+    category = _first(q, CATEGORIES)
+    if category:
+        args["categories"] = category
+    return args, 0.7 if category or distance else 0.55
+
+
+# Most specific first: the first rule reaching the best confidence wins.
+RULES = (
+    ("resource_get_agencies", _agencies),
+    ("get_bus_position", _bus_position),
+    ("route_shortest_path", _shortest_path),
+    ("get_bus_routes", _bus_routes),
+    ("get_location", _location),
+    ("get_events", _events),
+    ("iot_search", _iot),
+    ("tpl_geo_search", _tpl_near),
+    ("get_services", _services),
+)
+
+
+class IntentPredictor:
+    def __init__(self, tool_names):
+        """ tool_names: tools and resources the server offers (names as the model calls them). """
+        self.available = set(tool_names)
+
+    def predict_all(self, query):
+        """ A Prediction for every rule that applies, best first (RULES order among equal confidences). """
+        found = []
+        lowered = f" {query.lower()} "
+        for tool, rule in RULES:
+            if tool not in self.available:
+                continue
+            match = rule(lowered, query)
+            if match:
+                found.append(Prediction(tool, match[0], match[1], rule.__name__.strip("_")))
+        return sorted(found, key=lambda p: -p.confidence)
+
+    def predict(self, query):
+        """ Best Prediction for the query, or None if no rule applies. """
+        found = self.predict_all(query)
+        return found[0] if found else None
+
+
+# ========== COMPARING CALLS ==========
+def normalize_args(args):
+    """
+    Arguments as the server would understand them: empty values dropped, strings stripped,
+    coordinate pairs as 'lat;lon', numbers compared by value ('0.50' == '0.5').
+    """
+    normalized = {}
+    for key, value in (args or {}).items():
+        if value is None or value == "":
+            continue
+        text = str(value).strip()
+        pair = COORDINATES.fullmatch(text)
+        if pair:
+            text = f"{_number(pair.group(1))};{_number(pair.group(2))}"
+        else:
+            try:
+                text = _number(text)
+            except ValueError:
+                pass
+        normalized[key] = text
+    return normalized
+
+
+def same_call(prediction, name, args):
+    return prediction is not None and prediction.tool == name and normalize_args(prediction.args) == normalize_args(args)
@@ -0,0 +1,159 @@
+"""
+Compact text form of a tool result for the followup prompt.
+
+Tool results are JSON (GeoJSON feature collections, lists of routes, ...) wrapped in MCP TextContent objects.
+Their repr repeats keys, quotes and escapes for every row; here lists of objects become tables instead:
+
+    Services: 3 rows
+    constant: typeLabel=Pharmacy; agency=ASL Firenze
+    lat	lon	name	address	distance
+    43.77322	11.25668	Farmacia Centrale	Via dei Calzaiuoli	0.12
+    ...
+
+- Every row is kept. Coordinates are rounded to COORD_DIGITS decimals (about 1 m).
+- Columns with the same value in every row are written once in the `constant:` line; empty columns are dropped.
+- Nested objects are flattened with dotted names ("properties" of GeoJSON features are flattened without prefix).
+- TEMPLATES can fix the first columns of a tool and drop fields the model cannot use (e.g. WKT geometries).
+- Anything that is not JSON is returned unchanged.
+"""
+from common import jsoncodec
+
+COORD_DIGITS = 5
+COORD_KEYS = {"lat", "lon", "lng", "latitude", "longitude"}
+SEPARATOR = "\t"
+
+# ========== TEMPLATES ==========
+# Tool name -> {"columns": first columns of every table, "drop": field names left out everywhere}
+TEMPLATES = {
+    "get_bus_position": {"columns": ("line", "vehicleNum", "direction", "lastStopName", "lastStopTime", "delay")},
+    "get_bus_routes": {"columns": ("routeName", "firstStop", "lastStop")},
+    "tpl_geo_search": {"columns": ("name", "agency", "lat", "lon")},
+    "route_shortest_path": {"drop": ("wkt",)},
+}
+
+
+def result_text(result_content):
+    """ Text of a tool result: a string as is, the concatenated texts of a list of TextContent otherwise. """
+    if isinstance(result_content, str):
+        return result_content
+    if isinstance(result_content, (list, tuple)):
+        return "".join(getattr(c, "text", None) or "" for c in result_content)
+    return str(result_content)
+
+
+def encode_result(tool, result_content):
+    """ Compact text of a tool result (see module docstring). """
+    text = result_text(result_content)
+    try:
+        data = jsoncodec.loads(text)
+    except (TypeError, ValueError):
+        return text
+    template = TEMPLATES.get(tool) or {}
+    encoder = _Encoder(template.get("columns", ()), template.get("drop", ()))
+    lines = encoder.encode(data, "")
+    return "\n".join(lines) if lines else "(empty result)"
+
+
+def _round_coords(value):
+    if isinstance(value, float):
+        return round(value, COORD_DIGITS)
+    if isinstance(value, list):
+        return [_round_coords(v) for v in value]
+    return value
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, dict)):
+        value = jsoncodec.dumps(value)
+    return str(value).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+class _Encoder:
+    def __init__(self, columns=(), drop=()):
+        self.columns = tuple(columns)
+        self.drop = set(drop)
+
+    def encode(self, value, name):
+        """ Lines for `value` found under `name` (dotted path, "" for the root). """
+        if isinstance(value, dict):
+            if isinstance(value.get("features"), list):
+                return self._table(name or "features", [self._feature_row(f) for f in value["features"]])
+            lines = []
+            for key, item in value.items():
+                if key in self.drop:
+                    continue
+                path = f"{name}.{key}" if name else key
+                if isinstance(item, (dict, list)):
+                    lines.extend(self.encode(item, path))
+                else:
+                    lines.append(f"{path}: {_cell(self._scalar(key, item))}")
+            return lines
+        if isinstance(value, list):
+            if value and all(isinstance(v, dict) for v in value):
+                return self._table(name or "rows", [self._row(v) for v in value])
+            return [f"{name or 'value'}: {_cell(value)}"]
+        return [f"{name or 'value'}: {_cell(value)}"]
+
+    # ========== ROWS ==========
+    def _scalar(self, key, value):
+        return round(value, COORD_DIGITS) if isinstance(value, float) and key in COORD_KEYS else value
+
+    def _row(self, obj, prefix=""):
+        row = {}
+        for key, value in obj.items():
+            if key in self.drop:
+                continue
+            column = f"{prefix}{key}"
+            if isinstance(value, dict) and value:
+                row.update(self._row(value, f"{column}."))
+            else:
+                row[column] = self._scalar(key, value)
+        return row
+
+    def _feature_row(self, feature):
+        if not isinstance(feature, dict):
+            return {"value": feature}
+        row = {}
+        geometry = feature.get("geometry")
+        coords = geometry.get("coordinates") if isinstance(geometry, dict) else None
+        if geometry and geometry.get("type") == "Point" and isinstance(coords, list) and len(coords) >= 2:
+            row["lat"], row["lon"] = _round_coords(coords[1]), _round_coords(coords[0])
+        elif geometry and "geometry" not in self.drop:
+            row["geometry"] = {**geometry, "coordinates": _round_coords(coords)} if coords is not None else geometry
+        for key, value in feature.items():
+            if key in ("type", "geometry", "properties") or key in self.drop:
+                continue
+            row[key] = value
+        row.update(self._row(feature.get("properties") or {}))
+        return row
+
+    # ========== TABLES ==========
+    def _table(self, name, rows):
+        if not rows:
+            return [f"{name}: 0 rows"]
+        columns = [c for c in self.columns if any(c in r for r in rows)]
+        for row in rows:
+            columns.extend(c for c in row if c not in columns)
+
+        lines = [f"{name}: {len(rows)} rows"]
+        values = {c: [_cell(r.get(c)) for r in rows] for c in columns}
+        constant = []
+        if len(rows) > 1:
+            for c in list(columns):
+                first = values[c][0]
+                if all(v == first for v in values[c]):
+                    columns.remove(c)
+                    if first:
+                        constant.append(f"{c}={first}")
+        else:
+            columns = [c for c in columns if values[c][0]]
+        if constant:
+            lines.append("constant: " + "; ".join(constant))
+        if columns:
+            lines.append(SEPARATOR.join(columns))
+            lines.extend(SEPARATOR.join(values[c][i] for c in columns) for i in range(len(rows)))
+        return lines
@@ -0,0 +1,143 @@
+import math
+import re
+from collections import Counter
+
+# ========== TOKENIZATION ==========
+TOKEN_PATTERN = re.compile(r"[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+")
+ARG_LINE_PATTERN = re.compile(r"^\s*-\s*(\w+)\s*:\s*(.*)$")
+ARG_TYPE_PREFIX = re.compile(r"^(str|string|int|float|bool|number)\??\s*[,:]?\s*", re.IGNORECASE)
+
+STOPWORDS = {
+    "the", "and", "for", "are", "with", "that", "this", "from", "can", "all", "any", "not", "its", "you",
+    "list", "give", "show", "tell", "find", "what", "which", "where", "how", "please", "want", "get",
+    "str", "int", "bool", "float", "optional", "example", "default", "value", "values", "parameter",
+    "true", "false", "none", "returned", "return", "specified", "used", "given", "user",
+}
+
+# A few Italian words that users type often, mapped onto the English wording of the docstrings.
+SYNONYMS = {
+    "fermata": "stop", "fermate": "stop", "autobus": "bus", "linea": "line", "linee": "line",
+    "percorso": "route", "percorsi": "route", "tragitto": "path", "eventi": "event", "evento": "event",
+    "sensori": "sensor", "sensore": "sensor", "indirizzo": "address", "posizione": "position",
+    "servizi": "service", "agenzia": "agency", "agenzie": "agency", "vicino": "near",
+    "directions": "path", "stations": "stop", "station": "stop", "busstop": "stop", "busstops": "stop",
+}
+
+
+def tokenize(text):
+    tokens = []
+    for raw in TOKEN_PATTERN.findall(text or ""):
+        tok = raw.lower()
+        tok = SYNONYMS.get(tok, tok)
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        if len(tok) > 1 and tok not in STOPWORDS:
+            tokens.append(tok)
+    return tokens
+
+
+# ========== DOCSTRING HELPERS ==========
+def split_description(description):
+    """
+    Splits a tool docstring in (summary, {arg_name: arg_description}).
+    The summary is the text before the 'args:' section, the arguments are the '- name: type, text' lines.
+    """
+    summary_lines, args = [], {}
+    current = None
+    in_args = False
+    for line in (description or "").splitlines():
+        stripped = line.strip()
+        if stripped.lower().startswith(("args:", "required:", ":return")):
+            in_args = stripped.lower().startswith("args:")
+            current = None
+            continue
+        match = ARG_LINE_PATTERN.match(line) if in_args else None
+        if match:
+            current = match.group(1)
+            args[current] = match.group(2).strip()
+        elif in_args and current and stripped:
+            args[current] += " " + stripped
+        elif not in_args and stripped:
+            summary_lines.append(stripped)
+    return " ".join(summary_lines), args
+
+
+def first_sentence(text, max_chars):
+    text = " ".join((text or "").split())
+    end = text.find(". ")
+    if 0 < end < max_chars:
+        return text[:end + 1]
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def condense_tool(tool, summary_chars=300, arg_chars=90):
+    """
+    Short description of a tool: a summary of the docstring plus one line per argument,
+    with the argument types taken from the inputSchema.
+    """
+    summary, arg_docs = split_description(tool.description)
+    schema = getattr(tool, "inputSchema", None) or {}
+    properties = schema.get("properties", {})
+    required = set(schema.get("required", []))
+
+    lines = [first_sentence(summary, summary_chars) or "No description provided."]
+    for name in properties or arg_docs:
+        prop = properties.get(name, {})
+        types = [p.get("type") for p in prop.get("anyOf", [prop]) if p.get("type") not in (None, "null")]
+        arg_type = "|".join(types) or "any"
+        flag = ", required" if name in required else ""
+        doc = first_sentence(ARG_TYPE_PREFIX.sub("", arg_docs.get(name, "")), arg_chars)
+        lines.append(f"  - {name} ({arg_type}{flag}): {doc}".rstrip(": "))
+    return "\n".join(lines)
+
+
+# ========== BM25 INDEX ==========
+class ToolIndex:
+    """
+    BM25 index over the tools exposed by the server: name, docstring and argument descriptions.
+    The tool name is repeated in the document so that matching it weighs more than a docstring word.
+    """
+    def __init__(self, tools, k1=1.5, b=0.75, name_boost=3):
+        self.tools = list(tools)
+        self.k1 = k1
+        self.b = b
+        self.docs = []
+        for t in self.tools:
+            summary, arg_docs = split_description(t.description)
+            text = " ".join([(t.name + " ") * name_boost, summary] + [f"{k} {v}" for k, v in arg_docs.items()])
+            self.docs.append(Counter(tokenize(text)))
+        self.doc_len = [sum(d.values()) for d in self.docs]
+        self.avg_len = (sum(self.doc_len) / len(self.docs)) if self.docs else 0
+        df = Counter(tok for d in self.docs for tok in d)
+        n = len(self.docs)
+        self.idf = {tok: math.log(1 + (n - f + 0.5) / (f + 0.5)) for tok, f in df.items()}
+
+    def search(self, query, k=None):
+        """ Returns [(tool, score)] sorted by decreasing score, only tools with score > 0. """
+        q = set(tokenize(query))
+        scored = []
+        for tool, doc, length in zip(self.tools, self.docs, self.doc_len):
+            score = 0.0
+            for tok in q:
+                tf = doc.get(tok)
+                if tf:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / self.avg_len)
+                    score += self.idf[tok] * tf * (self.k1 + 1) / norm
+            if score > 0:
+                scored.append((tool, score))
+        scored.sort(key=lambda ts: ts[1], reverse=True)
+        return scored[:k] if k else scored
+
+    def select(self, query, k=4, min_score=1.0, always=()):
+        """
+        The top-k tools for `query`, plus the tools named in `always` (e.g. the one used in the previous turn).
+        Returns None when nothing scores at least `min_score`: the caller should then fall back to the full list.
+        """
+        hits = self.search(query, k)
+        if not hits or hits[0][1] < min_score:
+            return None
+        selected = [t for t, _ in hits]
+        for t in self.tools:
+            if t.name in always and t not in selected:
+                selected.append(t)
+        return selected
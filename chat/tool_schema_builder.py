@@ -1,13 +1,16 @@
-def build_system_tools(tools, primitive_name):
+from tool_index import condense_tool
+
+def build_system_tools(tools, primitive_name, condensed=False):
     """
     Builds the tool-specific section of the system message,
     listing the tools available to the LLM without argument schemas because it is already present in docstrings.
+    With `condensed=True` each docstring is reduced to a summary plus one short line per argument (see tool_index.condense_tool).
     """
     
     tool_descriptions = "\n\n".join([
         f"""
         {primitive_name} NAME: "{t.name}"
-        DESCRIPTION: {t.description or 'No description provided.'}
+        DESCRIPTION: {(condense_tool(t) if condensed else t.description) or 'No description provided.'}
         """
         for t in tools
     ])
@@ -0,0 +1,197 @@
+"""
+Record/replay of the upstream traffic (Snap4City HTTP calls and LabLLM completions), to profile offline
+with production-like answers.
+
+    SNAP_CASSETTE_MODE=record  python host.py ../server/server.py   # real services, every answer is saved
+    SNAP_CASSETTE_MODE=replay  python host.py ../server/server.py   # no network: answers come from the cassettes
+
+- A request is normalized (method, url without query string, sorted params, JSON body without volatile keys
+  such as access_token) and hashed: the hash is the key of a gzip-compressed JSON file in SNAP_CASSETTE_DIR.
+- The same request can be recorded more than once (e.g. an LLM prompt asked twice): the answers ("episodes")
+  are replayed in the recorded order, the last one is repeated. Replay is therefore deterministic for a given
+  sequence of calls.
+- Each episode stores the original elapsed time. SNAP_CASSETTE_LATENCY is the fraction of it to reproduce
+  when replaying: 0 (default) answers immediately, 1 reproduces the original latency.
+- Failures (timeouts, connection errors) are recorded too, so they are replayed as failures.
+- Recording never touches the disk in the caller (e.g. the server event loop): episodes are queued and written
+  by a background thread, and flushed at exit.
+
+The host forwards SNAP_* variables to the server, so setting them once covers both processes.
+"""
+import gzip
+import hashlib
+import json
+import atexit
+import os
+import queue
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+MODE_OFF, MODE_RECORD, MODE_REPLAY = "off", "record", "replay"
+DEFAULT_CASSETTE_DIR = Path(__file__).parent.parent.absolute() / "cassettes"
+MAX_EPISODES = 10
+
+# Keys that change between runs without changing the answer: left out of the request key.
+VOLATILE_KEYS = {"access_token", "refresh_token", "token"}
+
+
+class CassetteMiss(LookupError):
+    """ Replay mode, but nothing was recorded for this request. """
+
+
+def _strip_volatile(obj):
+    if isinstance(obj, dict):
+        return {k: _strip_volatile(v) for k, v in obj.items() if k not in VOLATILE_KEYS}
+    if isinstance(obj, list):
+        return [_strip_volatile(v) for v in obj]
+    return obj
+
+
+def normalize_request(method, url, params=None, body=None):
+    """
+    Canonical form of a request. Query string and params are merged and sorted, values become strings
+    (as they would on the wire), None params are dropped. A str/bytes body that is JSON is decoded first.
+    """
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    for k, v in (params or {}).items():
+        if v is not None:
+            query[k] = str(v).lower() if isinstance(v, bool) else str(v)
+    if isinstance(body, (str, bytes)):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            body = body.decode("utf-8", "replace") if isinstance(body, bytes) else body
+    return {
+        "method": method.upper(),
+        "url": f"{parts.scheme}://{parts.netloc}{parts.path}" if parts.netloc else parts.path,
+        "params": sorted(query.items()),
+        "body": _strip_volatile(body),
+    }
+
+
+def request_key(request):
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, directory=DEFAULT_CASSETTE_DIR, mode=MODE_OFF, latency_factor=0.0, max_episodes=MAX_EPISODES):
+        if mode not in (MODE_OFF, MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Unknown cassette mode '{mode}', expected off, record or replay")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.latency_factor = latency_factor
+        self.max_episodes = max_episodes
+        self._episodes = {}          # key -> recorded episodes, loaded lazily
+        self._played = {}            # key -> episodes already replayed in this process
+        self._lock = threading.Lock()
+        self._write_queue = None
+
+    @property
+    def recording(self):
+        return self.mode == MODE_RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == MODE_REPLAY
+
+    def request(self, method, url, params=None, body=None):
+        return normalize_request(method, url, params, body)
+
+    # ========== FILES ==========
+    def path_for(self, request, key):
+        """ <dir>/<method>_<readable path>-<hash>.json.gz, so that the files can be told apart at a glance. """
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", urlsplit(request["url"]).path).strip("-")[-48:] or "root"
+        return self.directory / f"{request['method']}_{slug}-{key[:20]}.json.gz"
+
+    def _load(self, request, key):
+        if key not in self._episodes:
+            path = self.path_for(request, key)
+            episodes = []
+            if path.exists():
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    episodes = json.load(f)["episodes"]
+            self._episodes[key] = episodes
+        return self._episodes[key]
+
+    def _save(self, request, key, episodes):
+        path = self.path_for(request, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"request": request, "episodes": episodes}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    # ========== RECORD / REPLAY ==========
+    def record(self, request, status=None, response=None, error=None, elapsed=0.0):
+        """
+        Queues one episode for `request`; the writer thread appends it to the cassette file.
+        Only the first `max_episodes` answers of a request are kept.
+        """
+        episode = {"status": status, "response": response, "error": error, "elapsed": elapsed, "recorded_at": time.time()}
+        self._writer().put((request, episode))
+
+    def _writer(self):
+        if self._write_queue is None:
+            with self._lock:
+                if self._write_queue is None:
+                    self._write_queue = queue.Queue()
+                    threading.Thread(target=self._write_loop, name="cassette-writer", daemon=True).start()
+                    atexit.register(self.flush)
+        return self._write_queue
+
+    def _write_loop(self):
+        while True:
+            request, episode = self._write_queue.get()
+            try:
+                key = request_key(request)
+                with self._lock:
+                    episodes = self._load(request, key)
+                    if len(episodes) < self.max_episodes:
+                        episodes.append(episode)
+                        self._save(request, key, episodes)
+            except (OSError, RuntimeError, TypeError, ValueError):
+                pass        # a lost recording must not stop the writer
+            finally:
+                self._write_queue.task_done()
+
+    def flush(self, timeout=10.0):
+        """ Waits (up to `timeout` seconds) until every recorded episode has been written. """
+        if self._write_queue is None:
+            return
+        deadline = time.time() + timeout
+        while self._write_queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def play(self, request):
+        """ Next recorded episode for `request`. Raises CassetteMiss if there is none. """
+        key = request_key(request)
+        with self._lock:
+            episodes = self._load(request, key)
+            if not episodes:
+                raise CassetteMiss(f"No recording for {request['method']} {request['url']} (key {key[:20]})")
+            n = self._played.get(key, 0)
+            self._played[key] = n + 1
+            return episodes[min(n, len(episodes) - 1)]
+
+    def delay(self, episode):
+        """ Seconds to wait before returning a replayed episode. """
+        return max(0.0, episode.get("elapsed") or 0.0) * self.latency_factor
+
+
+def _default_cassette():
+    env = os.environ.get
+    return Cassette(
+        directory=env("SNAP_CASSETTE_DIR", str(DEFAULT_CASSETTE_DIR)),
+        mode=env("SNAP_CASSETTE_MODE", MODE_OFF).lower() or MODE_OFF,
+        latency_factor=float(env("SNAP_CASSETTE_LATENCY", 0)),
+        max_episodes=int(env("SNAP_CASSETTE_MAX_EPISODES", MAX_EPISODES)),
+    )
+
+
+# Shared by every module of the process, like common.tracing.tracer.
+cassette = _default_cassette()
@@ -0,0 +1,114 @@
+"""
+JSON encoding/decoding shared by server, host and LabLLM, with the fastest library available.
+
+    from common import jsoncodec
+    data = jsoncodec.loads(resp.content)        # bytes or str
+    line = jsoncodec.dumps(entry, default=str)  # compact str, non-ASCII kept as is
+
+- orjson if installed, else msgspec, else the standard library (SNAP_JSON_CODEC=stdlib forces it).
+- Output is always compact (no spaces) and UTF-8 (ensure_ascii=False); sort_keys and default work with every backend.
+- Decoding errors are json.JSONDecodeError (a ValueError) whatever the backend, so callers keep their except clauses.
+- Values a fast backend refuses (integers over 64 bits, ...) are encoded with the standard library.
+- A document a fast backend cannot decode is tried again with the standard library, which also accepts the
+  NaN / Infinity literals.
+
+Differences with the standard library that remain with orjson / msgspec (SNAP_JSON_CODEC=stdlib avoids both):
+- integers over 64 bits are decoded as float ('123456789012345678901234567890' -> 1.2345678901234568e+29);
+  finding them beforehand would cost more than the decoding itself;
+- NaN and Infinity are encoded as null, where the standard library writes NaN / Infinity (which is not valid JSON).
+
+bench/json_bench.py compares the backends on the fixtures.
+"""
+import json
+import os
+
+BACKEND = "stdlib"
+_forced = os.environ.get("SNAP_JSON_CODEC", "").lower()
+
+if _forced != "stdlib":
+    try:
+        import orjson
+        BACKEND = "orjson"
+    except ImportError:
+        try:
+            import msgspec
+            BACKEND = "msgspec"
+        except ImportError:
+            pass
+
+
+# ========== STANDARD LIBRARY ==========
+def _std_loads(data):
+    return json.loads(data)
+
+
+def _std_dumps(obj, sort_keys=False, default=None):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=default)
+
+
+# ========== ORJSON ==========
+if BACKEND == "orjson":
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _loads(data):
+        return orjson.loads(data)     # orjson.JSONDecodeError is a json.JSONDecodeError
+
+    def _dumpb(obj, sort_keys=False, default=None):
+        return orjson.dumps(obj, default=default, option=_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+
+    _ENCODE_ERRORS = (orjson.JSONEncodeError,)
+
+# ========== MSGSPEC ==========
+elif BACKEND == "msgspec":
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+
+    def _loads(data):
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            text = data.decode("utf-8", "replace") if isinstance(data, (bytes, bytearray, memoryview)) else data
+            raise json.JSONDecodeError(str(e), text, 0) from None
+
+    def _dumpb(obj, sort_keys=False, default=None):
+        if sort_keys or default is not None:
+            return msgspec.json.encode(obj, enc_hook=default, order="sorted" if sort_keys else None)
+        return _encoder.encode(obj)
+
+    _ENCODE_ERRORS = (msgspec.EncodeError, TypeError, OverflowError)
+
+else:
+    _loads = _std_loads
+    _dumpb = None
+    _ENCODE_ERRORS = ()
+
+
+# ========== API ==========
+def loads(data):
+    """ Decoded value of a JSON document (str, bytes or bytearray). Raises json.JSONDecodeError. """
+    try:
+        return _loads(data)
+    except json.JSONDecodeError:
+        if _loads is _std_loads:
+            raise
+        return _std_loads(data)
+
+
+def dumpb(obj, sort_keys=False, default=None):
+    """ Compact UTF-8 JSON bytes. """
+    if _dumpb is not None:
+        try:
+            return _dumpb(obj, sort_keys, default)
+        except _ENCODE_ERRORS:
+            pass
+    return _std_dumps(obj, sort_keys, default).encode("utf-8")
+
+
+def dumps(obj, sort_keys=False, default=None):
+    """ Compact JSON text. """
+    if _dumpb is not None:
+        try:
+            return _dumpb(obj, sort_keys, default).decode("utf-8")
+        except _ENCODE_ERRORS:
+            pass
+    return _std_dumps(obj, sort_keys, default)
@@ -0,0 +1,128 @@
+"""
+Logging setup shared by the chat host and the MCP server.
+
+The caller only puts records on a queue (QueueHandler). A QueueListener thread formats them as compact
+JSON lines and writes them to a rotating file, so logging never blocks the event loop.
+
+Big objects (LLM messages, tool results) must be passed as `extra={"payload": obj}`, not formatted into the message:
+they are serialized in the listener thread, truncated if too long, and only 1 out of `payload_sample_every` is kept.
+
+Environment overrides: SNAP_LOGS_DIR, SNAP_LOG_LEVEL, SNAP_LOG_MAX_BYTES, SNAP_LOG_BACKUPS, SNAP_LOG_ROTATE_WHEN (e.g. "midnight"),
+SNAP_LOG_PAYLOAD_SAMPLE (keep one payload out of N), SNAP_LOG_PAYLOAD_MAX_CHARS.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from common import jsoncodec
+
+LOGS_DIR = Path(os.environ.get("SNAP_LOGS_DIR", Path(__file__).parent.parent.absolute() / "logs"))
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+DEFAULT_PAYLOAD_MAX_CHARS = 8000
+
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """ One compact JSON object per line: ts, level, logger, msg and, if present, payload. """
+    def __init__(self, payload_max_chars=DEFAULT_PAYLOAD_MAX_CHARS):
+        super().__init__()
+        self.payload_max_chars = payload_max_chars
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload = getattr(record, "payload", None)
+        encoded = None
+        if payload is not None:
+            encoded = jsoncodec.dumps(payload, default=str)
+            if len(encoded) > self.payload_max_chars:
+                entry["payload_truncated"] = len(encoded)
+                encoded = jsoncodec.dumps(encoded[:self.payload_max_chars])
+        elif getattr(record, "payload_sampled_out", False):
+            entry["payload_sampled_out"] = True
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        line = jsoncodec.dumps(entry, default=str)
+        # The payload is already encoded: it is appended as the last key instead of being encoded twice.
+        return line if encoded is None else f'{line[:-1]},"payload":{encoded}}}'
+
+
+class PayloadSampler(logging.Filter):
+    """ Keeps the payload of one record out of `every`, counted separately for each message. """
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen = defaultdict(int)
+
+    def filter(self, record):
+        if self.every > 1 and getattr(record, "payload", None) is not None:
+            n = self._seen[record.msg]
+            self._seen[record.msg] = n + 1
+            if n % self.every:
+                record.payload = None
+                record.payload_sampled_out = True
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    The standard QueueHandler formats the message in the caller's thread (to make records picklable).
+    Here the listener lives in the same process, so the record is queued as is and formatted later.
+    """
+    def prepare(self, record):
+        return record
+
+
+def configure_logging(filename, level=None, max_bytes=None, backup_count=None, rotate_when=None,
+                      payload_sample_every=None, payload_max_chars=None):
+    """
+    Installs the queue pipeline on the root logger, writing to LOGS_DIR/filename. Safe to call more than once:
+    only the first call configures logging.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    env = os.environ.get
+    level = level or env("SNAP_LOG_LEVEL", "INFO")
+    max_bytes = max_bytes or int(env("SNAP_LOG_MAX_BYTES", DEFAULT_MAX_BYTES))
+    backup_count = backup_count or int(env("SNAP_LOG_BACKUPS", DEFAULT_BACKUPS))
+    rotate_when = rotate_when or env("SNAP_LOG_ROTATE_WHEN")
+    payload_sample_every = payload_sample_every or int(env("SNAP_LOG_PAYLOAD_SAMPLE", 1))
+    payload_max_chars = payload_max_chars or int(env("SNAP_LOG_PAYLOAD_MAX_CHARS", DEFAULT_PAYLOAD_MAX_CHARS))
+
+    path = Path(filename)
+    if not path.is_absolute():
+        path = LOGS_DIR / path
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if rotate_when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count, encoding="utf-8")
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter(payload_max_chars))
+    file_handler.addFilter(PayloadSampler(payload_sample_every))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,336 @@
+"""
+Minimal tracing for MCP Snap: spans with W3C trace context, exported as OTLP/JSON lines.
+
+    from common.tracing import tracer
+
+    with tracer.span("llm.chat_completion", prompt_chars=1234) as span:
+        ...
+        span.set_attribute("answer_chars", 56)
+
+- The current span lives in a contextvar, so nesting works across threads and asyncio tasks.
+- tracer.traceparent() returns the W3C header of the current span, to be sent to another process;
+  tracer.span(..., traceparent=...) continues that trace on the other side.
+- When a local root span ends, the spans of its trace are appended to SNAP_TRACE_FILE (default logs/traces.jsonl)
+  by a background thread, one OTLP/JSON ExportTraceServiceRequest per line. Spans of background work that ends
+  after its root are appended as soon as they finish.
+- Finished spans are also kept in memory (last MAX_KEPT_SPANS), see breakdown().
+- Like the JSON-lines logs, the file is rotated at SNAP_TRACE_MAX_BYTES (default 5 MB) into traces.jsonl.1 ...
+  keeping SNAP_TRACE_BACKUPS files (default 5). breakdown() reads the newest files first and stops at the first
+  one that has the trace.
+
+Set SNAP_TRACING=0 to disable tracing completely.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+from common import jsoncodec
+from common.log_setup import DEFAULT_BACKUPS, DEFAULT_MAX_BYTES, LOGS_DIR
+
+MAX_KEPT_SPANS = 5000
+
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "remote_parent")
+
+    def __init__(self, name, trace_id, parent_id, kind, attributes, remote_parent=False):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.status = STATUS_UNSET
+        self.remote_parent = remote_parent
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.status = STATUS_ERROR
+        self.attributes["error"] = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def parse_traceparent(header):
+    """ '00-<trace_id>-<span_id>-<flags>' -> (trace_id, span_id), or None if malformed. """
+    parts = (header or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+class Tracer:
+    def __init__(self, service_name, export_path=None, enabled=True, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUPS):
+        self.service_name = service_name
+        self.enabled = enabled
+        self.export_path = export_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.finished = deque(maxlen=MAX_KEPT_SPANS)
+        self._pending = {}          # trace_id -> finished spans not exported yet
+        self._open_roots = {}       # trace_id -> local roots still running
+        self._export_queue = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, traceparent=None, kind=SPAN_KIND_INTERNAL, **attributes):
+        """
+        Opens a span as child of the current one. With `traceparent` (and no current span) the span
+        continues a trace started in another process.
+        """
+        if not self.enabled:
+            yield _NoopSpan()
+            return
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if parent is None else None
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+        elif remote is not None:
+            span = Span(name, remote[0], remote[1], kind, attributes, remote_parent=True)
+        else:
+            span = Span(name, secrets.token_hex(16), None, kind, attributes)
+        if parent is None:
+            with self._lock:
+                self._open_roots[span.trace_id] = self._open_roots.get(span.trace_id, 0) + 1
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._finish(span, is_local_root=parent is None)
+
+    def traced(self, name):
+        """ Decorator version of span(), for sync and async functions. """
+        def decorator(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def current_span(self):
+        return _current_span.get()
+
+    def traceparent(self):
+        """ W3C traceparent header of the current span, or None outside of any span. """
+        span = _current_span.get()
+        return f"00-{span.trace_id}-{span.span_id}-01" if span is not None else None
+
+    # ========== EXPORT ==========
+    def _finish(self, span, is_local_root):
+        """
+        Spans are exported in one batch when the last local root of their trace finishes. Background work can
+        outlive its root (prefetches, refresh loops, unused speculative calls): those late spans are exported
+        right away instead of waiting for a root that is gone.
+        """
+        with self._lock:
+            self.finished.append(span)
+            if is_local_root:
+                left = self._open_roots.get(span.trace_id, 1) - 1
+                if left > 0:
+                    self._open_roots[span.trace_id] = left
+                else:
+                    self._open_roots.pop(span.trace_id, None)
+            self._pending.setdefault(span.trace_id, []).append(span)
+            batch = self._pending.pop(span.trace_id) if span.trace_id not in self._open_roots else None
+        if batch and self.export_path:
+            self._exporter().put(batch)
+
+    def _exporter(self):
+        if self._export_queue is None:
+            with self._lock:
+                if self._export_queue is None:
+                    self._export_queue = queue.Queue()
+                    threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True).start()
+                    atexit.register(self.flush)
+        return self._export_queue
+
+    def _export_loop(self):
+        path = Path(self.export_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            batch = self._export_queue.get()
+            try:
+                request = {"resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                    "scopeSpans": [{"scope": {"name": "mcp-snap"}, "spans": [s.to_otlp() for s in batch]}],
+                }]}
+                # One write per batch on a file opened in append mode: host and server can share the file.
+                self._rotate_if_needed(path)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(jsoncodec.dumps(request) + "\n")
+            except OSError:
+                pass
+            finally:
+                self._export_queue.task_done()
+
+    def _rotate_if_needed(self, path):
+        """
+        traces.jsonl -> traces.jsonl.1 -> ... as RotatingFileHandler does. The file is shared by two processes:
+        if both rotate at once, one of them only finds the file already moved.
+        """
+        if self.max_bytes <= 0 or not path.exists() or path.stat().st_size < self.max_bytes:
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            older = Path(f"{path}.{i}")
+            if older.exists():
+                os.replace(older, f"{path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            path.unlink()
+
+    def _export_files(self):
+        """ The export file and its backups, newest first. """
+        paths = [self.export_path] + [f"{self.export_path}.{i}" for i in range(1, self.backup_count + 1)]
+        return [p for p in paths if os.path.exists(p)]
+
+    def flush(self, timeout=2.0):
+        """ Waits (up to `timeout` seconds) until every finished trace has been written. """
+        if self._export_queue is None:
+            return
+        deadline = time.time() + timeout
+        while self._export_queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    # ========== ANALYSIS ==========
+    def spans_of(self, trace_id, include_exported_file=True):
+        """
+        All the spans of a trace: the ones finished in this process and, if the export file is shared,
+        the ones written by other processes (e.g. the MCP server).
+        """
+        spans = {s.span_id: _span_dict(s) for s in list(self.finished) if s.trace_id == trace_id}
+        for path in self._export_files() if include_exported_file and self.export_path else ():
+            found = False
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if trace_id not in line:
+                        continue
+                    found = True
+                    for rs in json.loads(line).get("resourceSpans", []):
+                        service = next((a["value"].get("stringValue") for a in rs["resource"]["attributes"] if a["key"] == "service.name"), "?")
+                        for ss in rs.get("scopeSpans", []):
+                            for s in ss.get("spans", []):
+                                if s["traceId"] == trace_id and s["spanId"] not in spans:
+                                    spans[s["spanId"]] = {
+                                        "span_id": s["spanId"], "parent_id": s.get("parentSpanId"), "name": s["name"],
+                                        "service": service, "start_ns": int(s["startTimeUnixNano"]),
+                                        "duration_ms": (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6,
+                                        "error": s.get("status", {}).get("code") == STATUS_ERROR,
+                                    }
+            if found:
+                break       # older files only hold older traces
+        for s in spans.values():
+            s.setdefault("service", self.service_name)
+        return sorted(spans.values(), key=lambda s: s["start_ns"])
+
+    def breakdown(self, trace_id):
+        """ Indented per-span latency table of a trace, as text. """
+        spans = self.spans_of(trace_id)
+        if not spans:
+            return f"No spans found for trace {trace_id}."
+        children = {}
+        for s in spans:
+            children.setdefault(s["parent_id"], []).append(s)
+        ids = {s["span_id"] for s in spans}
+        roots = [s for s in spans if s["parent_id"] not in ids]
+        total = max(r["duration_ms"] for r in roots) or 1.0
+
+        lines = [f"trace {trace_id}", f"{'span':<48}{'service':<12}{'ms':>10}{'%':>7}"]
+
+        def walk(span, depth):
+            name = ("  " * depth + span["name"])[:47]
+            flag = " !" if span.get("error") else ""
+            lines.append(f"{name:<48}{span['service'][:11]:<12}{span['duration_ms']:>10.1f}{100 * span['duration_ms'] / total:>6.1f}%{flag}")
+            for child in children.get(span["span_id"], []):
+                walk(child, depth + 1)
+
+        for root in roots:
+            walk(root, 0)
+        return "\n".join(lines)
+
+
+def _span_dict(span):
+    return {
+        "span_id": span.span_id, "parent_id": span.parent_id, "name": span.name,
+        "start_ns": span.start_ns, "duration_ms": span.duration_ms, "error": span.status == STATUS_ERROR,
+    }
+
+
+def _default_tracer():
+    enabled = os.environ.get("SNAP_TRACING", "1") != "0"
+    export_path = os.environ.get("SNAP_TRACE_FILE", str(LOGS_DIR / "traces.jsonl"))
+    max_bytes = int(os.environ.get("SNAP_TRACE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    backup_count = int(os.environ.get("SNAP_TRACE_BACKUPS", DEFAULT_BACKUPS))
+    return Tracer(service_name="mcp-snap", export_path=export_path, enabled=enabled, max_bytes=max_bytes, backup_count=backup_count)
+
+
+# Shared by every module of the process. The application sets tracer.service_name ("host" / "server").
+tracer = _default_tracer()
@@ -0,0 +1,143 @@
+"""
+Tolerant parsing of the function calls written by the LLM.
+
+The model is asked for {"function_call": {"name": ..., "arguments": {...}}} but it often writes almost-JSON:
+single quotes, trailing commas, newlines inside strings, Python literals, or it stops before the last braces.
+repair_json() rewrites such text into valid JSON in one pass; repair_function_call() also checks that the
+result is a call to a function that exists, so that a repair never invents a call.
+
+    repair_function_call("{'function_call': {'name': 'get_location', 'arguments': {'position': '43.77;11.25',}", names)
+    # {'name': 'get_location', 'arguments': {'position': '43.77;11.25'}}
+"""
+import difflib
+import json
+import re
+
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+JSON_LITERALS = {"true", "false", "null"}
+CLOSING = {"{": "}", "[": "]"}
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+
+
+def _next_char(text, i):
+    """ First non-blank character at or after i ("" at the end). """
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return text[i] if i < len(text) else ""
+
+
+def _drop_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text):
+    """
+    The JSON value that starts at the first '{' or '[' of `text`, repaired if needed. Raises ValueError.
+
+    A quote closes a string only if what follows can follow a string (, : } ] or the end),
+    so "dell'artigianato" and 'he said "hi"' survive both kinds of quoting.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("no JSON object in text")
+    i = min(starts)
+    out, stack, quote = [], [], None
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < len(text):
+                nxt = text[i + 1]
+                out.append(nxt if nxt == "'" else ch + nxt)
+                i += 2
+                continue
+            if ch == quote and _next_char(text, i + 1) in (",", ":", "}", "]", ""):
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch in "\n\r\t":
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}[ch])
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in CLOSING:
+            stack.append(CLOSING[ch])
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if not stack:
+                break
+            out.append(stack.pop())     # a mismatched bracket closes what is open
+            if not stack:
+                break
+        elif (ch.isdigit() or ch == "-") and (number := NUMBER.match(text, i)):
+            out.append(number.group())  # before identifiers: the exponent of -1.5e3 is not a word
+            i = number.end()
+            continue
+        elif ch.isalpha() or ch == "_":
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] in "_-."):
+                end += 1
+            word = text[i:end]
+            word = PYTHON_LITERALS.get(word, word)
+            out.append(word if word in JSON_LITERALS and _next_char(text, end) != ":" else json.dumps(word))
+            i = end
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # ========== TRUNCATED TEXT: CLOSE WHAT IS STILL OPEN ==========
+    if quote:
+        out.append('"')
+    while stack:
+        _drop_trailing_comma(out)
+        if out and out[-1] == ":":
+            out.append("null")
+        out.append(stack.pop())
+    return json.loads("".join(out))
+
+
+def _known_name(name, known_names):
+    """ The known function `name` refers to (exact, then case-insensitive), or None. """
+    if not known_names or name in known_names:
+        return name
+    by_lower = {k.lower(): k for k in known_names}
+    if name.lower() in by_lower:
+        return by_lower[name.lower()]
+    close = difflib.get_close_matches(name, list(known_names), n=1, cutoff=0.9)
+    return close[0] if close else None
+
+
+def repair_function_call(text, known_names=None):
+    """
+    {"name", "arguments"} from the almost-JSON of a function call, or None if it cannot be salvaged
+    or the name is not one of `known_names` (when given). String arguments are repaired as well.
+    """
+    try:
+        data = repair_json(text)
+    except ValueError:
+        return None
+    call = data.get("function_call") if isinstance(data, dict) else None
+    if not isinstance(call, dict) or not isinstance(call.get("name"), str):
+        return None
+    name = _known_name(call["name"], known_names)
+    if name is None:
+        return None
+    arguments = call.get("arguments") or {}
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments)
+        except ValueError:
+            try:
+                arguments = repair_json(arguments)
+            except ValueError:
+                return None
+    if not isinstance(arguments, dict):
+        return None
+    return {"name": name, "arguments": arguments}
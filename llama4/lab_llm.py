@@ -2,20 +2,28 @@ import json
 import requests
 import logging
 from llama4.token_manager import TokenManager
+from llama4.json_repair import repair_function_call
+from common import jsoncodec
+from common.tracing import tracer, SPAN_KIND_CLIENT
+from common.cassette import cassette
 import re
 import sys
+import os
+import threading
+import time
 from pathlib import Path
 
 
 # ========== LOGGING ==========
+# Handlers are configured by the application (host or server), see common/log_setup.py
 logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    filename="../logs/llm_output.log",
-    level=logging.INFO,
-    format="%(asctime)s %(message)s",
-    encoding="utf-8",
-)
+# ========== CONFIGURATION FILES ==========
+# Every path can be overridden from the environment (e.g. to run against local stubs).
+LLAMA4_DIR = Path(__file__).parent.absolute()
+CREDENTIALS_PATH = os.environ.get("LABLLM_CREDENTIALS", str(LLAMA4_DIR / "user_credentials.json"))
+CLEARML_CONFIG_PATH = os.environ.get("LABLLM_CONFIG", str(LLAMA4_DIR / "clearml_config.json"))
+TOKEN_STORE_PATH = os.environ.get("LABLLM_TOKEN_STORE", str(LLAMA4_DIR / "token_stored.json"))
 
 # ========== READ FROM JSON FILES ==========
 def load_json(path, required_keys):
@@ -29,7 +37,8 @@ def load_json(path, required_keys):
 # ========== REGEX ========== 
 JSON_START_PATTERN = r'\{\s*\\?["\']function_call["\']\s*:\s*'
 
-def parse_llm_answer_for_function(answer: str):
+@tracer.traced("llm.parse_function_call")
+def parse_llm_answer_for_function(answer: str, known_names=None):
     """
     Parses an LLM answer to separate a 'function_call' JSON body 
     from any surrounding reasoning text.
@@ -39,6 +48,7 @@ def parse_llm_answer_for_function(answer: str):
 
     Args:
         answer: The raw string response from the LLM.
+        known_names: Names of the functions that exist. Only used to validate a repaired call (step 3).
 
     Returns:
         A tuple: (parsed_function_call (dict or None), reasoning_text (str))
@@ -61,7 +71,7 @@ def parse_llm_answer_for_function(answer: str):
         json_end_index = json_start_index + len(match_full_block)
         
         try:
-            parsed_json = json.loads(json_string)
+            parsed_json = jsoncodec.loads(json_string)
             
             if isinstance(parsed_json, dict) and "function_call" in parsed_json:
                 parsed_function_call = parsed_json["function_call"]
@@ -78,7 +88,7 @@ def parse_llm_answer_for_function(answer: str):
     # 2. Check for a Pure JSON response (Scenario: Only JSON)
     if not parsed_function_call:
         try:
-            parsed_pure = json.loads(answer.strip())
+            parsed_pure = jsoncodec.loads(answer.strip())
             
             if isinstance(parsed_pure, dict) and "function_call" in parsed_pure:
                 parsed_function_call = parsed_pure["function_call"]
@@ -90,7 +100,21 @@ def parse_llm_answer_for_function(answer: str):
             logger.info("PARSE FAIL: Answer is not PURE JSON.")
             # Fall through, leaving parsed_function_call as None
 
-    # 3. Final Fallback: No valid function call found.
+    # 3. Repair almost-JSON (single quotes, trailing commas, True/None, missing closing braces...), see json_repair.py
+    # The repaired call is only accepted if it names a known function.
+    if match:
+        candidate, before, after = match.group(1), answer[:json_start_index], answer[json_end_index:]
+    else:
+        start = find_start_regex(answer)
+        candidate, before, after = (answer[start:], answer[:start], "") if start >= 0 else (None, "", "")
+    if candidate is not None:
+        repaired = repair_function_call(re.sub(r"`{3}\s*$", "", candidate.strip()), known_names)
+        if repaired:
+            logger.info("PARSE SUCCESS: malformed function_call JSON repaired (%s).", repaired["name"])
+            return repaired, (before + after).strip()
+        logger.info("PARSE FAIL: function_call JSON could not be repaired into a call to a known function.")
+
+    # 4. Final Fallback: No valid function call found.
     if not parsed_function_call:
         logger.info("PARSE FINAL: No valid function call JSON found. Answer treated as reasoning text.")
     
@@ -106,15 +130,49 @@ def find_start_regex(text):
     return -1
 
 class LabLLM:
-    def __init__(self):
+    def __init__(self, background_auth=False):
+        """
+        Authentication is lazy: it happens on the first chat_completion() call.
+        With `background_auth=True` (or calling start_background_auth()) it starts right away in a
+        separate thread, so that it overlaps with whatever the caller does in the meantime.
+        """
         self.username = None 
         self.password = None 
         self.api_base_url = None 
         self.endpoint = None
         self.access_token = None
         self.headers = None
-        self._login()
-        self._authenticate()
+        self._auth_lock = threading.Lock()
+        self._auth_thread = None
+        self.known_functions = None     # set by the host: names a repaired function_call may use
+        if background_auth:
+            self.start_background_auth()
+
+    def start_background_auth(self):
+        """
+        Starts login + token retrieval in a daemon thread. Errors are not raised here:
+        they will be raised again by the first chat_completion() call.
+        """
+        if self.headers is None and self._auth_thread is None and not cassette.replaying:
+            self._auth_thread = threading.Thread(target=self._background_auth, name="labllm-auth", daemon=True)
+            self._auth_thread.start()
+
+    def _background_auth(self):
+        try:
+            self.ensure_authenticated()
+        except Exception as e:
+            logger.error("LabLLM background authentication failed: %s", e)
+
+    def ensure_authenticated(self):
+        """
+        Logs in and generates the token only once, also when called by several threads.
+        """
+        if self.headers is not None:
+            return
+        with self._auth_lock:
+            if self.headers is None:
+                self._login()
+                self._authenticate()
 
     def _login(self):
         """ 
@@ -123,7 +181,7 @@ class LabLLM:
         """
         # == User credentials ==
         creds = load_json(
-            "../llama4/user_credentials.json",
+            CREDENTIALS_PATH,
             required_keys=["username", "password"]  
         )
         self.username = creds["username"]
@@ -131,17 +189,17 @@ class LabLLM:
 
         # == Load ClearML config ==
         cfg = load_json(
-            "../llama4/clearml_config.json",
+            CLEARML_CONFIG_PATH,
             required_keys=["clearml_ondemand_api_base_url", "clearml_llm_endpoint"]
         )
-        self.api_base_url = cfg["clearml_ondemand_api_base_url"]
+        self.api_base_url = os.environ.get("LABLLM_API_BASE_URL", cfg["clearml_ondemand_api_base_url"])
         self.endpoint = cfg["clearml_llm_endpoint"]
 
     def _authenticate(self):
         """
         Generate token and headers. 
         """
-        tm = TokenManager(self.username, self.password) 
+        tm = TokenManager(self.username, self.password, store_path=TOKEN_STORE_PATH)
         self.access_token = tm.get_token()
         self.headers = {
             "Accept": "application/json",
@@ -149,6 +207,44 @@ class LabLLM:
             "Authorization": f"Bearer {self.access_token}",
         }
 
+    def _post_prompt(self, prompt):
+        """
+        POST the prompt to the LabLLM endpoint and return (status_code, response text).
+        With SNAP_CASSETTE_MODE=replay the answer comes from the cassettes and no authentication is needed.
+        The cassette key is the prompt only: endpoint and token do not change the answer.
+        Connection errors and timeouts are recorded too, and raised again (as requests.ConnectionError) on replay.
+        """
+        request = cassette.request("POST", "labllm", body={"prompt": prompt})
+        if cassette.replaying:
+            episode = cassette.play(request)
+            time.sleep(cassette.delay(episode))
+            if episode["error"]:
+                raise requests.ConnectionError(episode["error"])
+            return episode["status"], episode["response"]
+
+        self.ensure_authenticated()
+        body = {
+            "access_token": self.access_token,
+            "endpoint": self.endpoint,
+            "params": {"prompt": prompt}
+        }
+        started = time.perf_counter()
+        try:
+            response = requests.post(
+                self.api_base_url,
+                data=jsoncodec.dumpb(body),
+                headers=self.headers
+            )
+        except requests.RequestException as e:
+            if cassette.recording:
+                cassette.record(request, error=f"{type(e).__name__}: {e}", elapsed=time.perf_counter() - started)
+            raise
+        if cassette.recording:
+            cassette.record(request, status=response.status_code, response=response.text,
+                            elapsed=time.perf_counter() - started)
+        return response.status_code, response.text
+
+    @tracer.traced("llm.chat_completion")
     def chat_completion(self, messages, functions=None, function_call="auto", max_tokens=500):
         """
         This is where magic happens. This function mimics OpenAI chat.completion.create() function. 
@@ -172,27 +268,22 @@ class LabLLM:
         
         Note: the arg `functions` does nothing. In OpenAI style, the tools are passed to the llm with every call. I find that redundant. Once with the SYSTEM_MESSAGE is enough. Look inside the client code where the server is initialized. 
         """
-        body = {
-            "access_token": self.access_token,
-            "endpoint": self.endpoint,
-            "params": {"prompt": str(messages)}
-        }
+        prompt = str(messages)
+        logger.info("LLM PROMPT: %d chars, %d messages", len(prompt), len(messages))
 
         # ========== INVOKE LLM COMPLETION ==========  
-        response = requests.post(
-            self.api_base_url,
-            data=json.dumps(body),
-            headers=self.headers
-        )
+        with tracer.span("llm.http", kind=SPAN_KIND_CLIENT, prompt_chars=len(prompt)) as span:
+            status_code, text = self._post_prompt(prompt)
+            span.set_attribute("http.status_code", status_code)
 
-        if response.status_code != 200:
-            logger.error("LabLLM API error: %s", response.text)
-            raise Exception(f"LabLLM error 1: {response.status_code}")
+        if status_code != 200:
+            logger.error("LabLLM API error: %s", text)
+            raise Exception(f"LabLLM error 1: {status_code}")
 
         # ========== GET RELEVANT PART: ANSWER ========== 
         # `data` comprehends both previous messages AND the answer
         # {"prompt": "my_prompt", "answer": "llm_answer"}
-        data = response.json()
+        data = jsoncodec.loads(text)
         if isinstance(data, dict):
             answer = data.get("answer", "")
         else:
@@ -206,7 +297,7 @@ class LabLLM:
             
             # ========== FIND FUNCTION IN ANSWER ==========
             # Divide LLM answer in `parsed_function_call` = JSON and `reasoning_text` = Text
-            parsed_function_call, reasoning_text = parse_llm_answer_for_function(answer) 
+            parsed_function_call, reasoning_text = parse_llm_answer_for_function(answer, self.known_functions)
                 
         # ========== BUILD JSON-FUNCTION_CALL OPENAI STYLE ========== 
         if parsed_function_call:
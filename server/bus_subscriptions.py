@@ -0,0 +1,217 @@
+"""
+Live bus positions as subscribable MCP resources: busposition://{agency}/{line}
+
+- One poller per (agency, line), shared by every subscribed session: upstream calls do not grow with the subscribers.
+- Each poll is diffed against the previous snapshot (vehicles are identified by vehicleNum, or by the feature id).
+  Only if something changed, every subscriber gets a notifications/resources/updated. The notification `_meta`
+  carries the delta: {"version", "changed": [features], "removed": [vehicle ids]}. Clients that ignore `_meta`
+  simply read the resource again and get the whole snapshot.
+- The poller stops when the last session unsubscribes (or cannot be reached any more). A feed nobody subscribes to
+  nor reads is forgotten after IDLE_INTERVALS poll intervals.
+- Reads return the upstream answer as it was (envelope included), only the features are the latest snapshot.
+
+`agency` and `line` are URL-encoded in the URI (e.g. busposition://Autolinee%20Toscane/14); line "all" means every line.
+"""
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import unquote, urlsplit
+
+from mcp import types
+
+logger = logging.getLogger(__name__)
+
+URI_SCHEME = "busposition"
+ALL_LINES = "all"
+DEFAULT_POLL_INTERVAL = float(os.environ.get("SNAP_BUS_POLL_INTERVAL", 15))
+IDLE_INTERVALS = 4
+
+
+def parse_uri(uri):
+    """ 'busposition://<agency>/<line>' -> (agency, line or None). Raises ValueError for other URIs. """
+    parts = urlsplit(str(uri))
+    if parts.scheme != URI_SCHEME or not parts.netloc:
+        raise ValueError(f"Not a bus position resource: {uri}")
+    line = unquote(parts.path.strip("/"))
+    return unquote(parts.netloc), (None if line in ("", ALL_LINES) else line)
+
+
+def vehicle_id(feature):
+    props = feature.get("properties") or {}
+    return str(props.get("vehicleNum") or feature.get("id") or feature.get("geometry", {}).get("coordinates"))
+
+
+def index_features(data):
+    """ Upstream FeatureCollection -> {vehicle id: feature}. Anything else is treated as 'no vehicles'. """
+    features = data.get("features", []) if isinstance(data, dict) else []
+    return {vehicle_id(f): f for f in features}
+
+
+def diff_snapshots(old, new):
+    """ (changed features, removed ids) going from `old` to `new`, both {vehicle id: feature}. """
+    changed = [f for vid, f in new.items() if old.get(vid) != f]
+    removed = [vid for vid in old if vid not in new]
+    return changed, removed
+
+
+class _Feed:
+    """ State of one (agency, line): subscribers, last snapshot and the poller task. """
+    def __init__(self, key):
+        self.key = key
+        self.sessions = {}          # id(session) -> (session, uri as subscribed)
+        self.snapshot = None        # {vehicle id: feature}
+        self.envelope = {"type": "FeatureCollection"}     # top-level keys of the last answer, except "features"
+        self.version = 0
+        self.fetched_at = 0.0
+        self.used_at = time.monotonic()
+        self.task = None
+
+
+class BusPositionHub:
+    def __init__(self, fetch, interval=DEFAULT_POLL_INTERVAL):
+        """
+        fetch: coroutine function (agency, line) -> decoded upstream JSON (or None on error).
+        interval: seconds between two polls of the same (agency, line).
+        """
+        self.fetch = fetch
+        self.interval = interval
+        self._feeds = {}
+        self._lock = asyncio.Lock()
+
+    # ========== READ ==========
+    async def snapshot(self, agency, line):
+        """
+        Current FeatureCollection for (agency, line). A snapshot younger than `interval` is reused,
+        so reads and tool calls ride on the poller instead of adding upstream calls.
+        """
+        self._evict_idle()
+        feed = self._feeds.get((agency, line))
+        if feed is None or feed.snapshot is None or time.monotonic() - feed.fetched_at > self.interval:
+            feed = feed or self._feeds.setdefault((agency, line), _Feed((agency, line)))
+            feed.used_at = time.monotonic()
+            await self._poll(feed, notify=feed.task is not None)
+        feed.used_at = time.monotonic()
+        return self.as_collection(feed)
+
+    def fresh(self, agency, line):
+        """ The cached FeatureCollection if it is younger than `interval`, else None. """
+        feed = self._feeds.get((agency, line))
+        if feed is None or feed.snapshot is None or time.monotonic() - feed.fetched_at > self.interval:
+            return None
+        feed.used_at = time.monotonic()
+        return self.as_collection(feed)
+
+    @staticmethod
+    def as_collection(feed):
+        """ Same shape as the upstream answer: its envelope with the features of the snapshot. """
+        return dict(feed.envelope, features=list((feed.snapshot or {}).values()))
+
+    def _evict_idle(self):
+        """ Forgets the feeds read for arbitrary (agency, line) pairs that nobody subscribed to or read lately. """
+        limit = time.monotonic() - IDLE_INTERVALS * self.interval
+        for key, feed in list(self._feeds.items()):
+            if not feed.sessions and (feed.task is None or feed.task.done()) and feed.used_at < limit:
+                del self._feeds[key]
+
+    # ========== SUBSCRIPTIONS ==========
+    async def subscribe(self, uri, session):
+        key = parse_uri(uri)
+        async with self._lock:
+            feed = self._feeds.setdefault(key, _Feed(key))
+            feed.sessions[id(session)] = (session, str(uri))
+            if feed.task is None or feed.task.done():
+                feed.task = asyncio.create_task(self._run(feed), name=f"busposition:{key}")
+        logger.info("BUS POSITION SUBSCRIBE %s (%d subscribers)", key, len(feed.sessions))
+
+    async def unsubscribe(self, uri, session):
+        key = parse_uri(uri)
+        async with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None:
+                return
+            feed.sessions.pop(id(session), None)
+            if not feed.sessions:
+                self._stop(feed)
+        logger.info("BUS POSITION UNSUBSCRIBE %s", key)
+
+    def _stop(self, feed):
+        if feed.task is not None:
+            feed.task.cancel()
+            feed.task = None
+
+    async def close(self):
+        for feed in self._feeds.values():
+            self._stop(feed)
+
+    # ========== POLLING ==========
+    async def _run(self, feed):
+        while feed.sessions:
+            started = time.monotonic()
+            try:
+                await self._poll(feed, notify=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Bus position poll %s failed: %s", feed.key, e)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def _poll(self, feed, notify):
+        data = await self.fetch(*feed.key)
+        if data is None:
+            return  # upstream error: keep the previous snapshot, try again at the next tick
+        new = index_features(data)
+        old = feed.snapshot
+        feed.snapshot, feed.fetched_at = new, time.monotonic()
+        if isinstance(data, dict):
+            feed.envelope = {k: v for k, v in data.items() if k != "features"}
+        if old is None:
+            feed.version += 1
+            return
+        changed, removed = diff_snapshots(old, new)
+        if not changed and not removed:
+            return
+        feed.version += 1
+        if notify:
+            await self._notify(feed, {"version": feed.version, "changed": changed, "removed": removed})
+
+    async def _notify(self, feed, delta):
+        for sid, (session, uri) in list(feed.sessions.items()):
+            notification = types.ResourceUpdatedNotification(
+                method="notifications/resources/updated",
+                params=types.ResourceUpdatedNotificationParams(uri=uri, _meta=delta),
+            )
+            try:
+                await session.send_notification(types.ServerNotification(notification))
+            except Exception as e:
+                # The client went away without unsubscribing.
+                logger.info("BUS POSITION dropping subscriber of %s: %s", feed.key, e)
+                feed.sessions.pop(sid, None)
+        if not feed.sessions:
+            feed.task = None
+
+
+def enable_subscriptions(mcp, hub):
+    """
+    Registers resources/subscribe and resources/unsubscribe on the FastMCP low-level server and advertises
+    `resources.subscribe` in the capabilities (FastMCP does not expose subscriptions itself).
+    """
+    server = mcp._mcp_server
+
+    @server.subscribe_resource()
+    async def _subscribe(uri):
+        await hub.subscribe(uri, server.request_context.session)
+
+    @server.unsubscribe_resource()
+    async def _unsubscribe(uri):
+        await hub.unsubscribe(uri, server.request_context.session)
+
+    get_capabilities = server.get_capabilities
+
+    def get_capabilities_with_subscribe(*args, **kwargs):
+        capabilities = get_capabilities(*args, **kwargs)
+        if capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
+
+    server.get_capabilities = get_capabilities_with_subscribe
@@ -0,0 +1,188 @@
+"""
+City-wide event sets for get_events, one per range (day, week, month).
+
+/events answers depend on the range and on where the user is (selection/maxDists/maxResults), but the events
+themselves are the same for everybody. So the store downloads the whole set of a range once (no selection,
+maxResults=0) and answers every query by filtering locally:
+- selection 'lat;lng' + maxDists (km, default 0.1): events within that distance, nearest first;
+- selection 'lat1;lng1;lat2;lng2': events inside the rectangle;
+- maxResults (default 100, 0 = all).
+'wkt:' / 'geo:' selections and maxDists=inside need the upstream geometry index: query() returns None for them.
+
+While a range is being asked for, it is refreshed in the background every SNAP_EVENTS_REFRESH seconds
+(with the "refresh" priority of the upstream scheduler, below tool calls and prefetches).
+/events has no "changed since" parameter, so a refresh still downloads the set; it is merged by serviceUri and
+the version only moves when events were added, changed or removed. A failed refresh keeps the previous set.
+After a failed download, queries go straight upstream (or use the previous set) for SNAP_EVENTS_BACKOFF seconds
+instead of trying the download again every time.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+
+from common import jsoncodec
+from feature_store import CompactCollection
+from response_cache import CACHE_REQUESTS
+from scheduler import upstream_priority
+
+logger = logging.getLogger(__name__)
+
+RANGES = ("day", "week", "month")
+DEFAULT_REFRESH = float(os.environ.get("SNAP_EVENTS_REFRESH", 900))
+FAILURE_BACKOFF = float(os.environ.get("SNAP_EVENTS_BACKOFF", 60))
+DEFAULT_MAX_DISTS_KM = 0.1
+DEFAULT_MAX_RESULTS = 100
+COLLECTION_KEY = "Event"
+EARTH_RADIUS_KM = 6371.0
+
+
+def _distances_km(lat, lon, lats, lons):
+    p = math.radians(lat)
+    out = []
+    for la, lo in zip(lats, lons):
+        if math.isnan(la):
+            out.append(math.inf)
+            continue
+        dp, dl = math.radians(la) - p, math.radians(lo - lon)
+        a = math.sin(dp / 2) ** 2 + math.cos(p) * math.cos(math.radians(la)) * math.sin(dl / 2) ** 2
+        out.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a)))
+    return out
+
+
+def parse_selection(selection):
+    """ None, ('point', lat, lon) or ('box', lat1, lon1, lat2, lon2). Raises ValueError if it must go upstream. """
+    if not selection:
+        return None
+    try:
+        numbers = [float(x) for x in str(selection).split(";")]
+    except ValueError:
+        raise ValueError(f"selection {selection!r} is not filtered locally")
+    if len(numbers) == 2:
+        return ("point", *numbers)
+    if len(numbers) == 4:
+        return ("box", *numbers)
+    raise ValueError(f"selection {selection!r} is not filtered locally")
+
+
+class _EventSet:
+    __slots__ = ("collection", "digests", "version", "fetched_at", "failed_at", "asked_at", "task", "lock")
+
+    def __init__(self):
+        self.collection = None      # CompactCollection of the whole range
+        self.digests = {}           # serviceUri -> hash of the feature, to tell what changed
+        self.version = 0
+        self.fetched_at = 0.0
+        self.failed_at = -math.inf    # last failed download
+        self.asked_at = 0.0
+        self.task = None
+        self.lock = asyncio.Lock()
+
+
+class EventsStore:
+    def __init__(self, fetch, refresh=DEFAULT_REFRESH):
+        """
+        fetch: coroutine function (range) -> decoded /events answer for the whole city (or None on error).
+        refresh: seconds between two downloads of the same range; a range nobody asked for in 4 refresh
+                 periods stops being refreshed.
+        """
+        self.fetch = fetch
+        self.refresh = refresh
+        self._sets = {}
+
+    # ========== QUERIES ==========
+    async def query(self, range_=None, selection=None, max_dists=None, max_results=None):
+        """ get_events answer computed locally, or None when the query needs /events itself. """
+        range_ = range_ or "day"
+        if range_ not in RANGES or str(max_dists or "").strip().lower() == "inside":
+            return None
+        try:
+            where = parse_selection(selection)
+            radius = float(max_dists) if max_dists else DEFAULT_MAX_DISTS_KM
+            limit = int(max_results) if max_results not in (None, "") else DEFAULT_MAX_RESULTS
+        except ValueError:
+            return None
+
+        events, downloaded = await self._current(range_)
+        if events.collection is None:
+            return None
+        CACHE_REQUESTS.inc(cache="events", result="miss" if downloaded else "hit")
+        return {COLLECTION_KEY: self._filter(events.collection, where, radius, limit)}
+
+    @staticmethod
+    def _filter(collection, where, radius, limit):
+        indexes = range(collection.size)
+        if where and where[0] == "point":
+            distances = _distances_km(where[1], where[2], collection.lat, collection.lon)
+            indexes = sorted((i for i in indexes if distances[i] <= radius), key=distances.__getitem__)
+        elif where:
+            lat1, lat2 = sorted((where[1], where[3]))
+            lon1, lon2 = sorted((where[2], where[4]))
+            indexes = [i for i in indexes if lat1 <= collection.lat[i] <= lat2 and lon1 <= collection.lon[i] <= lon2]
+        if limit > 0:
+            indexes = list(indexes)[:limit]
+        return {"type": "FeatureCollection", "features": [collection.feature(i) for i in indexes]}
+
+    async def _current(self, range_):
+        """ (event set of the range, whether it was downloaded for this query). """
+        events = self._sets.setdefault(range_, _EventSet())
+        events.asked_at = time.monotonic()
+        downloaded = False
+        async with events.lock:
+            now = time.monotonic()
+            stale = events.collection is None or now - events.fetched_at > self.refresh
+            if stale and now - events.failed_at > FAILURE_BACKOFF:
+                try:
+                    downloaded = await self._refresh(range_, events)
+                except Exception as e:
+                    logger.error("Events download %s failed: %s", range_, e)
+        if events.task is None or events.task.done():
+            events.task = asyncio.create_task(self._run(range_, events), name=f"events:{range_}")
+        return events, downloaded
+
+    # ========== REFRESH ==========
+    async def _run(self, range_, events):
+        while time.monotonic() - events.asked_at < 4 * self.refresh:
+            await asyncio.sleep(self.refresh)
+            try:
+                async with events.lock:
+                    with upstream_priority("refresh"):
+                        await self._refresh(range_, events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Events refresh %s failed: %s", range_, e)
+        events.task = None
+
+    async def _refresh(self, range_, events):
+        """ Downloads the set of the range; False if upstream failed (the previous set is kept). """
+        try:
+            data = await self.fetch(range_)
+        except Exception:
+            events.failed_at = time.monotonic()
+            raise
+        collection = data.get(COLLECTION_KEY) if isinstance(data, dict) else None
+        if not isinstance(collection, dict) or not isinstance(collection.get("features"), list):
+            events.failed_at = time.monotonic()
+            return False
+        features = collection["features"]
+        digests = {(f.get("properties") or {}).get("serviceUri") or str(f.get("id")): hash(jsoncodec.dumpb(f, sort_keys=True))
+                   for f in features}
+        old = events.digests
+        added = sum(1 for u in digests if u not in old)
+        changed = sum(1 for u, d in digests.items() if u in old and old[u] != d)
+        removed = sum(1 for u in old if u not in digests)
+        events.fetched_at = time.monotonic()
+        if events.collection is not None and not (added or changed or removed):
+            return True
+        events.collection, events.digests = CompactCollection(collection), digests
+        events.version += 1
+        logger.info("EVENTS %s v%d: %d events (+%d ~%d -%d)", range_, events.version, len(digests), added, changed, removed)
+        return True
+
+    async def close(self):
+        for events in self._sets.values():
+            if events.task is not None:
+                events.task.cancel()
+                events.task = None
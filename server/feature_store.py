@@ -0,0 +1,141 @@
+"""
+Compact in-memory form of the GeoJSON answers kept in the response caches (get_services, iot_search, get_bus_stops).
+
+A FeatureCollection held as parsed JSON is one dict per feature, one per geometry, one per properties, a list per
+coordinate pair, and the same strings ("TransferServiceAndRenting_BusStop", agency names...) over and over.
+Here a collection is stored by columns:
+- Point coordinates in two array('d') (16 bytes per feature); other geometries are kept as they are, by index;
+- every property is a column; string columns are dictionary-encoded (array of int codes + list of interned strings),
+  nested objects (the IoT "values") are split into sub-columns, other values are kept in a plain list;
+- records use __slots__.
+The GeoJSON is rebuilt only when an answer is sent (materialize()), so the cache holds the compact form only.
+"""
+import sys
+from array import array
+
+MISSING = object()          # property absent from a feature (not the same as null)
+_NO_CODE = 0xFFFFFFFF
+
+
+class _Column:
+    """ One property over all the features of a collection. """
+    __slots__ = ("codes", "dictionary", "values", "nested")
+
+    def __init__(self, values):
+        self.nested = None
+        if any(isinstance(v, dict) for v in values) and all(isinstance(v, dict) or v is MISSING for v in values):
+            # Objects (e.g. the IoT "values") become sub-columns; `codes` only tells whether the object is there.
+            self.codes = array("B", (v is not MISSING for v in values))
+            self.dictionary, self.values = None, None
+            self.nested = _columns([{} if v is MISSING else v for v in values])
+        elif all(isinstance(v, str) or v is MISSING for v in values):
+            index = {}
+            self.dictionary = []
+            self.codes = array("I")
+            for v in values:
+                if v is MISSING:
+                    self.codes.append(_NO_CODE)
+                    continue
+                code = index.get(v)
+                if code is None:
+                    code = index[v] = len(self.dictionary)
+                    self.dictionary.append(sys.intern(v))
+                self.codes.append(code)
+            self.values = None
+        else:
+            self.codes, self.dictionary, self.values = None, None, values
+
+    def __getitem__(self, i):
+        if self.nested is not None:
+            return _row(self.nested, i) if self.codes[i] else MISSING
+        if self.values is not None:
+            return self.values[i]
+        code = self.codes[i]
+        return MISSING if code == _NO_CODE else self.dictionary[code]
+
+
+def _columns(rows):
+    """ [dict, ...] -> {key: _Column}, keys in order of first appearance. """
+    keys = {}
+    for row in rows:
+        for k in row:
+            keys.setdefault(k, None)
+    return {sys.intern(k) if isinstance(k, str) else k: _Column([row.get(k, MISSING) for row in rows]) for k in keys}
+
+
+def _row(columns, i):
+    row = {}
+    for k, column in columns.items():
+        v = column[i]
+        if v is not MISSING:
+            row[k] = v
+    return row
+
+
+class CompactCollection:
+    __slots__ = ("size", "lon", "lat", "geometries", "properties", "extras", "meta")
+
+    def __init__(self, collection):
+        features = collection.get("features") or []
+        self.size = len(features)
+        self.lon, self.lat = array("d"), array("d")
+        self.geometries = {}        # index -> geometry that is not a plain Point
+        for i, f in enumerate(features):
+            geometry = f.get("geometry")
+            coords = geometry.get("coordinates") if isinstance(geometry, dict) else None
+            if (isinstance(geometry, dict) and geometry.get("type") == "Point" and len(geometry) == 2
+                    and isinstance(coords, list) and len(coords) == 2):
+                self.lon.append(coords[0])
+                self.lat.append(coords[1])
+            else:
+                self.lon.append(float("nan"))
+                self.lat.append(float("nan"))
+                self.geometries[i] = geometry
+        self.properties = _columns([f.get("properties") or {} for f in features])
+        # Feature members other than geometry/type/properties (usually "id").
+        self.extras = _columns([{k: v for k, v in f.items() if k not in ("geometry", "type", "properties")} for f in features])
+        self.meta = {k: v for k, v in collection.items() if k != "features"}
+
+    def feature(self, i):
+        geometry = self.geometries[i] if i in self.geometries else {"type": "Point", "coordinates": [self.lon[i], self.lat[i]]}
+        feature = {"geometry": geometry, "type": "Feature", "properties": _row(self.properties, i)}
+        feature.update(_row(self.extras, i))
+        return feature
+
+    def materialize(self):
+        collection = dict(self.meta)
+        collection["features"] = [self.feature(i) for i in range(self.size)]
+        return collection
+
+
+def _is_collection(value):
+    return isinstance(value, dict) and isinstance(value.get("features"), list)
+
+
+class CompactResponse:
+    """
+    A whole upstream answer: either a FeatureCollection, or a dict some of whose members are FeatureCollections
+    (get_services: {"Services": ..., "BusStops": ...}). Everything else is kept as is.
+    """
+    __slots__ = ("root", "parts")
+
+    def __init__(self, data):
+        if _is_collection(data):
+            self.root, self.parts = CompactCollection(data), None
+        else:
+            self.root = None
+            self.parts = {k: CompactCollection(v) if _is_collection(v) else v for k, v in data.items()}
+
+    def materialize(self):
+        if self.root is not None:
+            return self.root.materialize()
+        return {k: v.materialize() if isinstance(v, CompactCollection) else v for k, v in self.parts.items()}
+
+
+def compact(data):
+    """ Upstream JSON -> CompactResponse; None and anything that is not a JSON object are returned unchanged. """
+    return CompactResponse(data) if isinstance(data, dict) else data
+
+
+def materialize(value):
+    return value.materialize() if isinstance(value, CompactResponse) else value
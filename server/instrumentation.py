@@ -0,0 +1,39 @@
+"""
+Decorator applied to every @mcp.tool() function: it opens the server-side span of the tool call,
+continuing the trace started by the host (the W3C traceparent travels in the MCP request `_meta`),
+and updates the tool metrics (calls, latency, in-flight, upstream bytes, see metrics.py).
+"""
+import functools
+
+from mcp.server.lowlevel.server import request_ctx
+
+from common.tracing import tracer, SPAN_KIND_SERVER
+from metrics import tool_call
+
+
+def request_traceparent():
+    """ traceparent sent by the client in the `_meta` of the current MCP request, if any. """
+    try:
+        meta = request_ctx.get().meta
+    except LookupError:
+        return None
+    return getattr(meta, "traceparent", None) if meta is not None else None
+
+
+def instrument_tool(fn):
+    """
+    Must be placed below @mcp.tool(): functools.wraps keeps name, docstring and signature,
+    so FastMCP builds the same tool schema.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with tool_call(name) as call, tracer.span(f"tool.{name}", traceparent=request_traceparent(), kind=SPAN_KIND_SERVER) as span:
+            result = await fn(*args, **kwargs)
+            call["outcome"] = "ok" if result is not None else "empty"
+            if result is None:
+                span.set_attribute("tool.empty_result", True)
+            return result
+
+    return wrapper
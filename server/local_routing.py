@@ -0,0 +1,325 @@
+"""
+Local routing engine, used by route_shortest_path when /shortestpath is unreachable (or first, with SNAP_LOCAL_ROUTING=prefer).
+
+The graph is built from what the server has already downloaded: get_bus_routes tells which line a route belongs to,
+get_bus_stops gives the ordered stops of a route. Nodes are the stops; edges are
+- ride edges between consecutive stops of a route (bus speed + dwell time, plus a waiting time when boarding),
+- walking edges between stops closer than WALK_LINK_KM (found with a grid, not by comparing every pair).
+Source and destination are joined to the stops within WALK_ACCESS_KM, and walking the whole way is always an option.
+
+A* runs on (stop, route) states, so that changing bus costs a new wait. The heuristic is the straight-line distance
+at bus speed, computed on coordinates projected once when the graph is built.
+Walking queries have no street graph here: the answer is the straight-line distance times WALK_DETOUR, marked as estimated.
+"""
+import asyncio
+import heapq
+import json
+import math
+import os
+import time
+from datetime import datetime, timedelta
+
+EARTH_RADIUS_KM = 6371.0
+BUS_SPEED_KMH = 18.0
+WALK_SPEED_KMH = 4.8
+DWELL_MIN = 0.4            # per stop, while on the bus
+WAIT_MIN = 6.0             # when boarding or changing bus (half of a typical urban headway)
+WALK_LINK_KM = 0.35
+WALK_ACCESS_KM = 1.0
+WALK_DETOUR = 1.3          # street distance / straight-line distance, for walking estimates
+SAVE_DELAY = 5.0           # seconds: the changes of a burst of answers are written to SNAP_TRANSIT_CACHE at once
+
+MODE_OFF, MODE_FALLBACK, MODE_PREFER = "off", "fallback", "prefer"
+WALK_TYPES = ("foot_shortest", "foot_quiet")
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_point(text):
+    """ 'lat;lon' -> (lat, lon), None for anything else (e.g. a serviceUri). """
+    try:
+        lat, lon = (float(x) for x in str(text).replace(",", ";").split(";"))
+    except (TypeError, ValueError):
+        return None
+    return (lat, lon) if -90 <= lat <= 90 and -180 <= lon <= 180 else None
+
+
+def _minutes_to_hms(minutes):
+    seconds = int(round(minutes * 60))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class TransitGraph:
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.routes = {}        # route uri -> {"line": str, "name": str}
+        self.route_stops = {}   # route uri -> [stop uri, ...] in travel order
+        self.stops = {}         # stop uri -> (name, lat, lon)
+        self._built = None
+        self._dirty = False
+        self._save_handle = None
+        if cache_path and os.path.exists(cache_path):
+            self._load()
+
+    # ========== DATA ==========
+    def add_routes(self, data):
+        """ get_bus_routes answer: {"BusRoutes": [{"route", "line", "routeName", ...}]} """
+        rows = data.get("BusRoutes", []) if isinstance(data, dict) else []
+        for r in rows:
+            if isinstance(r, dict) and r.get("route"):
+                self.routes[r["route"]] = {"line": str(r.get("line") or ""), "name": r.get("routeName") or ""}
+        self._changed(graph=False)     # line names are read when answering, the graph does not change
+
+    def add_route_stops(self, route, data):
+        """ get_bus_stops answer for `route`: {"BusStops": FeatureCollection}, features in travel order. """
+        collection = data.get("BusStops", data) if isinstance(data, dict) else {}
+        sequence = []
+        for f in collection.get("features", []) if isinstance(collection, dict) else []:
+            props = f.get("properties") or {}
+            coords = (f.get("geometry") or {}).get("coordinates")
+            uri = props.get("serviceUri")
+            if not uri or not coords or len(coords) < 2:
+                continue
+            self.stops[uri] = (props.get("name") or uri.rsplit("/", 1)[-1], float(coords[1]), float(coords[0]))
+            sequence.append(uri)
+        if len(sequence) >= 2:
+            self.route_stops[route] = sequence
+            self._changed()
+
+    def _changed(self, graph=True):
+        if graph:
+            self._built = None
+        if not self.cache_path:
+            return
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._save_handle is None:
+            self._save_handle = loop.call_later(SAVE_DELAY, self._save_later, loop)
+
+    def _save_later(self, loop):
+        """ Runs on the event loop: snapshot here, file written in a thread. """
+        self._save_handle = None
+        if self._dirty:
+            self._dirty = False
+            loop.run_in_executor(None, self._save, self._snapshot())
+
+    def flush(self):
+        """ Writes pending changes now (at shutdown, or outside of an event loop). """
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self._dirty and self.cache_path:
+            self._dirty = False
+            self._save(self._snapshot())
+
+    def _snapshot(self):
+        # route_stops values and routes entries are replaced, never modified in place: shallow copies are enough
+        return {"routes": dict(self.routes), "route_stops": dict(self.route_stops), "stops": dict(self.stops)}
+
+    def _save(self, snapshot):
+        tmp = f"{self.cache_path}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.cache_path)
+
+    def _load(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.routes = data.get("routes", {})
+        self.route_stops = data.get("route_stops", {})
+        self.stops = {k: tuple(v) for k, v in data.get("stops", {}).items()}
+
+    # ========== GRAPH ==========
+    def _build(self):
+        """ Indexes, projected coordinates and adjacency lists. Rebuilt only after new data arrived. """
+        uris = sorted(self.stops)
+        index = {u: i for i, u in enumerate(uris)}
+        lat0 = sum(self.stops[u][1] for u in uris) / len(uris) if uris else 0.0
+        kx = math.radians(1) * EARTH_RADIUS_KM * math.cos(math.radians(lat0))
+        ky = math.radians(1) * EARTH_RADIUS_KM
+        xy = [(self.stops[u][2] * kx, self.stops[u][1] * ky) for u in uris]
+
+        route_ids = sorted(self.route_stops)
+        ride = [[] for _ in uris]       # stop -> [(next stop, route id, km)]
+        for rid, route in enumerate(route_ids):
+            seq = [index[u] for u in self.route_stops[route] if u in index]
+            for a, b in zip(seq, seq[1:]):
+                ride[a].append((b, rid, self._km(uris, a, b)))
+
+        grid = {}
+        for i, (x, y) in enumerate(xy):
+            grid.setdefault((int(x // WALK_LINK_KM), int(y // WALK_LINK_KM)), []).append(i)
+        walk = [[] for _ in uris]
+        for i, (x, y) in enumerate(xy):
+            cx, cy = int(x // WALK_LINK_KM), int(y // WALK_LINK_KM)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j in grid.get((cx + dx, cy + dy), ()):
+                        if j != i:
+                            km = self._km(uris, i, j)
+                            if km <= WALK_LINK_KM:
+                                walk[i].append((j, km))
+
+        self._built = {"uris": uris, "index": index, "xy": xy, "kx": kx, "ky": ky,
+                       "route_ids": route_ids, "ride": ride, "walk": walk}
+        return self._built
+
+    def _km(self, uris, a, b):
+        _, lat1, lon1 = self.stops[uris[a]]
+        _, lat2, lon2 = self.stops[uris[b]]
+        return haversine_km(lat1, lon1, lat2, lon2)
+
+    def _near(self, g, lat, lon, radius_km):
+        return [(i, km) for i, u in enumerate(g["uris"])
+                if (km := haversine_km(lat, lon, self.stops[u][1], self.stops[u][2])) <= radius_km]
+
+    # ========== QUERIES ==========
+    def route(self, source, destination, route_type=None, start_datetime=None):
+        """
+        Answer shaped like /shortestpath ({"journey": {"routes": [...]}}), or None if this engine cannot answer
+        (points given as serviceUri, car routing).
+        """
+        src, dst = parse_point(source), parse_point(destination)
+        route_type = route_type or "foot_shortest"
+        if src is None or dst is None or route_type not in WALK_TYPES + ("public_transport",):
+            return None
+        start = _parse_start(start_datetime)
+        if route_type in WALK_TYPES:
+            km = haversine_km(*src, *dst) * WALK_DETOUR
+            legs = [{"mode": "walk", "from": "source", "to": "destination", "km": km, "points": [src, dst]}]
+            return _journey(legs, km / WALK_SPEED_KMH * 60, start, estimated=True)
+        return self._transit(src, dst, start)
+
+    def _transit(self, src, dst, start):
+        g = self._built or self._build()
+        xy, ride, walk = g["xy"], g["ride"], g["walk"]
+        dx, dy = dst[1] * g["kx"], dst[0] * g["ky"]
+        to_minutes_bus = 60 / BUS_SPEED_KMH
+        to_minutes_walk = 60 / WALK_SPEED_KMH
+
+        def h(i):
+            x, y = xy[i]
+            return math.hypot(x - dx, y - dy) * to_minutes_bus
+
+        goal_links = dict(self._near(g, *dst, WALK_ACCESS_KM))
+        direct = haversine_km(*src, *dst)
+        best_total, best_path = direct * to_minutes_walk, None    # walking all the way
+
+        # state: (stop, route id or -1 when on foot); parent: state -> (previous state, edge)
+        dist, parent, heap = {}, {}, []
+        for i, km in self._near(g, *src, WALK_ACCESS_KM):
+            state, cost = (i, -1), km * to_minutes_walk
+            if cost < dist.get(state, math.inf):
+                dist[state], parent[state] = cost, (None, ("walk", km))
+                heapq.heappush(heap, (cost + h(i), cost, state))
+
+        while heap:
+            f, cost, state = heapq.heappop(heap)
+            if f >= best_total:
+                break
+            if cost > dist.get(state, math.inf):
+                continue
+            stop, current = state
+            if stop in goal_links:
+                total = cost + goal_links[stop] * to_minutes_walk
+                if total < best_total:
+                    best_total, best_path = total, state
+            for nxt, rid, km in ride[stop]:
+                step = km * to_minutes_bus + DWELL_MIN + (WAIT_MIN if rid != current else 0.0)
+                self._relax(heap, dist, parent, h, state, (nxt, rid), cost + step, ("ride", km))
+            for nxt, km in walk[stop]:
+                self._relax(heap, dist, parent, h, state, (nxt, -1), cost + km * to_minutes_walk, ("walk", km))
+
+        if best_path is None:
+            legs = [{"mode": "walk", "from": "source", "to": "destination", "km": direct, "points": [src, dst]}]
+            return _journey(legs, best_total, start, estimated=True)
+        return _journey(self._legs(g, parent, best_path, src, dst, goal_links), best_total, start)
+
+    @staticmethod
+    def _relax(heap, dist, parent, h, state, nxt, cost, edge):
+        if cost < dist.get(nxt, math.inf):
+            dist[nxt], parent[nxt] = cost, (state, edge)
+            heapq.heappush(heap, (cost + h(nxt[0]), cost, nxt))
+
+    def _legs(self, g, parent, last, src, dst, goal_links):
+        steps = []
+        state = last
+        while state is not None:
+            prev, edge = parent[state]
+            steps.append((prev, state, edge))
+            state = prev
+        steps.reverse()
+
+        uris = g["uris"]
+        point = lambda i: (self.stops[uris[i]][1], self.stops[uris[i]][2])
+        name = lambda i: self.stops[uris[i]][0]
+        legs = []
+        for prev, (stop, rid), (kind, km) in steps:
+            mode = "walk" if rid < 0 else "bus"
+            origin = "source" if prev is None else name(prev[0])
+            start_point = src if prev is None else point(prev[0])
+            if legs and legs[-1]["mode"] == mode and legs[-1].get("route_id") == rid:
+                legs[-1].update(to=name(stop), km=legs[-1]["km"] + km)
+                legs[-1]["points"].append(point(stop))
+            else:
+                leg = {"mode": mode, "from": origin, "to": name(stop), "km": km, "points": [start_point, point(stop)], "route_id": rid}
+                if mode == "bus":
+                    route = g["route_ids"][rid]
+                    leg.update(route=route, line=self.routes.get(route, {}).get("line") or route.rsplit("/", 1)[-1])
+                legs.append(leg)
+        legs.append({"mode": "walk", "from": name(last[0]), "to": "destination", "km": goal_links[last[0]],
+                     "points": [point(last[0]), dst]})
+        return legs
+
+
+def _parse_start(text):
+    try:
+        return datetime.fromisoformat(text) if text else datetime.now()
+    except ValueError:
+        return datetime.now()
+
+
+def _journey(legs, minutes, start, estimated=False):
+    arcs, points = [], []
+    for leg in legs:
+        desc = f"Bus {leg['line']} from {leg['from']} to {leg['to']}" if leg["mode"] == "bus" else f"Walk from {leg['from']} to {leg['to']}"
+        arcs.append({"source_node": leg["from"], "destination_node": leg["to"], "desc": desc,
+                     "distance": f"{leg['km']:.2f}", "transport": leg["mode"], **({"line": leg["line"], "route": leg["route"]} if leg["mode"] == "bus" else {})})
+        for p in leg["points"]:
+            if not points or points[-1] != p:
+                points.append(p)
+    km = sum(leg["km"] for leg in legs)
+    wkt = "LINESTRING(" + ", ".join(f"{lon:.6f} {lat:.6f}" for lat, lon in points) + ")"
+    return {
+        "journey": {"routes": [{
+            "distance": f"{km:.2f}",
+            "time": _minutes_to_hms(minutes),
+            "eta": (start + timedelta(seconds=round(minutes * 60))).strftime("%Y-%m-%dT%H:%M:%S"),
+            "arc": arcs,
+            "wkt": wkt,
+        }]},
+        "source": "local",
+        "estimated": estimated,
+        "computed_at": time.time(),
+    }
+
+
+def routing_mode():
+    mode = os.environ.get("SNAP_LOCAL_ROUTING", MODE_FALLBACK).lower()
+    return mode if mode in (MODE_OFF, MODE_FALLBACK, MODE_PREFER) else MODE_FALLBACK
+
+
+transit_graph = TransitGraph(os.environ.get("SNAP_TRANSIT_CACHE") or None)
@@ -0,0 +1,240 @@
+"""
+In-process metrics of the MCP server, rendered in the Prometheus text format.
+
+    from metrics import registry
+    calls = registry.counter("snap_tool_calls_total", "Tool calls", ("tool", "outcome"))
+    calls.inc(tool="get_bus_stops", outcome="ok")
+
+The dump is available as the MCP resource `metrics://snap` and, if SNAP_METRICS_PORT is set,
+on http://127.0.0.1:<port>/metrics for a Prometheus scraper.
+Updates happen on the event loop, reads may come from the HTTP thread: every metric has its own lock.
+"""
+import bisect
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self):
+        """ Sum over all the label values. """
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """ +1 while the block runs. """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (not cumulative) + the +Inf bucket, sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ========== SERVER METRICS ==========
+TOOL_CALLS = registry.counter("snap_tool_calls_total", "MCP tool calls by outcome (ok, empty, error).", ("tool", "outcome"))
+TOOL_LATENCY = registry.histogram("snap_tool_duration_seconds", "MCP tool call duration.", ("tool",))
+TOOL_IN_FLIGHT = registry.gauge("snap_tool_in_flight", "MCP tool calls currently running.", ("tool",))
+TOOL_PAYLOAD = registry.histogram("snap_tool_upstream_bytes", "Upstream bytes received by one tool call.", ("tool",), buckets=SIZE_BUCKETS)
+
+UPSTREAM_REQUESTS = registry.counter("snap_upstream_requests_total", "Snap4City requests by HTTP status, 'timeout' or 'error'.", ("endpoint", "status"))
+UPSTREAM_LATENCY = registry.histogram("snap_upstream_duration_seconds", "Snap4City request duration.", ("endpoint",))
+UPSTREAM_IN_FLIGHT = registry.gauge("snap_upstream_in_flight", "Snap4City requests currently waiting for an answer.", ("endpoint",))
+UPSTREAM_PAYLOAD = registry.histogram("snap_upstream_response_bytes", "Size of the Snap4City response bodies.", ("endpoint",), buckets=SIZE_BUCKETS)
+UPSTREAM_QUEUED = registry.gauge("snap_upstream_queued", "Snap4City requests waiting for a slot in the upstream scheduler.", ("priority",))
+UPSTREAM_QUEUE_TIME = registry.histogram("snap_upstream_queue_seconds", "Time spent waiting in the upstream scheduler.", ("priority",))
+
+# Bytes received from upstream by the tool call running in the current context (see instrument_tool).
+_tool_upstream_bytes = contextvars.ContextVar("tool_upstream_bytes", default=None)
+
+
+def endpoint_label(url):
+    """ Path below /api/v1 (e.g. '/tpl/bus-stops'), so that the label does not depend on the host. """
+    path = urlsplit(url).path
+    at = path.find("/api/v1")
+    return (path[at + len("/api/v1"):] or "/") if at >= 0 else path
+
+
+def observe_upstream(endpoint, status, seconds, size=None):
+    UPSTREAM_REQUESTS.inc(endpoint=endpoint, status=status)
+    UPSTREAM_LATENCY.observe(seconds, endpoint=endpoint)
+    if size is not None:
+        UPSTREAM_PAYLOAD.observe(size, endpoint=endpoint)
+        counter = _tool_upstream_bytes.get()
+        if counter is not None:
+            counter[0] += size
+
+
+@contextmanager
+def tool_call(tool):
+    """ Counts, times and tracks one tool call. The caller sets holder["outcome"] to "ok" or "empty". """
+    counter = [0]
+    token = _tool_upstream_bytes.set(counter)
+    holder = {"outcome": "error"}
+    started = time.perf_counter()
+    TOOL_IN_FLIGHT.inc(tool=tool)
+    try:
+        yield holder
+    finally:
+        TOOL_IN_FLIGHT.dec(tool=tool)
+        _tool_upstream_bytes.reset(token)
+        TOOL_CALLS.inc(tool=tool, outcome=holder["outcome"])
+        TOOL_LATENCY.observe(time.perf_counter() - started, tool=tool)
+        TOOL_PAYLOAD.observe(counter[0], tool=tool)
+
+
+# ========== HTTP EXPOSITION ==========
+def start_http_server(port, host="127.0.0.1"):
+    """ Serves registry.render() on /metrics from a daemon thread. Returns the HTTP server. """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            data = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
+
+
+def start_http_server_from_env():
+    port = os.environ.get("SNAP_METRICS_PORT")
+    return start_http_server(int(port)) if port else None
@@ -0,0 +1,70 @@
+"""
+Decoding of big upstream answers out of the event loop.
+
+A 5 MB get_services / iot_search / get_bus_routes(geometry=true) answer takes tens of milliseconds to decode and
+post-process, and all that time every other tool call of the server is stuck. Above SNAP_OFFLOAD_MIN_BYTES
+(default 256 KiB) the raw body goes to a process pool, which decodes it and applies the post-processing:
+
+    data = await decode(resp.content, post=compact)    # compact(loads(body)), in a worker if the body is big
+
+- The worker receives the bytes as they came from the socket: no decode + re-encode on the event loop.
+- `post` runs in the worker as well, so only its (usually much smaller) result is sent back:
+  a CompactResponse (feature_store.py) or an aggregated time series (timeseries.py). It must be a module-level
+  function (or a functools.partial of one), to be picklable.
+- Small bodies are decoded inline: below the threshold the process hop costs more than it saves.
+- SNAP_OFFLOAD_WORKERS (default 2) sets the pool size; 0 decodes everything inline.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from common import jsoncodec
+from metrics import registry
+
+OFFLOAD_MIN_BYTES = int(os.environ.get("SNAP_OFFLOAD_MIN_BYTES", 256 * 1024))
+OFFLOAD_WORKERS = int(os.environ.get("SNAP_OFFLOAD_WORKERS", 2))
+
+DECODES = registry.counter("snap_decode_total", "Upstream bodies decoded inline or in the process pool.", ("where",))
+
+_pool = None
+
+
+class PostProcessingError(Exception):
+    """
+    Wraps an exception raised by `post`, to tell it apart from a body that is not JSON. The original exception is
+    args[0]: it survives the trip back from the process pool, __cause__ does not.
+    """
+
+
+def _pool_executor():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=OFFLOAD_WORKERS)
+    return _pool
+
+
+def decode_body(raw, post=None):
+    """ jsoncodec.loads(raw), then post() on it (not on None). Runs in the worker when offloaded. """
+    data = jsoncodec.loads(raw)
+    if post is None or data is None:
+        return data
+    try:
+        return post(data)
+    except Exception as e:
+        raise PostProcessingError(e) from e
+
+
+async def decode(raw, post=None):
+    """ decode_body() inline for small bodies, in the process pool for big ones. Raises ValueError if not JSON. """
+    if OFFLOAD_WORKERS <= 0 or len(raw) < OFFLOAD_MIN_BYTES:
+        DECODES.inc(where="inline")
+        return decode_body(raw, post)
+    DECODES.inc(where="pool")
+    return await asyncio.get_running_loop().run_in_executor(_pool_executor(), decode_body, bytes(raw), post)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,148 @@
+"""
+Speculative prefetching: once get_location has resolved a point, the next question is almost always about what is
+near it (stops, lines, services). The prefetcher loads those answers into the response caches in the background,
+so the follow-up tool call is a cache hit.
+
+    prefetcher.schedule("43.7732;11.2567", [Job("tpl_geo_search", cache, key, fetch, then=follow_ups), ...])
+
+- Low priority: a job only starts when no tool call is running, and at most `concurrency` jobs run together.
+- Budget: a token bucket of `per_minute` upstream requests; jobs over budget are dropped, not queued.
+  Their upstream calls also run with the "prefetch" priority of the upstream scheduler (scheduler.py).
+- Cancellation: a new point cancels what is left of the previous one (the user moved on). If a tool call was
+  waiting for a cancelled job, the cache makes the call itself (response_cache.TTLCache).
+- Jobs whose answer is already cached cost nothing; `then` can add follow-up jobs from the answer
+  (e.g. the stops of the routes found by tpl_geo_search).
+"""
+import asyncio
+import logging
+import os
+import time
+
+from metrics import registry
+from scheduler import upstream_priority
+
+logger = logging.getLogger(__name__)
+
+PREFETCHES = registry.counter("snap_prefetch_total", "Prefetch jobs by result (fetched, cached, budget, cancelled, failed).", ("tool", "result"))
+
+
+class Job:
+    __slots__ = ("tool", "cache", "key", "fetch", "then")
+
+    def __init__(self, tool, cache, key, fetch, then=None):
+        self.tool = tool
+        self.cache = cache
+        self.key = key
+        self.fetch = fetch
+        self.then = then    # value -> [Job, ...]
+
+
+def located_point(position, data):
+    """
+    The point a get_location answer is about: the first result of a text search if it has a geometry,
+    else the position that was asked ('lat;lon'). None if there is neither.
+    """
+    features = data.get("features") if isinstance(data, dict) else None
+    for feature in features or []:
+        coords = (feature.get("geometry") or {}).get("coordinates") if isinstance(feature, dict) else None
+        if isinstance(coords, list) and len(coords) >= 2:
+            return f"{coords[1]};{coords[0]}"
+    return position or None
+
+
+class Prefetcher:
+    def __init__(self, busy, per_minute=30, concurrency=2, idle_wait=5.0, timeout=15.0):
+        """
+        busy: callable, True while interactive tool calls are running.
+        idle_wait: a job waits at most this long for the server to be idle, then it is dropped.
+        """
+        self.busy = busy
+        self.per_minute = per_minute
+        self.idle_wait = idle_wait
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tokens = float(per_minute)
+        self._refilled_at = time.monotonic()
+        self._batch = None
+
+    def schedule(self, origin, jobs):
+        """ Start prefetching `jobs` for `origin`, cancelling the previous batch. Returns at once. """
+        if self.per_minute <= 0 or not jobs:
+            return
+        self.cancel()
+        self._batch = asyncio.create_task(self._run(origin, list(jobs)), name=f"prefetch:{origin}")
+
+    def cancel(self):
+        if self._batch is not None and not self._batch.done():
+            self._batch.cancel()
+        self._batch = None
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(float(self.per_minute), self._tokens + (now - self._refilled_at) * self.per_minute / 60)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def _wait_idle(self):
+        deadline = time.monotonic() + self.idle_wait
+        while self.busy():
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def _run(self, origin, jobs):
+        started, done = time.perf_counter(), 0
+        running = set()
+        try:
+            while jobs or running:
+                while jobs:
+                    job = jobs.pop(0)
+                    value = job.cache.get(job.key)
+                    if value is not None:
+                        PREFETCHES.inc(tool=job.tool, result="cached")
+                        jobs.extend(job.then(value) if job.then else ())
+                        continue
+                    if not await self._wait_idle() or not self._take_token():
+                        PREFETCHES.inc(tool=job.tool, result="budget")
+                        continue
+                    running.add(asyncio.create_task(self._one(job)))
+                if running:
+                    finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        job, value = task.result()
+                        done += 1
+                        if value is not None and job.then:
+                            jobs.extend(job.then(value))
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+            for job in jobs:
+                PREFETCHES.inc(tool=job.tool, result="cancelled")
+            raise
+        logger.info("PREFETCH %s: %d jobs in %.2fs", origin, done, time.perf_counter() - started)
+
+    async def _one(self, job):
+        async with self._semaphore:
+            try:
+                with upstream_priority("prefetch"):
+                    value = await asyncio.wait_for(job.cache.fill(job.key, job.fetch), self.timeout)
+            except asyncio.CancelledError:
+                PREFETCHES.inc(tool=job.tool, result="cancelled")
+                raise
+            except Exception as e:
+                logger.info("PREFETCH %s failed: %s", job.tool, e)
+                value = None
+            PREFETCHES.inc(tool=job.tool, result="fetched" if value is not None else "failed")
+            return job, value
+
+
+def prefetcher_from_env(busy):
+    return Prefetcher(
+        busy,
+        per_minute=int(os.environ.get("SNAP_PREFETCH_PER_MINUTE", 30)),
+        concurrency=int(os.environ.get("SNAP_PREFETCH_CONCURRENCY", 2)),
+    )
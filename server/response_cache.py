@@ -0,0 +1,217 @@
+"""
+In-memory caches for upstream answers that do not change between calls.
+
+    from response_cache import TTLCache
+    cache = TTLCache("location", maxsize=4096, ttl=86400)
+    data = await cache.get_or_fetch(key, lambda: get_json(url, params))
+
+- LRU + time-to-live; None (upstream error) is never cached.
+- Concurrent misses on the same key share one upstream call.
+- Hits and misses are counted in `snap_cache_requests_total{cache, result}` (metrics://snap).
+
+The caches of GeoJSON tools hold feature_store.CompactResponse values, materialized when an answer is sent.
+The rest of the module canonicalizes get_location parameters, so that requests meaning the same thing share a key.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+
+from metrics import registry
+
+CACHE_REQUESTS = registry.counter("snap_cache_requests_total", "Response cache lookups by result (hit, miss, shared).", ("cache", "result"))
+CACHE_ENTRIES = registry.gauge("snap_cache_entries", "Entries currently held by a response cache.", ("cache",))
+
+METERS_PER_DEGREE = 111320.0
+
+
+class TTLCache:
+    def __init__(self, name, maxsize=1024, ttl=3600.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires at, value)
+        self._pending = {}              # key -> future of the upstream call in progress
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        if value is None or self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        CACHE_ENTRIES.set(len(self._entries), cache=self.name)
+
+    def clear(self):
+        self._entries.clear()
+        CACHE_ENTRIES.set(0, cache=self.name)
+
+    async def get_or_fetch(self, key, fetch):
+        """ Cached value for `key`, else `await fetch()` (shared by concurrent callers) and cache it. """
+        value = self.get(key)
+        if value is not None:
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return value
+        pending = self._pending.get(key)
+        if pending is not None:
+            CACHE_REQUESTS.inc(cache=self.name, result="shared")
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The call we were waiting for was a prefetch, and it was cancelled: make it ourselves.
+        else:
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        return await self._load(key, fetch)
+
+    async def fill(self, key, fetch):
+        """ get_or_fetch() for the prefetcher: same sharing, but not counted as a lookup. """
+        value = self.get(key)
+        if value is not None:
+            return value
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        return await self._load(key, fetch)
+
+    async def _load(self, key, fetch):
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await fetch()
+            self.put(key, value)
+            future.set_result(value)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here, so a future nobody else awaited does not log a warning
+            raise
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        return value
+
+def canonical_selection(selection, grid_m):
+    """ A 'lat;lon' selection snapped like get_location positions; areas, wkt and geo ids unchanged. """
+    text = str(selection).strip()
+    return snap_position(text, grid_m) if text.count(";") == 1 and ":" not in text else text
+
+
+def params_key(params):
+    """ Cache key of plain query parameters; uid and requestFrom only identify the caller. """
+    return tuple(sorted((k, str(v)) for k, v in params.items() if k not in ("uid", "requestFrom")))
+
+
+# ========== GET_LOCATION KEYS ==========
+def snap_position(position, cell_m):
+    """
+    'lat;lon' -> the centre of its grid cell ('%.6f;%.6f'), cells being `cell_m` meters wide.
+    Anything that is not a coordinate pair is returned stripped, unchanged.
+    """
+    try:
+        lat, lon = (float(x) for x in str(position).replace(",", ";").split(";"))
+    except ValueError:
+        return str(position).strip()
+    if cell_m <= 0:
+        return f"{lat:.6f};{lon:.6f}"
+    dlat = cell_m / METERS_PER_DEGREE
+    # Longitude cells are widened with the latitude of their row, so that they stay ~cell_m wide.
+    row = math.floor(lat / dlat)
+    dlon = cell_m / (METERS_PER_DEGREE * max(math.cos(math.radians((row + 0.5) * dlat)), 1e-6))
+    return f"{(row + 0.5) * dlat:.6f};{(math.floor(lon / dlon) + 0.5) * dlon:.6f}"
+
+
+def _number(value):
+    """ '5', '5.0', ' 5 ' -> '5'; '0.50' -> '0.5'. Non numbers are returned stripped. """
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        return str(value).strip()
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def _bool(value):
+    return "true" if str(value).strip().lower() in ("true", "1", "yes") else "false"
+
+
+def normalize_search(text):
+    """ Case and whitespace do not change a Snap4City text search. """
+    return " ".join(str(text).split()).lower()
+
+
+def canonical_location_params(params, grid_m, search_grid_m):
+    """
+    get_location parameters -> (parameters to send upstream, cache key).
+    `position` is snapped to a `grid_m` grid for reverse geocoding, to `search_grid_m` when it only centres a text
+    search; the snapped position is what gets sent, so a cached answer is exactly the answer for that request.
+    Defaults are made explicit (searchMode ANDOR, maxDists 5, maxResults 10, excludePOI/intersectGeom false).
+    uid and requestFrom are forwarded but not part of the key.
+    """
+    search = normalize_search(params["search"]) if params.get("search") else None
+    canonical = {"position": snap_position(params.get("position", ""), search_grid_m if search else grid_m)}
+    if search:
+        canonical.update(
+            search=search,
+            searchMode=str(params.get("searchMode") or "ANDOR").strip().upper(),
+            maxDists=_number(params.get("maxDists") or 5),
+            maxResults=_number(params.get("maxResults") or 10),
+            excludePOI=_bool(params.get("excludePOI") or False),
+        )
+    else:
+        canonical["intersectGeom"] = _bool(params.get("intersectGeom") or False)
+    key = tuple(sorted(canonical.items()))
+    for extra in ("uid", "requestFrom"):
+        if params.get(extra):
+            canonical[extra] = params[extra]
+    return canonical, key
+
+
+location_cache = TTLCache(
+    "location",
+    maxsize=int(os.environ.get("SNAP_LOCATION_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("SNAP_LOCATION_CACHE_TTL", 86400)),
+)
+LOCATION_GRID_M = float(os.environ.get("SNAP_LOCATION_GRID_M", 10))
+LOCATION_SEARCH_GRID_M = float(os.environ.get("SNAP_LOCATION_SEARCH_GRID_M", 100))
+
+# GeoJSON answers, stored compact (feature_store.py). IoT values change quickly, stops almost never.
+services_cache = TTLCache(
+    "services",
+    maxsize=int(os.environ.get("SNAP_SERVICES_CACHE_SIZE", 512)),
+    ttl=float(os.environ.get("SNAP_SERVICES_CACHE_TTL", 3600)),
+)
+# get_services calls about one service (serviceUri), its real time data or a time window: live values.
+services_live_cache = TTLCache(
+    "services_live",
+    maxsize=int(os.environ.get("SNAP_SERVICES_LIVE_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("SNAP_SERVICES_LIVE_CACHE_TTL", 30)),
+)
+iot_cache = TTLCache(
+    "iot_search",
+    maxsize=int(os.environ.get("SNAP_IOT_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("SNAP_IOT_CACHE_TTL", 60)),
+)
+tpl_cache = TTLCache(
+    "tpl_geo_search",
+    maxsize=int(os.environ.get("SNAP_TPL_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("SNAP_TPL_CACHE_TTL", 86400)),
+)
+bus_stops_cache = TTLCache(
+    "bus_stops",
+    maxsize=int(os.environ.get("SNAP_BUS_STOPS_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("SNAP_BUS_STOPS_CACHE_TTL", 86400)),
+)
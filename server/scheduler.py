@@ -0,0 +1,203 @@
+"""
+Client-side rate control for the Snap4City calls: every get_json() waits here for its turn.
+
+- Global cap: at most SNAP_UPSTREAM_CONCURRENCY requests in flight (default 8).
+- Per endpoint: a token bucket of SNAP_UPSTREAM_RATE requests/s (default 10) with bursts up to
+  SNAP_UPSTREAM_BURST (default 20). Single endpoints can be set apart: SNAP_UPSTREAM_RATES="/events=1,/location=5".
+- Priority classes, in order: interactive (tool calls), prefetch (prefetch.py), refresh (events_store.py).
+  A free slot always goes to the best waiting class; background classes never take the last
+  SNAP_UPSTREAM_RESERVED slots (default 1), so a tool call never waits behind a full set of prefetches.
+
+The class comes from the context, so the background code only has to say what it is:
+
+    with upstream_priority("prefetch"):
+        await cache.fill(key, fetch)    # every get_json() inside runs as "prefetch"
+
+Queue times end up in snap_upstream_queue_seconds{priority}, waiting requests in snap_upstream_queued{priority}.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import UPSTREAM_QUEUED, UPSTREAM_QUEUE_TIME
+
+PRIORITIES = ("interactive", "prefetch", "refresh")
+
+_priority = contextvars.ContextVar("upstream_priority", default="interactive")
+
+
+@contextmanager
+def upstream_priority(name):
+    """ Upstream calls made inside the block (and in the tasks it creates) run with priority `name`. """
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown upstream priority {name!r}, expected one of {PRIORITIES}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def parse_rates(text):
+    """ '/events=1,/location=5' -> {'/events': 1.0, '/location': 5.0} """
+    rates = {}
+    for item in (text or "").split(","):
+        if item.strip():
+            endpoint, _, rate = item.partition("=")
+            rates[endpoint.strip()] = float(rate)
+    return rates
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "refilled_at")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+
+    def take(self):
+        """ True if a token was available (and it is now spent); rate <= 0 means no limit. """
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait(self):
+        """ Seconds until the next token. """
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else 0.0
+
+
+class _Waiter:
+    __slots__ = ("endpoint", "future")
+
+    def __init__(self, endpoint, future):
+        self.endpoint = endpoint
+        self.future = future
+
+
+class UpstreamScheduler:
+    def __init__(self, concurrency=8, rate=10.0, burst=20, rates=None, reserved=1):
+        """
+        rate/burst: token bucket of every endpoint, unless `rates` ({endpoint: requests/s}) says otherwise.
+        reserved: slots that only interactive requests can use.
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.rates = rates or {}
+        self.reserved = min(reserved, concurrency - 1)
+        self.running = 0
+        self._buckets = {}
+        self._queues = {p: deque() for p in PRIORITIES}
+        self._timer = None
+        self._timer_at = None
+
+    def _bucket(self, endpoint):
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            rate = self.rates.get(endpoint, self.rate)
+            bucket = self._buckets[endpoint] = _Bucket(rate, max(1, self.burst if endpoint not in self.rates else rate))
+        return bucket
+
+    def _limit(self, priority):
+        return self.concurrency if priority == PRIORITIES[0] else self.concurrency - self.reserved
+
+    @asynccontextmanager
+    async def slot(self, endpoint, priority=None):
+        """ Holds one upstream slot for `endpoint` while the block runs. Yields the seconds spent waiting. """
+        waited = await self.acquire(endpoint, priority)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    # ========== ACQUIRE / RELEASE ==========
+    async def acquire(self, endpoint, priority=None):
+        priority = priority or current_priority()
+        started = time.monotonic()
+        ahead = any(self._queues[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+        if not ahead and self.running < self._limit(priority) and self._bucket(endpoint).take():
+            self.running += 1
+            UPSTREAM_QUEUE_TIME.observe(0.0, priority=priority)
+            return 0.0
+
+        waiter = _Waiter(endpoint, asyncio.get_running_loop().create_future())
+        self._queues[priority].append(waiter)
+        UPSTREAM_QUEUED.inc(priority=priority)
+        try:
+            self._dispatch()
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()      # the slot was granted just as the caller went away
+            else:
+                waiter.future.cancel()
+            raise
+        finally:
+            if waiter in self._queues[priority]:
+                self._queues[priority].remove(waiter)
+            UPSTREAM_QUEUED.dec(priority=priority)
+        waited = time.monotonic() - started
+        UPSTREAM_QUEUE_TIME.observe(waited, priority=priority)
+        return waited
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """ Hands free slots to the waiters, best class first; FIFO per endpoint within a class. """
+        next_token = None
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            for waiter in list(queue):
+                if self.running >= self._limit(priority):
+                    break
+                if waiter.future.done():
+                    queue.remove(waiter)
+                    continue
+                bucket = self._bucket(waiter.endpoint)
+                if not bucket.take():
+                    next_token = bucket.wait() if next_token is None else min(next_token, bucket.wait())
+                    continue
+                queue.remove(waiter)
+                self.running += 1
+                waiter.future.set_result(None)
+        if next_token is not None:
+            loop = asyncio.get_running_loop()
+            wake_at = loop.time() + next_token
+            if self._timer is None or wake_at < self._timer_at:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer, self._timer_at = loop.call_later(next_token, self._on_timer), wake_at
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+def scheduler_from_env():
+    return UpstreamScheduler(
+        concurrency=int(os.environ.get("SNAP_UPSTREAM_CONCURRENCY", 8)),
+        rate=float(os.environ.get("SNAP_UPSTREAM_RATE", 10)),
+        burst=int(os.environ.get("SNAP_UPSTREAM_BURST", 20)),
+        rates=parse_rates(os.environ.get("SNAP_UPSTREAM_RATES")),
+        reserved=int(os.environ.get("SNAP_UPSTREAM_RESERVED", 1)),
+    )
+
+
+scheduler = scheduler_from_env()
@@ -1,9 +1,10 @@
 import asyncio
-import httpx
 from mcp.server.fastmcp import FastMCP
 from typing import Optional
 import sys
 import os
+import contextlib
+from functools import partial
 from pathlib import Path
 
 # Path for llama4. TBR
@@ -11,19 +12,83 @@ current_dir = Path(__file__).parent.absolute()
 home_dir = current_dir.parent
 sys.path.insert(0, str(home_dir))
 from llama4.lab_llm import LabLLM
+from common.log_setup import configure_logging
+from common.tracing import tracer
+from common.cassette import cassette
+from upstream import get_json
+from instrumentation import instrument_tool
+from metrics import TOOL_IN_FLIGHT, registry, start_http_server_from_env
+from bus_subscriptions import BusPositionHub, enable_subscriptions, parse_uri
+from local_routing import MODE_OFF, MODE_PREFER, routing_mode, transit_graph
+from timeseries import aggregate as aggregate_series, parse_width
+from response_cache import (LOCATION_GRID_M, LOCATION_SEARCH_GRID_M, bus_stops_cache, canonical_location_params,
+                            canonical_selection, iot_cache, location_cache, params_key, services_cache,
+                            services_live_cache, tpl_cache)
+from feature_store import compact, materialize
+from events_store import EventsStore
+from prefetch import Job, located_point, prefetcher_from_env
+import offload
+
+# Logging must be configured before FastMCP, otherwise its default handler is installed.
+configure_logging("server.jsonl")
+tracer.service_name = "server"
 
 # Initialize FastMCP server
 mcp = FastMCP("snap4")
 
 # Constants
-TPL_BASE_URL = "https://www.snap4city.org/superservicemap/api/v1"
+TPL_BASE_URL = os.environ.get("SNAP_TPL_BASE_URL", "https://www.snap4city.org/superservicemap/api/v1")
 USER_AGENT = "snap/1.0"
 
-client = LabLLM()
+# LabLLM is only needed by get_bus_lines: it is created and authenticated on first use, not at import time.
+# When replaying cassettes there is no login at all: the answers come from the recordings.
+_llm_client = None
+
+def get_llm_client() -> LabLLM:
+    global _llm_client
+    if _llm_client is None:
+        # stdout is the MCP stdio transport: TokenManager prints must not end up there.
+        with contextlib.redirect_stdout(sys.stderr):
+            client = LabLLM()
+            if not cassette.replaying:
+                client.ensure_authenticated()
+        _llm_client = client
+    return _llm_client
+
+# ------------------------ METRICS ------------------------
+
+@mcp.resource("metrics://snap", mime_type="text/plain")
+async def resource_metrics():
+    """
+    Server metrics in Prometheus text format: tool calls, latencies, in-flight calls, upstream status codes and payload sizes.
+    """
+    return registry.render()
 
 # ------------------------ SERVICES ------------------------
+SERVICES_LIVE_PARAMS = ("serviceUri", "realtime", "fromTime", "toTime")
+
+
+async def fetch_compact(url: str, params: dict):
+    """ get_json() for the cached GeoJSON tools: the cache keeps the columnar form (feature_store.py). """
+    return await get_json(url, params, post=compact)
+
+
+def services_request(params: dict):
+    """
+    (cache, key, fetch) of a get_services call; shared by the tool and the prefetcher.
+    Spatial and category searches are kept for an hour; answers with live values only for a few seconds.
+    The point is snapped in the key only: on a miss Snap4City gets the selection as asked.
+    """
+    key_params = dict(params)
+    if params.get("selection"):
+        key_params["selection"] = canonical_selection(params["selection"], LOCATION_GRID_M)
+    live = any(params.get(k) for k in SERVICES_LIVE_PARAMS)
+    cache = services_live_cache if live else services_cache
+    return cache, params_key(key_params), lambda: fetch_compact(TPL_BASE_URL, params)
+
 
 @mcp.tool()
+@instrument_tool
 async def get_services(
         selection: Optional[str] = None,
         queryId: Optional[str] = None,
@@ -206,7 +271,6 @@ async def get_services(
     :return:
 
     """
-    url = f"{TPL_BASE_URL}"
     params = {}
     for key, value in {
             "selection": selection,
@@ -239,16 +303,12 @@ async def get_services(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    cache, cache_key, fetch = services_request(params)
+    return materialize(await cache.get_or_fetch(cache_key, fetch))
 # ------------------------ IOT SEARCH --------------------------------
 
 @mcp.tool()
+@instrument_tool
 async def iot_search(
         selection: Optional[str] = None,
         maxDists: Optional[str] = None,
@@ -324,15 +384,10 @@ async def iot_search(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    return materialize(await iot_cache.get_or_fetch(params_key(params), lambda: fetch_compact(url, params)))
 
 @mcp.tool()
+@instrument_tool
 async def iot_search_time_range(
         fromTime: Optional[str] = None,
         toTime: Optional[str] = None,
@@ -348,6 +403,8 @@ async def iot_search_time_range(
         aggregate: Optional[str] = None,
         values: Optional[str] = None,
         sortOnValue: Optional[str] = None,
+        bucketWidth: Optional[str] = None,
+        maxPoints: Optional[str] = None,
 ):
     """
     IoT device/value search over a time range
@@ -374,6 +431,12 @@ async def iot_search_time_range(
     - aggregate: str,
     - values: str,
     - sortOnValue: str,
+    - bucketWidth: str, Optional. If set, the values are not returned one by one: for every device and value you get
+                    min/max/mean/count/last per time bucket of this width (s, m, h, d, w). Use it for long time ranges.
+                    Example: 1h
+    - maxPoints: int, Optional. Maximum number of points per series (raw values, or buckets with bucketWidth),
+                    keeping the shape of the curve.
+                    Example: 50
 
     :return:
     """
@@ -398,18 +461,20 @@ async def iot_search_time_range(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    if not bucketWidth and not maxPoints:
+        return await get_json(url, params)
+    # Invalid values raise ValueError, which FastMCP returns to the model as a tool error.
+    width = parse_width(bucketWidth) if bucketWidth else None
+    max_points = int(float(maxPoints)) if maxPoints else None
+    if max_points is not None and max_points < 1:
+        raise ValueError(f"maxPoints must be at least 1, got {maxPoints}")
+    return await get_json(url, params, post=partial(aggregate_series, width=width, max_points=max_points))
 
 # ------------------------ EVENTS ------------------------
 
 # Does it work in snap? Is it used?
 @mcp.tool()
+@instrument_tool
 async def get_events(
         range: Optional[str] = None,
         selection: Optional[str] = None,
@@ -440,18 +505,23 @@ async def get_events(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    # Filtered locally on the city-wide set of the range (events_store.py); wkt/geo selections go upstream.
+    local = await events_store.query(range, selection, maxDists, maxResults)
+    if local is not None:
+        return local
+    return await get_json(url, params)
+
+
+async def fetch_events(range: str):
+    return await get_json(f"{TPL_BASE_URL}/events", {"range": range, "maxResults": 0})
+
+events_store = EventsStore(fetch_events)
 
 
 # ------------------------ LOCATIONS ------------------------
 
 @mcp.tool()
+@instrument_tool
 async def get_location(
         position: str,
         search: Optional[str] = None,
@@ -518,13 +588,31 @@ async def get_location(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    # Nearby GPS points and equivalent spellings share one cache entry (response_cache.py).
+    params, cache_key = canonical_location_params(params, LOCATION_GRID_M, LOCATION_SEARCH_GRID_M)
+    data = await location_cache.get_or_fetch(cache_key, lambda: get_json(url, params))
+    point = located_point(position, data) if data is not None else None
+    if point:
+        prefetcher.schedule(point, location_followups(point))
+    return data
+
+
+# ------------------------ PREFETCH ------------------------
+PREFETCH_ROUTES = 4     # stops of at most this many routes found near a point
+
+prefetcher = prefetcher_from_env(busy=lambda: TOOL_IN_FLIGHT.total() > 0)
+
+
+def location_followups(point: str):
+    """ What the model usually asks after a location: lines and stops nearby, then services nearby. """
+    def stops_of_routes(data):
+        routes = [r.get("route") for r in (data.get("PublicTransportLine") or []) if isinstance(r, dict)] if isinstance(data, dict) else []
+        return [Job("get_bus_stops", *bus_stops_request({"route": r})) for r in routes[:PREFETCH_ROUTES] if r]
+
+    return [
+        Job("tpl_geo_search", *tpl_request({"selection": point}), then=stops_of_routes),
+        Job("get_services", *services_request({"selection": point})),
+    ]
 
 
 # ------------------------ PUBLIC TRANSPORT ------------------------
@@ -536,19 +624,13 @@ async def resource_get_agencies():
     If the user asks for a specific city or area,
     look for a correspondence in the output of this function.
     """
+    url = f"{TPL_BASE_URL}/tpl/agencies"
 
-        url = f"{TPL_BASE_URL}/tpl/agencies"
-
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(url, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    return await get_json(url)
 
 @mcp.tool()
 # SPERIMENTALE
+@instrument_tool
 async def get_bus_lines(area: str, agency_name: str) -> dict:
     """
     This function returns the BUS LINES that one specific agency operates. The arguments can be either an area (city or region) or the agency name.
@@ -561,14 +643,14 @@ async def get_bus_lines(area: str, agency_name: str) -> dict:
         - agency_name, default "AT Autolinee Toscane"
     """
     async def get_agency_url(area: str, agency_name: str, temperature: int = 0, max_tokens=512):
-        agencies = await get_agencies()
+        agencies = await resource_get_agencies()
 
         get_agency_url_chat_history = [{"role": "system",
                                         "content": "Given this input, give me ONLY the agency link. Answer with 'http' and the correct link. Do not use any other words. The input has either the area or the name of the specific agency. DO NOT WRITE ANYTHING ELSE IN YOUR RESPONSE: ONLY THE AGENCY URL ONCE"
                                         },
                                        {"role": "user", "content": f"Find the link of the agency of tpl that better serves this area: {area}, or look for this specific agency: {agency_name} Use this list: {agencies}"}]
 
-        response = client.chat_completion(
+        response = get_llm_client().chat_completion(
             messages=get_agency_url_chat_history,
             function_call="none"
         )
@@ -579,15 +661,10 @@ async def get_bus_lines(area: str, agency_name: str) -> dict:
     print(agency)
     url = f"{TPL_BASE_URL}/tpl/bus-lines/"
     params = {"agency": agency}
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    return await get_json(url, params)
 
 @mcp.tool()
+@instrument_tool
 async def get_bus_routes(
         agency: Optional[str] = None,
         line: Optional[str] = None,
@@ -623,16 +700,14 @@ async def get_bus_routes(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    data = await get_json(url, params)
+    if data:
+        transit_graph.add_routes(data)   # line names for the local routing fallback
+    return data
 
 
 @mcp.tool()
+@instrument_tool
 async def get_bus_stops(
         route: Optional[str] = None,
         geometry: Optional[str] = None,
@@ -651,7 +726,6 @@ async def get_bus_stops(
         - requestFrom: string, The parameter identifies the request's originator for monitoring purposes.
     :return:
     """
-    url = f"{TPL_BASE_URL}/tpl/bus-stops/"
     params = {}
     for key, value in {
         "route": route,
@@ -662,15 +736,22 @@ async def get_bus_stops(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    cache, cache_key, fetch = bus_stops_request(params)
+    return materialize(await cache.get_or_fetch(cache_key, fetch))
+
+
+def bus_stops_request(params: dict):
+    """ (cache, key, fetch) of a get_bus_stops call; shared by the tool and the prefetcher. """
+    async def fetch():
+        data = await get_json(f"{TPL_BASE_URL}/tpl/bus-stops/", params)
+        if data and params.get("route"):
+            transit_graph.add_route_stops(params["route"], data)   # stop sequence for the local routing fallback
+        return compact(data)
+
+    return bus_stops_cache, params_key(params), fetch
 
 @mcp.tool()
+@instrument_tool
 async def tpl_geo_search(
         selection: str,
         maxDists: Optional[str] = None,
@@ -704,7 +785,6 @@ async def tpl_geo_search(
         - selection
     :return:
     """
-    url = f"{TPL_BASE_URL}/tpl"
     params = {}
     for key, value in {
         "selection": selection,
@@ -718,15 +798,20 @@ async def tpl_geo_search(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    cache, cache_key, fetch = tpl_request(params)
+    return await cache.get_or_fetch(cache_key, fetch)
+
+
+def tpl_request(params: dict):
+    """
+    (cache, key, fetch) of a tpl_geo_search call; shared by the tool and the prefetcher.
+    The point is snapped in the key only: on a miss Snap4City gets the selection as asked.
+    """
+    key_params = dict(params, selection=canonical_selection(params.get("selection", ""), LOCATION_GRID_M))
+    return tpl_cache, params_key(key_params), lambda: get_json(f"{TPL_BASE_URL}/tpl", params)
 
 @mcp.tool()
+@instrument_tool
 async def get_bus_position(
         agency: Optional[str] = None,
         line: Optional[str] = None,
@@ -752,6 +837,12 @@ async def get_bus_position(
         - either 'agency' or 'line'.
     :return:
     """
+    # A snapshot polled for the busposition:// subscribers in the last interval is as current as a new call.
+    if agency and not (uid or format or requestFrom):
+        cached = bus_positions.fresh(agency, line or None)
+        if cached is not None:
+            return cached
+
     url = f"{TPL_BASE_URL}/tpl/bus-position"
     params = {}
     for key, value in {
@@ -764,13 +855,26 @@ async def get_bus_position(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    return await get_json(url, params)
+
+# ------------------------ LIVE BUS POSITIONS ------------------------
+
+async def fetch_bus_position(agency: str, line: Optional[str]):
+    params = {"agency": agency}
+    if line:
+        params["line"] = line
+    return await get_json(f"{TPL_BASE_URL}/tpl/bus-position", params)
+
+bus_positions = BusPositionHub(fetch_bus_position)
+enable_subscriptions(mcp, bus_positions)
+
+@mcp.resource("busposition://{agency}/{line}", mime_type="application/json")
+async def resource_bus_position(agency: str, line: str):
+    """
+    Live position of the buses of an agency (name or URI, URL-encoded) on a line ("all" for every line).
+    Subscribe to it to be notified when vehicles move: the notification `_meta` contains only the changed vehicles.
+    """
+    return await bus_positions.snapshot(*parse_uri(f"busposition://{agency}/{line}"))
 
 @mcp.prompt("plan_route")
 async def plan_route(start: str, end: str, route_type: str = None, date: str = None):
@@ -817,6 +921,7 @@ async def greetings(name: str = None, surname: str = None):
 
 # ------------------------ ROUTING ------------------------
 @mcp.tool()
+@instrument_tool
 async def route_shortest_path(
         source: str,
         destination: str,
@@ -866,16 +971,29 @@ async def route_shortest_path(
         if value:
             params[key] = value
 
-    async with httpx.AsyncClient() as async_client:
-        try:
-            resp = await async_client.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception:
-            return None
+    # Local A* over the cached stops and routes (local_routing.py): used when /shortestpath does not answer,
+    # or before asking it with SNAP_LOCAL_ROUTING=prefer. Only for lat;lon points and json output.
+    mode = routing_mode()
+    local_ok = mode != MODE_OFF and (format or "json") == "json"
+    if local_ok and mode == MODE_PREFER and routeType == "public_transport":
+        local = transit_graph.route(source, destination, routeType, startDateTime)
+        if local is not None and not local["estimated"]:
+            return local
+    data = await get_json(url, params)
+    if data is None and local_ok:
+        return transit_graph.route(source, destination, routeType, startDateTime)
+    return data
 
 
 if __name__ == "__main__":
     # Initialize and run the server
     print("\n Server is now running...")
-    mcp.run(transport='stdio')
+    start_http_server_from_env()
+    # stdio for the chat host; SNAP_MCP_TRANSPORT=streamable-http (or sse) serves many clients from one process.
+    transport = os.environ.get("SNAP_MCP_TRANSPORT", "stdio")
+    if transport != "stdio":
+        mcp.settings.host = os.environ.get("SNAP_MCP_HOST", "127.0.0.1")
+        mcp.settings.port = int(os.environ.get("SNAP_MCP_PORT", 8000))
+    mcp.run(transport=transport)
+    transit_graph.flush()
+    offload.shutdown()
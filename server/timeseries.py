@@ -0,0 +1,167 @@
+"""
+Aggregation of iot_search_time_range answers, so the model gets a short series per device instead of one row per value.
+
+The upstream FeatureCollection (one feature per device per timestamp) is turned into columns once:
+device index, timestamp and one float column per numeric value (NaN where a row lacks it).
+Then, per value, NumPy sorts by (device, bucket, time) and computes min/max/mean/count/last of every bucket
+with ufunc.reduceat, without a Python loop over the rows.
+Optionally every series is downsampled with LTTB (Largest-Triangle-Three-Buckets), which keeps the visual shape.
+"""
+import re
+from datetime import datetime, timezone
+
+import numpy as np
+
+TIME_KEY = "dateObserved"
+_WIDTH_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_width(text):
+    """ '15m', '1h', '2d', '90' (seconds) -> seconds. Raises ValueError for anything else. """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*", str(text).lower())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid bucket width: {text!r} (expected e.g. 15m, 1h, 1d)")
+    return float(match.group(1)) * _WIDTH_UNITS[match.group(2) or "s"]
+
+
+def to_columns(data):
+    """
+    FeatureCollection -> (devices, device index array, epoch seconds array, {value name: float array}, tz).
+    Rows without a parsable dateObserved are dropped; non numeric values (e.g. status strings) are ignored.
+    """
+    devices, device_index = [], {}
+    dev, ts, columns = [], [], {}
+    tz = None
+    features = data.get("features", []) if isinstance(data, dict) else []
+    for f in features:
+        props = f.get("properties") or {}
+        values = props.get("values") or {}
+        try:
+            when = datetime.fromisoformat(str(values.get(TIME_KEY)))
+        except ValueError:
+            continue
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        tz = tz or when.tzinfo
+        uri = props.get("serviceUri")
+        if uri not in device_index:
+            device_index[uri] = len(devices)
+            devices.append({
+                "serviceUri": uri,
+                "deviceName": props.get("deviceName"),
+                "serviceType": props.get("serviceType"),
+                "coordinates": (f.get("geometry") or {}).get("coordinates"),
+            })
+        row = len(ts)
+        dev.append(device_index[uri])
+        ts.append(when.timestamp())
+        for name, value in values.items():
+            if name == TIME_KEY or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = []
+            column.extend([None] * (row - len(column)))
+            column.append(value)
+    n = len(ts)
+    arrays = {name: np.array(col + [None] * (n - len(col)), dtype=float) for name, col in columns.items()}
+    return devices, np.array(dev, dtype=np.int64), np.array(ts, dtype=float), arrays, tz or timezone.utc
+
+
+def bucketize(dev, ts, values, width, offset=0.0):
+    """
+    Per (device, bucket) statistics of `values` (NaN = missing), buckets aligned on local time (`offset` seconds).
+    Returns a dict of arrays: device, start (epoch), min, max, mean, count, last.
+    """
+    valid = ~np.isnan(values)
+    dev, ts, values = dev[valid], ts[valid], values[valid]
+    if not len(values):
+        return None
+    bucket = np.floor((ts + offset) / width).astype(np.int64)
+    order = np.lexsort((ts, bucket, dev))
+    dev, bucket, values = dev[order], bucket[order], values[order]
+    new_group = np.empty(len(values), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (dev[1:] != dev[:-1]) | (bucket[1:] != bucket[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(values))
+    count = ends - starts
+    return {
+        "device": dev[starts],
+        "start": bucket[starts] * width - offset,
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+        "mean": np.add.reduceat(values, starts) / count,
+        "count": count,
+        "last": values[ends - 1],
+    }
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the `threshold` points of (x, y) kept by Largest-Triangle-Three-Buckets.
+    Below 3 points there are no buckets: the last point is kept, or the first and the last.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1] if threshold == 2 else [n - 1] if threshold == 1 else [], dtype=np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:max(nhi, nlo + 1)].mean(), y[nlo:max(nhi, nlo + 1)].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def _iso(epoch, tz):
+    return datetime.fromtimestamp(float(epoch), tz).isoformat(timespec="seconds")
+
+
+def _round(array, digits=3):
+    return [round(float(v), digits) for v in array]
+
+
+def aggregate(data, width=None, max_points=None):
+    """
+    Compact form of an iot_search_time_range answer:
+    {"type": "TimeSeries", "bucket": seconds or None, "rows": n,
+     "devices": [{"serviceUri", "deviceName", "serviceType", "coordinates",
+                  "series": {value: {"t": [...], "min": [...], "max": [...], "mean": [...], "count": [...], "last": [...]}}}]}
+    Without `width` the series are the raw points ({"t", "value"}); `max_points` applies LTTB to every series.
+    Anything that is not a FeatureCollection is returned unchanged.
+    """
+    if not isinstance(data, dict) or "features" not in data:
+        return data
+    devices, dev, ts, columns, tz = to_columns(data)
+    offset = tz.utcoffset(None).total_seconds() if tz.utcoffset(None) is not None else 0.0
+    result = [dict(d, series={}) for d in devices]
+    for name, values in columns.items():
+        if width:
+            stats = bucketize(dev, ts, values, width, offset)
+            if stats is None:
+                continue
+            x, y, fields = stats["start"], stats["mean"], ("min", "max", "mean", "count", "last")
+        else:
+            valid = ~np.isnan(values)
+            order = np.lexsort((ts[valid], dev[valid]))
+            stats = {"device": dev[valid][order], "t": ts[valid][order], "value": values[valid][order]}
+            x, y, fields = stats["t"], stats["value"], ("value",)
+            if not len(x):
+                continue
+        # Devices are contiguous after the sort: split once instead of masking per device.
+        bounds = np.flatnonzero(np.diff(stats["device"])) + 1
+        for part in np.split(np.arange(len(x)), bounds):
+            keep = part[lttb(x[part], y[part], max_points)] if max_points else part
+            series = {"t": [_iso(v, tz) for v in x[keep]]}
+            for field in fields:
+                series[field] = stats[field][keep].tolist() if field == "count" else _round(stats[field][keep])
+            result[int(stats["device"][part[0]])]["series"][name] = series
+    return {"type": "TimeSeries", "bucket": width, "rows": int(len(ts)), "devices": result}
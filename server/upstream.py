@@ -0,0 +1,84 @@
+"""
+Upstream HTTP calls to Snap4City. Every tool goes through get_json(), so instrumentation lives in one place.
+"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from common.cassette import cassette, CassetteMiss
+from common.tracing import tracer, SPAN_KIND_CLIENT
+from metrics import UPSTREAM_IN_FLIGHT, endpoint_label, observe_upstream
+from offload import PostProcessingError, decode
+from scheduler import current_priority, scheduler
+
+
+async def get_json(url: str, params: dict = None, timeout: float = 10, priority: str = None, post=None):
+    """
+    GET `url` and return the decoded JSON body, or None on any error (timeout, HTTP error, invalid JSON).
+    With SNAP_CASSETTE_MODE=record/replay the answer is also saved to / served from the cassettes (common/cassette.py).
+    The request first waits for its turn in the upstream scheduler (scheduler.py); `priority` defaults to the
+    class of the context (interactive, unless set with upstream_priority()). `timeout` does not count the wait.
+    `post` (a module-level function) is applied to the decoded body; for big bodies both happen in the process pool
+    (offload.py). Its exceptions are raised to the caller.
+    """
+    endpoint = endpoint_label(url)
+    priority = priority or current_priority()
+    with tracer.span(f"GET {urlsplit(url).path}", kind=SPAN_KIND_CLIENT, **{"http.url": url, "upstream.priority": priority}) as span:
+        async with scheduler.slot(endpoint, priority) as waited:
+            span.set_attribute("upstream.queue_ms", round(waited * 1000, 1))
+            with UPSTREAM_IN_FLIGHT.track(endpoint=endpoint):
+                return await _get(url, params, timeout, span, endpoint, post)
+
+
+async def _get(url, params, timeout, span, endpoint, post):
+    """ The request itself, once the scheduler has given it a slot. """
+    if cassette.replaying:
+        data = await _replay(url, params, span, endpoint)
+        return post(data) if post and data is not None else data
+
+    started = time.perf_counter()
+    status, data, error, size = None, None, None, None
+    outcome = None          # metrics label: HTTP status, or "timeout" / "error" when there is no answer
+    async with httpx.AsyncClient() as async_client:
+        try:
+            resp = await async_client.get(url, params=params, timeout=timeout)
+            status = resp.status_code
+            size = len(resp.content)
+            span.set_attribute("http.status_code", status)
+            resp.raise_for_status()
+            # The cassette keeps the plain decoded body: post() is applied after recording.
+            data = await decode(resp.content, None if cassette.recording else post)
+        except PostProcessingError as e:
+            raise e.args[0]     # __cause__ is a _RemoteTraceback when post() ran in the process pool
+        except Exception as e:
+            span.set_error(e)
+            error = f"{type(e).__name__}: {e}"
+            if status is None:
+                outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+    observe_upstream(endpoint, outcome or status, time.perf_counter() - started, size)
+    if cassette.recording:
+        cassette.record(cassette.request("GET", url, params), status=status, response=data, error=error,
+                        elapsed=time.perf_counter() - started)
+        if post and data is not None:
+            return post(data)
+    return data
+
+
+async def _replay(url, params, span, endpoint):
+    span.set_attribute("cassette", "replay")
+    try:
+        episode = cassette.play(cassette.request("GET", url, params))
+    except CassetteMiss as e:
+        span.set_error(e)
+        observe_upstream(endpoint, "error", 0.0)
+        return None
+    delay = cassette.delay(episode)
+    await asyncio.sleep(delay)
+    observe_upstream(endpoint, episode["status"] or "error", delay)
+    if episode["status"] is not None:
+        span.set_attribute("http.status_code", episode["status"])
+    if episode["error"]:
+        span.set_error(episode["error"])
+    return episode["response"]
@@ -0,0 +1,11 @@
+"""
+The chat and server modules import each other by plain name (they run from their own directory),
+and use common/ and llama4/ from the repository root: the tests see the same sys.path.
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent.absolute()
+for path in (ROOT, ROOT / "server", ROOT / "chat"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from arg_validator import ArgumentChecker, InvalidArgument, error_hint, normalize_coordinates, normalize_distance
+
+OPTIONAL_STRING = {"anyOf": [{"type": "string"}, {"type": "null"}]}
+
+TOOLS = [
+    SimpleNamespace(
+        name="tpl_geo_search",
+        description="Public transport lines near a point.\n    args:\n        - selection: str, A point 'lat;lng'.\n",
+        inputSchema={
+            "required": ["selection"],
+            "properties": {"selection": {"type": "string"}, "maxDists": OPTIONAL_STRING, "maxResults": OPTIONAL_STRING,
+                           "geometry": {"type": "boolean"}},
+        },
+    ),
+    SimpleNamespace(
+        name="route_shortest_path",
+        description="",
+        inputSchema={
+            "required": ["source", "destination"],
+            "properties": {"source": {"type": "string"}, "destination": {"type": "string"},
+                           "routeType": {"type": "string", "enum": ["foot_shortest", "car", "public_transport"]},
+                           "maxFeasibleSolutions": {"type": "integer"}},
+        },
+    ),
+]
+checker = ArgumentChecker(TOOLS)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("43.77322, 11.25668", "43.77322;11.25668"),
+    ("(43.77 11.25)", "43.77;11.25"),
+    ([43.77, 11.25], "43.77;11.25"),
+    ({"lat": 43.77, "lng": 11.25}, "43.77;11.25"),
+    ("43.7, 11.2, 43.8, 11.3", "43.7;11.2;43.8;11.3"),
+    ("wkt:POLYGON((...))", "wkt:POLYGON((...))"),
+])
+def test_normalize_coordinates(value, expected):
+    assert normalize_coordinates(value) == expected
+
+
+def test_coordinates_out_of_range():
+    with pytest.raises(InvalidArgument):
+        normalize_coordinates("43.77;191.25")
+    with pytest.raises(InvalidArgument):
+        normalize_coordinates("143.77;11.25")
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("500 m", "0.5"), ("2 km", "2"), ("1,5 km", "1.5"), (0.25, "0.25"), (3, "3"), ("inside", "inside"), ("0.1", "0.1"),
+])
+def test_normalize_distance(value, expected):
+    assert normalize_distance(value) == expected
+
+
+@pytest.mark.parametrize("value", ["far", True, "5 miles"])
+def test_invalid_distance(value):
+    with pytest.raises(InvalidArgument):
+        normalize_distance(value)
+
+
+def test_check_fixes_arguments():
+    args, errors, fixes = checker.check("tpl_geo_search", {"selection": "43.77322, 11.25668", "max_dists": "500 m",
+                                                            "maxResults": 10, "geometry": "yes", "color": "red"})
+    assert errors == []
+    assert args == {"selection": "43.77322;11.25668", "maxDists": "0.5", "maxResults": "10", "geometry": True}
+    assert "color: unknown argument, dropped" in fixes and "max_dists -> maxDists" in fixes
+
+
+def test_check_enum_case_and_integer():
+    args, errors, _ = checker.check("route_shortest_path", {"source": "43.7;11.2", "destination": "43.8;11.3",
+                                                             "routeType": "CAR", "maxFeasibleSolutions": "3"})
+    assert errors == [] and args["routeType"] == "car" and args["maxFeasibleSolutions"] == 3
+
+
+def test_check_rejects():
+    _, errors, _ = checker.check("route_shortest_path", {"source": "95;11", "routeType": "plane", "maxFeasibleSolutions": 1.5})
+    assert [e.split(":")[0] for e in errors] == ["source", "routeType", "maxFeasibleSolutions", "destination"]
+    _, errors, _ = checker.check("tpl_geo_search", {})
+    assert errors == ["selection: missing required argument (A point 'lat;lng'.)"]
+    assert "The call to tpl_geo_search was not made" in error_hint("tpl_geo_search", errors)
+
+
+def test_unknown_tool_and_resources():
+    assert checker.check("tpl_geo_serch", {})[1] == ["unknown tool 'tpl_geo_serch'. Did you mean: tpl_geo_search?"]
+    assert checker.check("resource_get_agencies", {"x": 1}) == ({"x": 1}, [], [])
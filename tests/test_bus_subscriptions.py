@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mcp")
+import bus_subscriptions
+from bus_subscriptions import BusPositionHub, diff_snapshots, index_features, parse_uri
+
+
+def answer(*vehicles, **envelope):
+    features = [{"type": "Feature", "properties": {"vehicleNum": v, "delay": d}} for v, d in vehicles]
+    return {"type": "FeatureCollection", **envelope, "features": features}
+
+
+def test_parse_uri():
+    assert parse_uri("busposition://Autolinee%20Toscane/14") == ("Autolinee Toscane", "14")
+    assert parse_uri("busposition://ATAF/all") == ("ATAF", None)
+    with pytest.raises(ValueError):
+        parse_uri("http://example.org/14")
+
+
+def test_diff_snapshots():
+    old = index_features(answer(("1", 0), ("2", 0)))
+    new = index_features(answer(("1", 60), ("3", 0)))
+    changed, removed = diff_snapshots(old, new)
+    assert [f["properties"]["vehicleNum"] for f in changed] == ["1", "3"] and removed == ["2"]
+
+
+def test_cached_answer_keeps_the_upstream_shape():
+    upstream = answer(("1", 0), lastUpdate="2025-11-06T10:00:00")
+
+    async def fetch(agency, line):
+        return upstream
+
+    async def run():
+        hub = BusPositionHub(fetch, interval=60)
+        first = await hub.snapshot("ATAF", "6")
+        return first, hub.fresh("ATAF", "6")
+
+    first, cached = asyncio.run(run())
+    assert first == upstream and cached == upstream
+
+
+def test_idle_feeds_are_forgotten():
+    async def fetch(agency, line):
+        return answer(("1", 0))
+
+    async def run():
+        hub = BusPositionHub(fetch, interval=0.01)
+        for line in range(50):
+            await hub.snapshot("ATAF", str(line))
+        await asyncio.sleep(bus_subscriptions.IDLE_INTERVALS * 0.01 + 0.01)
+        await hub.snapshot("ATAF", "x")
+        return list(hub._feeds)
+
+    assert asyncio.run(run()) == [("ATAF", "x")]
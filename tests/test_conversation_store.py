@@ -0,0 +1,54 @@
+import conversation_store
+from conversation_store import ConversationStore, bounded_window
+
+
+def turn(i):
+    return [
+        {"role": "user", "content": f"q{i}"},
+        {"role": "assistant", "content": None, "function_call": {"name": "get_events", "arguments": "{}"}},
+        {"role": "function", "name": "get_events", "content": f"r{i}"},
+        {"role": "assistant", "content": f"a{i}"},
+    ]
+
+
+def test_bounded_window_starts_at_user():
+    messages = turn(1) + turn(2)
+    assert bounded_window(messages, 6) == turn(2)
+    assert bounded_window(messages, 8) == messages
+
+
+def test_resume_window_trims_partial_turn(tmp_path):
+    store = ConversationStore(tmp_path / "c.db")
+    session = store.new_session()
+    for m in turn(1) + turn(2):
+        store.append(session, m)
+    store.flush()
+    # as MCPHost does: one row more than the window
+    window = 6
+    resumed = bounded_window(store.load_messages(session, limit=window + 1), window)
+    assert resumed[0]["role"] == "user" and [m["content"] for m in resumed][::3] == ["q2", "a2"]
+    store.close()
+
+
+def test_large_results_go_out_of_line(tmp_path):
+    store = ConversationStore(tmp_path / "c.db", blob_threshold=10)
+    session = store.new_session()
+    compact = store.append(session, {"role": "function", "name": "x", "content": "y" * 50})
+    store.flush()
+    assert "blob:" in compact["content"]
+    assert store.load_messages(session) == [compact]
+    store.close()
+
+
+def test_failed_write_does_not_stop_the_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_store, "RETRY_DELAY", 0)
+    store = ConversationStore(tmp_path / "c.db")
+    session = store.new_session()
+    store.append(session, {"role": "user", "content": "before"})
+    store._queue.put(("INSERT INTO missing_table VALUES (1)", ()))
+    store._queue.put(("INSERT INTO sessions (id, created_at) VALUES (?, ?)", (session, 0)))   # duplicate key
+    store.append(session, {"role": "user", "content": "after"})
+    store.flush()
+    assert store._writer.is_alive()
+    assert [m["content"] for m in store.load_messages(session)] == ["before", "after"]
+    store.close()
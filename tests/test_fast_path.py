@@ -0,0 +1,34 @@
+import pytest
+
+from fast_path import FastPathRouter
+from intent_predictor import RULES
+
+router = FastPathRouter([tool for tool, _ in RULES])
+
+# query -> (tool, arguments) routed without the LLM, or None for the normal path
+ROUTING = [
+    ("list all the tpl agencies", ("resource_get_agencies", {})),
+    ("elenco di tutte le agenzie", ("resource_get_agencies", {})),
+    ("where is bus line 6 in real time", ("get_bus_position", {"line": "6"})),
+    ("position of line 23 buses", ("get_bus_position", {"line": "23"})),
+    ("dove si trova la linea 4 in tempo reale", ("get_bus_position", {"line": "4"})),
+    ("live position of bus 2 of autolinee toscane", ("get_bus_position", {"line": "2", "agency": "Autolinee Toscane"})),
+    # a town, a second line or an agency the arguments cannot carry
+    ("live position of bus 14 in Livorno", None),
+    ("live position of bus 14 in livorno", None),
+    ("dov'è il bus 6 a Firenze", None),
+    ("live position of bus 6 and bus 11", None),
+    ("where is line 6 of ataf", None),
+    # other readings of the same words
+    ("which agency operates line 6", None),
+    ("agencies near the station", None),
+    ("where is the nearest stop of line 6", None),
+    ("where are the buses", None),
+    ("what is the route of line 6", None),
+]
+
+
+@pytest.mark.parametrize("query, expected", ROUTING)
+def test_routing(query, expected):
+    prediction = router.route(query)
+    assert (prediction and (prediction.tool, prediction.args)) == expected
@@ -0,0 +1,47 @@
+import pytest
+
+from llama4.json_repair import repair_function_call, repair_json
+
+NAMES = {"get_location", "get_events", "iot_search", "route_shortest_path"}
+
+# almost-JSON written by the model -> repaired value
+REPAIRS = [
+    ("{'a': 'b'}", {"a": "b"}),
+    ('{"a": "b",}', {"a": "b"}),
+    ('{"a": [1, 2,],}', {"a": [1, 2]}),
+    ('{"a": {"b": 1', {"a": {"b": 1}}),
+    ('{"a": "trunc', {"a": "trunc"}),
+    ('{"a":', {"a": None}),
+    ("{'name': 'Museo dell'artigianato'}", {"name": "Museo dell'artigianato"}),
+    ('{"q": \'he said "hi"\'}', {"q": 'he said "hi"'}),
+    ('{"a": True, "b": None, "c": false}', {"a": True, "b": None, "c": False}),
+    ('{"text": "two\nlines"}', {"text": "two\nlines"}),
+    ("{a: 1}", {"a": 1}),
+    ('{"v": -1.5e3, "w": 2E-2, "x": 7,}', {"v": -1500.0, "w": 0.02, "x": 7}),
+    ('answer: {"a": [1, 2}', {"a": [1, 2]}),
+]
+
+
+@pytest.mark.parametrize("text, expected", REPAIRS)
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_repair_json_without_object():
+    with pytest.raises(ValueError):
+        repair_json("no call here")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("{'function_call': {'name': 'get_location', 'arguments': {'position': '43.77;11.25',}",
+     {"name": "get_location", "arguments": {"position": "43.77;11.25"}}),
+    ('{"function_call": {"name": "Get_Events", "arguments": "{\'range\': \'week\'}"}}',
+     {"name": "get_events", "arguments": {"range": "week"}}),
+    ('{"function_call": {"name": "iot_search", "arguments": {"selection": "43.7;11.2", "maxDists": 1e-1}}',
+     {"name": "iot_search", "arguments": {"selection": "43.7;11.2", "maxDists": 0.1}}),
+    ('{"function_call": {"name": "delete_everything", "arguments": {}}}', None),
+    ('{"function_call": {"arguments": {}}}', None),
+    ('{"function_call": {"name": "get_events", "arguments": [1]}}', None),
+])
+def test_repair_function_call(text, expected):
+    assert repair_function_call(text, NAMES) == expected
@@ -0,0 +1,31 @@
+import json
+import math
+
+import pytest
+
+from common import jsoncodec
+
+
+def test_round_trip_is_compact_utf8():
+    obj = {"name": "Caffè", "coordinates": [11.25, 43.77], "ok": True, "none": None}
+    assert jsoncodec.dumps(obj) == json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    assert jsoncodec.loads(jsoncodec.dumpb(obj)) == obj
+
+
+def test_nan_literals_are_decoded():
+    value = jsoncodec.loads(b'{"v": NaN, "w": -Infinity}')
+    assert math.isnan(value["v"]) and value["w"] == -math.inf
+
+
+def test_invalid_json_is_json_decode_error():
+    with pytest.raises(json.JSONDecodeError):
+        jsoncodec.loads(b"<html>")
+
+
+def test_big_integers_are_encoded():
+    assert jsoncodec.dumps({"id": 2 ** 70}) == '{"id":1180591620717411303424}'
+
+
+def test_sort_keys_and_default():
+    assert jsoncodec.dumps({"b": 1, "a": "x"}, sort_keys=True) == '{"a":"x","b":1}'
+    assert jsoncodec.dumps({"t": object}, default=lambda o: "obj") == '{"t":"obj"}'
@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+
+import local_routing
+from local_routing import TransitGraph, haversine_km, parse_point
+
+
+def stops_answer(prefix, points):
+    return {"BusStops": {"type": "FeatureCollection", "features": [
+        {"geometry": {"type": "Point", "coordinates": [lon, lat]},
+         "properties": {"serviceUri": f"{prefix}{i}", "name": f"{prefix.upper()}{i}"}}
+        for i, (lat, lon) in enumerate(points)
+    ]}}
+
+
+@pytest.fixture
+def graph():
+    """ Line 1 runs east along 43.77 (11.20 -> 11.30), line 2 north from its last stop. """
+    g = TransitGraph()
+    g.add_routes({"BusRoutes": [{"route": "r/east", "line": "1", "routeName": "East"},
+                                {"route": "r/north", "line": "2", "routeName": "North"}]})
+    g.add_route_stops("r/east", stops_answer("e", [(43.77, 11.20 + 0.01 * i) for i in range(11)]))
+    g.add_route_stops("r/north", stops_answer("n", [(43.77 + 0.01 * i, 11.30) for i in range(8)]))
+    return g
+
+
+def test_parse_point():
+    assert parse_point("43.77;11.25") == (43.77, 11.25)
+    assert parse_point("43.77,11.25") == (43.77, 11.25)
+    assert parse_point("http://www.disit.org/km4city/resource/x") is None
+    assert parse_point("95;11") is None
+
+
+def test_unsupported_queries(graph):
+    assert graph.route("http://x/stop", "43.77;11.25", "public_transport") is None
+    assert graph.route("43.77;11.20", "43.77;11.25", "car") is None
+
+
+def test_walking_is_an_estimate(graph):
+    answer = graph.route("43.77;11.20", "43.78;11.20", "foot_shortest", "2025-11-06T10:00:00")
+    route = answer["journey"]["routes"][0]
+    assert answer["estimated"] and answer["source"] == "local"
+    assert float(route["distance"]) == pytest.approx(haversine_km(43.77, 11.20, 43.78, 11.20) * local_routing.WALK_DETOUR, abs=0.01)
+
+
+def test_transit_uses_one_line(graph):
+    route = graph.route("43.7702;11.2001", "43.7702;11.2999", "public_transport", "2025-11-06T10:00:00")["journey"]["routes"][0]
+    modes = [(a["transport"], a.get("line")) for a in route["arc"]]
+    assert modes == [("walk", None), ("bus", "1"), ("walk", None)]
+    assert route["arc"][1]["source_node"] == "E0" and route["arc"][1]["destination_node"] == "E10"
+
+
+def test_transit_changes_line(graph):
+    route = graph.route("43.7701;11.2001", "43.8399;11.3001", "public_transport", "2025-11-06T10:00:00")["journey"]["routes"][0]
+    assert [a.get("line") for a in route["arc"] if a["transport"] == "bus"] == ["1", "2"]
+    # two waits: boarding and the change
+    minutes = sum(int(x) * f for x, f in zip(route["time"].split(":"), (60, 1, 1 / 60)))
+    assert minutes > 2 * local_routing.WAIT_MIN
+
+
+def test_walking_wins_when_close(graph):
+    answer = graph.route("43.7701;11.2001", "43.7701;11.2051", "public_transport")
+    assert answer["estimated"] and [a["transport"] for a in answer["journey"]["routes"][0]["arc"]] == ["walk"]
+
+
+def test_route_names_do_not_rebuild_the_graph(graph):
+    graph.route("43.7702;11.2001", "43.7702;11.2999", "public_transport")
+    built = graph._built
+    graph.add_routes({"BusRoutes": [{"route": "r/east", "line": "1A"}]})
+    assert graph._built is built
+    graph.add_route_stops("r/west", stops_answer("w", [(43.76, 11.20), (43.76, 11.21)]))
+    assert graph._built is None
+
+
+def test_cache_file_is_saved_once_per_burst(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_routing, "SAVE_DELAY", 0.05)
+    path = tmp_path / "transit.json"
+    saves = []
+
+    async def run():
+        g = TransitGraph(str(path))
+        monkeypatch.setattr(g, "_save", lambda snapshot: saves.append(snapshot))
+        for i in range(5):
+            g.add_route_stops(f"r/{i}", stops_answer(f"s{i}", [(43.7, 11.2), (43.71, 11.2)]))
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert len(saves) == 1 and len(saves[0]["route_stops"]) == 5
+
+
+def test_cache_file_round_trip(tmp_path, graph):
+    graph.cache_path = str(tmp_path / "transit.json")
+    graph._changed(graph=False)      # outside of an event loop: written right away
+    loaded = TransitGraph(graph.cache_path)
+    assert loaded.route_stops == graph.route_stops and loaded.stops == graph.stops
+    assert json.loads((tmp_path / "transit.json").read_text())["routes"]["r/east"]["line"] == "1"
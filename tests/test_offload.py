@@ -0,0 +1,31 @@
+import asyncio
+import operator
+
+import pytest
+
+import offload
+
+
+@pytest.fixture(params=["inline", "pool"])
+def where(request, monkeypatch):
+    monkeypatch.setattr(offload, "OFFLOAD_MIN_BYTES", 1 if request.param == "pool" else 1 << 30)
+    monkeypatch.setattr(offload, "OFFLOAD_WORKERS", 1)
+    yield request.param
+    offload.shutdown()
+
+
+def test_decode_applies_post(where):
+    assert asyncio.run(offload.decode(b'{"a": [1, 2]}', post=operator.itemgetter("a"))) == [1, 2]
+
+
+def test_post_error_is_args0(where):
+    # upstream.get_json raises args[0]: it must be the exception of post() on both paths
+    with pytest.raises(offload.PostProcessingError) as info:
+        asyncio.run(offload.decode(b'{"a": 1}', post=operator.itemgetter("missing")))
+    assert isinstance(info.value.args[0], KeyError)
+
+
+def test_invalid_json_is_value_error(where):
+    with pytest.raises(ValueError) as info:
+        asyncio.run(offload.decode(b"not json"))
+    assert not isinstance(info.value, offload.PostProcessingError)
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+import scheduler as scheduler_module
+from scheduler import UpstreamScheduler, _Bucket, parse_rates, upstream_priority
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refill(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock)
+    bucket = _Bucket(rate=2.0, burst=2)
+    assert bucket.take() and bucket.take() and not bucket.take()
+    assert bucket.wait() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() and not bucket.take()
+    clock.now += 60                 # refill stops at the burst
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
+
+
+def test_rate_zero_is_unlimited():
+    bucket = _Bucket(rate=0, burst=1)
+    assert all(bucket.take() for _ in range(100)) and bucket.wait() == 0.0
+
+
+def test_parse_rates():
+    assert parse_rates("/events=1, /location=5") == {"/events": 1.0, "/location": 5.0}
+    assert parse_rates(None) == {}
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        with upstream_priority("urgent"):
+            pass
+
+
+async def _queued(coro):
+    task = asyncio.create_task(coro)
+    await asyncio.sleep(0)
+    return task
+
+
+def test_free_slot_goes_to_the_best_class():
+    async def run():
+        s = UpstreamScheduler(concurrency=1, rate=0, reserved=0)
+        order = []
+
+        async def call(name, priority):
+            async with s.slot("/x", priority):
+                order.append(name)
+
+        await s.acquire("/x", "interactive")
+        refresh = await _queued(call("refresh", "refresh"))
+        prefetch = await _queued(call("prefetch", "prefetch"))
+        interactive = await _queued(call("interactive", "interactive"))
+        s.release()
+        await asyncio.gather(refresh, prefetch, interactive)
+        return order, s.running
+
+    assert asyncio.run(run()) == (["interactive", "prefetch", "refresh"], 0)
+
+
+def test_reserved_slots_are_for_interactive_calls():
+    async def run():
+        s = UpstreamScheduler(concurrency=2, rate=0, reserved=1)
+        await s.acquire("/x", "prefetch")
+        second = await _queued(s.acquire("/x", "prefetch"))
+        waiting = not second.done()
+        await s.acquire("/x", "interactive")     # the reserved slot, right away
+        s.release()
+        s.release()
+        await second
+        return waiting, s.running
+
+    assert asyncio.run(run()) == (True, 1)
+
+
+def test_rate_limited_waiters_are_woken_by_the_timer():
+    async def run():
+        s = UpstreamScheduler(concurrency=4, rate=50, burst=1)
+        await s.acquire("/x", "interactive")
+        waited = await s.acquire("/x", "interactive")
+        return waited
+
+    assert asyncio.run(run()) > 0.005
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        s = UpstreamScheduler(concurrency=1, rate=0, reserved=0)
+        await s.acquire("/x", "interactive")
+        waiter = await _queued(s.acquire("/x", "prefetch"))
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queued = len(s._queues["prefetch"])
+        s.release()
+        return queued, s.running
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def test_slot_granted_to_a_cancelled_caller_is_released():
+    async def run():
+        s = UpstreamScheduler(concurrency=1, rate=0, reserved=0)
+        await s.acquire("/x", "interactive")
+        waiter = await _queued(s.acquire("/x", "interactive"))
+        s.release()                 # the slot goes to the waiter...
+        waiter.cancel()             # ...which is cancelled before it runs
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return s.running
+
+    assert asyncio.run(run()) == 0
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from timeseries import aggregate, lttb, parse_width
+
+
+@pytest.mark.parametrize("text, seconds", [("15m", 900), ("1h", 3600), ("2d", 172800), ("90", 90), (" 1.5 H ", 5400)])
+def test_parse_width(text, seconds):
+    assert parse_width(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["0", "-1h", "hour", "1y"])
+def test_parse_width_invalid(text):
+    with pytest.raises(ValueError):
+        parse_width(text)
+
+
+@pytest.mark.parametrize("threshold, expected", [(0, []), (1, [99]), (2, [0, 99])])
+def test_lttb_below_three_points(threshold, expected):
+    x = np.arange(100.0)
+    assert lttb(x, np.sin(x), threshold).tolist() == expected
+
+
+def test_lttb_keeps_ends_and_peaks():
+    x = np.arange(200.0)
+    y = np.zeros(200)
+    y[57], y[140] = 10.0, -10.0
+    keep = lttb(x, y, 12)
+    assert len(keep) == 12 and keep[0] == 0 and keep[-1] == 199
+    assert 57 in keep and 140 in keep and np.all(np.diff(keep) > 0)
+
+
+def test_lttb_short_series_unchanged():
+    x = np.arange(5.0)
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def feature(uri, when, **values):
+    return {"geometry": {"type": "Point", "coordinates": [11.25, 43.77]},
+            "properties": {"serviceUri": uri, "deviceName": uri[-1], "values": {"dateObserved": when, **values}}}
+
+
+def test_aggregate_buckets_per_device():
+    data = {"type": "FeatureCollection", "features": [
+        feature("s/a", "2025-11-06T10:05:00+01:00", temperature=10.0, status="ok"),
+        feature("s/a", "2025-11-06T10:35:00+01:00", temperature=14.0),
+        feature("s/a", "2025-11-06T11:10:00+01:00", temperature=20.0),
+        feature("s/b", "2025-11-06T10:20:00+01:00", temperature=5.0, humidity=80),
+        feature("s/b", "not a date", temperature=99.0),
+    ]}
+    result = aggregate(data, width=3600)
+    assert result["rows"] == 4 and result["bucket"] == 3600
+    a, b = result["devices"]
+    assert a["series"]["temperature"] == {
+        "t": ["2025-11-06T10:00:00+01:00", "2025-11-06T11:00:00+01:00"],
+        "min": [10.0, 20.0], "max": [14.0, 20.0], "mean": [12.0, 20.0], "count": [2, 1], "last": [14.0, 20.0],
+    }
+    assert set(b["series"]) == {"temperature", "humidity"} and "status" not in a["series"]
+
+
+def test_aggregate_max_points_on_raw_values():
+    data = {"type": "FeatureCollection", "features": [
+        feature("s/a", f"2025-11-06T10:{m:02d}:00+00:00", v=float(m % 7)) for m in range(60)
+    ]}
+    series = aggregate(data, max_points=10)["devices"][0]["series"]["v"]
+    assert len(series["t"]) == 10 and series["t"][0] == "2025-11-06T10:00:00+00:00" and series["t"][-1] == "2025-11-06T10:59:00+00:00"
+
+
+def test_aggregate_passes_other_answers_through():
+    assert aggregate({"error": "x"}, width=60) == {"error": "x"}
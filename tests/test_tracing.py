@@ -0,0 +1,60 @@
+import asyncio
+import os
+
+from common.tracing import Tracer, parse_traceparent
+
+
+def test_traceparent_round_trip():
+    tracer = Tracer("test")
+    with tracer.span("root") as root:
+        header = tracer.traceparent()
+    assert parse_traceparent(header) == (root.trace_id, root.span_id)
+    assert parse_traceparent("garbage") is None
+
+
+def test_remote_parent_continues_the_trace():
+    tracer = Tracer("test")
+    header = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    with tracer.span("server", traceparent=header) as span:
+        with tracer.span("child") as child:
+            pass
+    assert span.trace_id == child.trace_id == "a" * 32 and span.parent_id == "b" * 16 and child.parent_id == span.span_id
+
+
+def test_children_finishing_after_their_root_are_exported(tmp_path):
+    tracer = Tracer("test", export_path=str(tmp_path / "traces.jsonl"))
+
+    async def background():
+        await asyncio.sleep(0.01)
+        with tracer.span("late child"):
+            pass
+
+    async def run():
+        tasks = []
+        for _ in range(20):
+            with tracer.span("tool"):
+                tasks.append(asyncio.create_task(background()))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    tracer.flush()
+    assert not tracer._pending and not tracer._open_roots
+    with open(tmp_path / "traces.jsonl") as f:
+        assert sum(1 for _ in f) == 40
+
+
+def test_export_file_is_rotated(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer("test", export_path=str(path), max_bytes=2000, backup_count=2)
+    ids = []
+    for i in range(60):
+        with tracer.span(f"span {i}") as span:
+            ids.append(span.trace_id)
+        tracer.flush()
+    assert sorted(os.listdir(tmp_path)) == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert all(os.path.getsize(tmp_path / name) < 2000 + 1000 for name in os.listdir(tmp_path))
+    tracer.finished.clear()
+    assert [s["name"] for s in tracer.spans_of(ids[-1])] == ["span 59"]
+    backup = (tmp_path / "traces.jsonl.1").read_text()
+    in_backup = next(i for i in ids if i in backup)
+    assert len(tracer.spans_of(in_backup)) == 1